@@ -0,0 +1,206 @@
+import os, time, random, shutil, sqlite3, argparse, tempfile
+import numpy as np
+import onnx
+
+from pathlib import Path
+from typing import Callable, Dict, List
+from tokenizers import Tokenizer
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static
+)
+from export_onnx import export_to_onnx
+from psychopass import DB_DIR
+from psychopass.embedder import Embedder
+from psychopass.emotions import EmotionClassifier
+from psychopass.sessions import SessionConfig
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+MODELS_DIR = SCRIPT_DIR / "src-tauri" / "models"
+TEXT_DIR = MODELS_DIR / "clip-ViT-B-32-multilingual-v1"
+IMG_DIR = MODELS_DIR / "clip-ViT-B-32"
+CLASSIFIER = SCRIPT_DIR / "src-tauri" / "psychopass.onnx"
+ENCODER = SCRIPT_DIR / "src-tauri" / "label_encoder.pkl"
+REPO_ID = "sentence-transformers/clip-ViT-B-32-multilingual-v1"
+
+VARIANTS = ["fp32", "fp16", "int8", "int8-static", "q4"]
+
+class TextCalibration(CalibrationDataReader):
+    """Feeds user messages one by one to static quantization"""
+
+    def __init__(self, tokenizer: Tokenizer, texts: List[str]):
+        self.tokenizer = tokenizer
+        self.texts = iter(texts)
+
+    def get_next(self):
+        text = next(self.texts, None)
+        if text is None:
+            return None
+        ids = self.tokenizer.encode(text).ids
+        return {
+            "input_ids": np.asarray([ids], dtype=np.int64),
+            "attention_mask": np.ones((1, len(ids)), dtype=np.int64)
+        }
+
+def sample_texts(db_path: str, n: int, seed: int) -> List[str]:
+    """Random non-empty messages from the user's database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        ids = [row[0] for row in conn.execute("SELECT id FROM message WHERE text IS NOT NULL AND TRIM(text) != ''")]
+        ids = random.Random(seed).sample(ids, min(n, len(ids)))
+
+        texts = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            texts += [row[0] for row in conn.execute(f"SELECT text FROM message WHERE id IN ({placeholders})", chunk)]
+        return texts
+    finally:
+        conn.close()
+
+def make_fp16(src: str, dst: str, calibration: List[str]):
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+    # inputs/outputs stay int64/float32, so the embedder doesn't change
+    onnx.save(convert_float_to_float16(onnx.load(src), keep_io_types=True), dst)
+
+def make_int8(src: str, dst: str, calibration: List[str]):
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+
+def make_int8_static(src: str, dst: str, calibration: List[str]):
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    prepared = dst + ".pre.onnx"
+    quant_pre_process(src, prepared)
+
+    tokenizer = Tokenizer.from_file(str(TEXT_DIR / "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=128)
+
+    quantize_static(
+        prepared,
+        dst,
+        TextCalibration(tokenizer, calibration),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8
+    )
+    os.remove(prepared)
+
+def make_q4(src: str, dst: str, calibration: List[str]):
+    from onnxruntime.quantization.matmul_4bits_quantizer import MatMul4BitsQuantizer
+    quantizer = MatMul4BitsQuantizer(onnx.load(src), block_size=32, is_symmetric=True)
+    quantizer.process()
+    quantizer.model.save_model_to_file(dst, use_external_data_format=False)
+
+BUILDERS: Dict[str, Callable[[str, str, List[str]], None]] = {
+    "fp16": make_fp16,
+    "int8": make_int8,
+    "int8-static": make_int8_static,
+    "q4": make_q4
+}
+
+def build_variants(out_dir: str, variants: List[str], calibration: List[str]) -> Dict[str, str]:
+    """One model dir per variant, all derived from a single fp32 export"""
+    fp32_dir = os.path.join(out_dir, "fp32")
+    os.makedirs(fp32_dir, exist_ok=True)
+    print("[DEBUG] Exporting fp32 text model")
+    fp32 = export_to_onnx(REPO_ID, fp32_dir, quantize="fp32")
+
+    dirs = {}
+    for variant in variants:
+        model_dir = os.path.join(out_dir, variant)
+        os.makedirs(model_dir, exist_ok=True)
+        shutil.copy2(TEXT_DIR / "tokenizer.json", model_dir)
+
+        if variant != "fp32":
+            print(f"[DEBUG] Building {variant}")
+            BUILDERS[variant](fp32, os.path.join(model_dir, "model.onnx"), calibration)
+        dirs[variant] = model_dir
+
+    return dirs
+
+def measure(embedder: Embedder, texts: List[str], batch_size: int) -> tuple[np.ndarray, dict]:
+    # warm-up runs pay for session creation and allocator growth
+    for _ in range(2):
+        embedder.embed_texts(texts[:batch_size])
+
+    latencies, outputs = [], []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        t = time.perf_counter()
+        outputs.append(embedder.embed_texts(texts[i:i + batch_size]))
+        latencies.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return np.vstack(outputs), {
+        "throughput": len(texts) / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Speed/accuracy of text model variants on this machine")
+    arg_parser.add_argument("--db", default=DB_DIR, help="user database to draw messages from")
+    arg_parser.add_argument("--samples", type=int, default=1000, help="held-out messages to evaluate on")
+    arg_parser.add_argument("--calibration", type=int, default=200, help="messages for int8 static calibration")
+    arg_parser.add_argument("--batch-size", type=int, default=32)
+    arg_parser.add_argument("--threads", type=int, default=0, help="intra-op threads, 0 = ORT default")
+    arg_parser.add_argument("--min-agreement", type=float, default=0.98, help="classifier agreement with fp32 a variant must reach")
+    arg_parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    arg_parser.add_argument("--out", help="keep the built variants here instead of a temp dir")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    texts = sample_texts(args.db, args.calibration + args.samples, args.seed)
+    if len(texts) <= args.calibration:
+        print(f"[ERROR] {args.db} has {len(texts)} text messages, import some chats first")
+        return 1
+
+    # calibration and evaluation sets don't overlap
+    calibration, held_out = texts[:args.calibration], texts[args.calibration:]
+    variants = ["fp32"] + [v for v in args.variants if v != "fp32"]
+
+    classifier = EmotionClassifier(CLASSIFIER, ENCODER)
+    config = SessionConfig(intra_op_threads=args.threads, cache_optimized=False)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.out or tmp
+        dirs = build_variants(out_dir, variants, calibration)
+
+        reference, reference_labels = None, None
+        for variant, model_dir in dirs.items():
+            embedder = Embedder(model_dir, str(IMG_DIR), batch_size=args.batch_size, text_config=config)
+            embeddings, res = measure(embedder, held_out, args.batch_size)
+            labels = np.asarray(classifier.predict_batch(embeddings))
+
+            if reference is None:
+                reference, reference_labels = embeddings, labels
+
+            cosine = np.sum(embeddings * reference, axis=1) / (
+                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1) + 1e-12
+            )
+            res["agreement"] = float(np.mean(labels == reference_labels))
+            res["cosine"] = float(np.mean(cosine))
+            res["size_mb"] = os.path.getsize(os.path.join(model_dir, "model.onnx")) / (1024 * 1024)
+            results[variant] = res
+
+            print(
+                f"{variant:>11}: {res['throughput']:8.1f} msg/s, "
+                f"p50 {res['p50_ms']:7.1f} ms, p95 {res['p95_ms']:7.1f} ms, p99 {res['p99_ms']:7.1f} ms, "
+                f"agreement {res['agreement']:.2%}, cosine {res['cosine']:.4f}, {res['size_mb']:.0f} MB"
+            )
+
+    eligible = {v: r for v, r in results.items() if r["agreement"] >= args.min_agreement}
+    best = max(eligible, key=lambda v: eligible[v]["throughput"])
+    print(
+        f"\nShip {best}: {eligible[best]['throughput'] / results['fp32']['throughput']:.2f}x fp32 throughput, "
+        f"{eligible[best]['agreement']:.2%} agreement on {len(held_out)} held-out messages"
+    )
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+import os, gc, json, random, argparse, tempfile, tracemalloc
+from psychopass.parser import parser
+
+# Retained bytes per parsed message (slotted schemas + interned authors),
+# measured on the synthetic exports below with 20k messages:
+#   telegram ~330 B/msg (was ~470 with plain dataclasses)
+#   discord  ~380 B/msg (was ~635)
+TARGETS = {
+    "telegram": 400,
+    "discord": 450
+}
+
+def make_telegram(path: str, n: int, rnd: random.Random):
+    messages = [{
+        "id": i,
+        "type": "message",
+        "date": "2021-03-04T05:06:%02d" % (i % 60),
+        "from": "User %d" % (i % 7),
+        "from_id": "user%d" % (1000 + i % 7),
+        "text": "message text %d" % rnd.randint(0, 10**6),
+        **({"reply_to_message_id": i - 3} if i % 5 == 0 and i > 3 else {})
+    } for i in range(n)]
+
+    with open(os.path.join(path, "result.json"), "w", encoding="utf-8") as f:
+        json.dump({"name": "chat", "type": "personal_chat", "id": 1, "messages": messages}, f)
+
+def make_discord(path: str, n: int, rnd: random.Random):
+    messages = [{
+        "id": str(10**17 + i),
+        "name": "general",
+        "timestamp": "2021-03-04T05:06:%02d.000000+00:00" % (i % 60),
+        "content": "message text %d" % rnd.randint(0, 10**6),
+        "author": {
+            "id": str(10**17 + i % 7),
+            "username": "user%d" % (i % 7),
+            "global_name": "User %d" % (i % 7),
+            "avatar": "avatar%d" % (i % 7)
+        },
+        "attachments": [],
+        **({"message_reference": {"message_id": str(10**17 + i - 3)}} if i % 5 == 0 and i > 3 else {})
+    } for i in range(n)]
+
+    with open(os.path.join(path, "channel.json"), "w", encoding="utf-8") as f:
+        json.dump(messages, f)
+
+def measure(platform: str, path: str) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    messages, chats = parser.parse(platform, path)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(messages)
+    del messages, chats
+
+    gc.collect()
+    tracemalloc.start()
+    for _ in parser.stream(platform, path, 32):
+        pass
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "messages": count,
+        "retained_per_msg": retained // max(count, 1),
+        "peak_per_msg": peak // max(count, 1),
+        "stream_peak_kb": stream_peak // 1024
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Parser memory per message")
+    arg_parser.add_argument("-n", "--messages", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    parser.load_parsers()
+    rnd = random.Random(0)
+    failed = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for platform, make in (("telegram", make_telegram), ("discord", make_discord)):
+            path = os.path.join(tmp, platform)
+            os.makedirs(path)
+            make(path, args.messages, rnd)
+
+            res = measure(platform, path)
+            ok = res["retained_per_msg"] <= TARGETS[platform]
+            failed |= not ok
+
+            print(
+                f"{platform:>9}: {res['retained_per_msg']} B/msg retained "
+                f"(target {TARGETS[platform]}, {'ok' if ok else 'OVER'}), "
+                f"{res['peak_per_msg']} B/msg peak, "
+                f"stream peak {res['stream_peak_kb']} KB for {res['messages']} messages"
+            )
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
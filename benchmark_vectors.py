@@ -0,0 +1,117 @@
+import os, time, argparse, tempfile
+import numpy as np
+
+from typing import Dict, List
+from psychopass import MEM_DIR
+from psychopass.vectors import VectorBackend, ChromaBackend, FlatBackend, normalize
+
+BACKENDS = ["chroma", "flat-f16", "flat-f32"]
+
+def make_backend(name: str, path: str) -> VectorBackend:
+    if name == "chroma":
+        return ChromaBackend(path)
+    return FlatBackend(path, "float16" if name == "flat-f16" else "float32")
+
+def load_vectors(source: str, n: int, dim: int, seed: int):
+    """Stored vectors of the user's Chroma store, or random ones"""
+    rng = np.random.default_rng(seed)
+    if source == "synthetic":
+        ids = np.arange(1, n + 1, dtype=np.int64)
+        vectors = rng.normal(size=(n, dim)).astype(np.float32)
+        metadatas = [
+            {"type": "text", "original_id": int(i), "chat_id": int(i % 50) + 1, "user_id": int(i % 200) + 1, "emotion": "", "timestamp": 0}
+            for i in ids
+        ]
+        return ids, vectors, metadatas
+
+    ids, vectors, metadatas = [], [], []
+    for chunk_ids, chunk, metas in ChromaBackend(source).scan(4096):
+        ids.append(chunk_ids)
+        vectors.append(chunk)
+        metadatas += metas
+        if len(metadatas) >= n:
+            break
+    return np.concatenate(ids)[:n], np.vstack(vectors)[:n], metadatas[:n]
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Insert/search speed and recall of the vector backends")
+    arg_parser.add_argument("--source", default="synthetic", help=f"'synthetic' or a Chroma dir, e.g. {MEM_DIR}")
+    arg_parser.add_argument("--vectors", type=int, default=100_000)
+    arg_parser.add_argument("--dim", type=int, default=512)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--top-k", type=int, default=10)
+    arg_parser.add_argument("--batch-size", type=int, default=1024, help="vectors per insert, like an ingest DB batch")
+    arg_parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    ids, vectors, metadatas = load_vectors(args.source, args.vectors, args.dim, args.seed)
+    if not len(ids):
+        print(f"[ERROR] {args.source} has no vectors")
+        return 1
+
+    # queries are perturbed stored vectors, so neighbours exist
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    queries = normalize(vectors[picks] + rng.normal(scale=0.05, size=(len(picks), vectors.shape[1])).astype(np.float32))
+    filter_chat = metadatas[picks[0]]["chat_id"] or None
+
+    # exact ground truth, the same for every backend
+    normed = normalize(vectors)
+    truth = [set(ids[np.argsort(-(normed @ q))[:args.top_k]].tolist()) for q in queries]
+
+    results: Dict[str, dict] = {}
+    for name in args.backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            backend = make_backend(name, tmp)
+            backend.count()
+            opened = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(0, len(ids), args.batch_size):
+                backend.upsert(ids[i:i + args.batch_size].tolist(), vectors[i:i + args.batch_size], [""] * len(ids[i:i + args.batch_size]), metadatas[i:i + args.batch_size])
+            inserted = time.perf_counter() - start
+
+            # warm-up pays for index loading and page faults
+            backend.search(queries[0], args.top_k)
+
+            latencies: List[float] = []
+            recall = []
+            for q, expected in zip(queries, truth):
+                t = time.perf_counter()
+                hits = backend.search(q, args.top_k)
+                latencies.append((time.perf_counter() - t) * 1000)
+                recall.append(len(expected & {h[0] for h in hits}) / args.top_k)
+
+            filtered = []
+            for q in queries:
+                t = time.perf_counter()
+                backend.search(q, args.top_k, {"chat_id": filter_chat})
+                filtered.append((time.perf_counter() - t) * 1000)
+
+            p50, p95 = np.percentile(latencies, [50, 95])
+            results[name] = res = {
+                "open_s": opened,
+                "insert_per_s": len(ids) / inserted,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "filtered_p50_ms": float(np.percentile(filtered, 50)),
+                "recall": float(np.mean(recall)),
+                "size_mb": dir_size(tmp) / (1024 * 1024)
+            }
+            backend.close()
+
+        print(
+            f"{name:>8}: open {res['open_s']:6.2f} s, insert {res['insert_per_s']:9.0f} vec/s, "
+            f"search p50 {res['p50_ms']:7.2f} ms, p95 {res['p95_ms']:7.2f} ms, filtered p50 {res['filtered_p50_ms']:7.2f} ms, "
+            f"recall@{args.top_k} {res['recall']:.3f}, {res['size_mb']:.0f} MB"
+        )
+
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -16,7 +16,12 @@ class STWrapper(nn.Module):
         out = self.model(features)
         return out["sentence_embedding"]
 
-def export_to_onnx(name: str, path: str):
+def export_to_onnx(name: str, path: str, quantize: str = "int8", filename: str = "model.onnx"):
+    """
+    Exports the sentence embedding to path/filename.
+    quantize: "int8" (dynamic, what install.py ships) or "fp32" to keep full precision,
+    benchmark_models.py derives the other variants from the fp32 export.
+    """
     model = SentenceTransformer(name, device='cpu')
     model.eval()
     model.to('cpu')
@@ -27,7 +32,7 @@ def export_to_onnx(name: str, path: str):
     input_ids = torch.ones(1, 128, dtype=torch.long)
     attention_mask = torch.ones(1, 128, dtype=torch.long)
 
-    onnx_path = os.path.join(path, "model.onnx")
+    onnx_path = os.path.join(path, filename)
 
     torch.onnx.export(
         wrapper,
@@ -36,17 +41,23 @@ def export_to_onnx(name: str, path: str):
         input_names=["input_ids", "attention_mask"],
         output_names=["embeddings"],
         opset_version=18,
+        # dynamic sequence axis lets the embedder pad each batch to its longest text
         dynamic_axes={
-            "input_ids": {0: "batch"},
-            "attention_mask": {0: "batch"},
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
             "embeddings": {0: "batch"},
         },
         do_constant_folding=True,
         dynamo=False
     )
 
-    quantize_dynamic(
-        onnx_path,
-        onnx_path,
-        weight_type=QuantType.QInt8
-    )
\ No newline at end of file
+    if quantize == "int8":
+        quantize_dynamic(
+            onnx_path,
+            onnx_path,
+            weight_type=QuantType.QInt8
+        )
+    elif quantize != "fp32":
+        raise ValueError(f"Unknown quantization: {quantize}")
+
+    return onnx_path
\ No newline at end of file
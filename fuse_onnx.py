@@ -0,0 +1,60 @@
+import os, onnx, argparse
+from onnx import compose, helper, version_converter
+
+def get_opset(model: onnx.ModelProto) -> int:
+    for opset in model.opset_import:
+        if opset.domain in ("", "ai.onnx"):
+            return opset.version
+    return 0
+
+def fuse_models(text_path: str, classifier_path: str, out_path: str):
+    """
+    Composes the text encoder and the emotion classifier into one graph:
+        input_ids, attention_mask -> embeddings, scores, emotion
+    scores is the raw classifier output, emotion its argmax (label encoder index).
+    """
+    text = onnx.load(text_path)
+    classifier = onnx.load(classifier_path)
+
+    text_opset = get_opset(text)
+    if get_opset(classifier) != text_opset:
+        classifier = version_converter.convert_version(classifier, text_opset)
+    classifier.ir_version = text.ir_version
+
+    classifier = compose.add_prefix(classifier, "classifier/")
+    clf_input = classifier.graph.input[0].name
+    clf_output = classifier.graph.output[0].name
+
+    # named outputs, so the runtime doesn't depend on the classifier export
+    classifier.graph.node.extend([
+        helper.make_node("Identity", [clf_output], ["scores"]),
+        helper.make_node("ArgMax", [clf_output], ["emotion"], axis=1, keepdims=0),
+    ])
+    classifier.graph.output.extend([
+        helper.make_tensor_value_info("scores", onnx.TensorProto.FLOAT, ["batch", None]),
+        helper.make_tensor_value_info("emotion", onnx.TensorProto.INT64, ["batch"]),
+    ])
+
+    fused = compose.merge_models(
+        text,
+        classifier,
+        io_map=[(text.graph.output[0].name, clf_input)],
+        outputs=[text.graph.output[0].name, "scores", "emotion"]
+    )
+
+    onnx.checker.check_model(fused)
+    onnx.save(fused, out_path)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Fuse text embedder and emotion classifier into one ONNX graph")
+    arg_parser.add_argument("text_model", help="text embedder, e.g. models/clip-ViT-B-32-multilingual-v1/model.onnx")
+    arg_parser.add_argument("classifier", help="emotion classifier, e.g. psychopass.onnx")
+    arg_parser.add_argument("-o", "--output", help="defaults to fused.onnx next to the text model")
+    args = arg_parser.parse_args()
+
+    out_path = args.output or os.path.join(os.path.dirname(args.text_model), "fused.onnx")
+    fuse_models(args.text_model, args.classifier, out_path)
+    print(f"[DEBUG] Fused model saved -> {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import shutil
 from pathlib import Path
 from huggingface_hub import hf_hub_download
 from export_onnx import export_to_onnx
+from fuse_onnx import fuse_models
 
 # Get the script's directory to ensure correct paths
 SCRIPT_DIR = Path(__file__).parent.absolute()
@@ -56,4 +57,16 @@ for name, data in models.items():
             print(f"[WARNING] Could not download {file}: {e}")
             continue
 
+# Fuse text encoder and emotion classifier, the app falls back to separate sessions without it
+classifier_path = SCRIPT_DIR / "src-tauri" / "psychopass.onnx"
+text_dir = MODELS_DIR / "clip-ViT-B-32-multilingual-v1"
+
+if classifier_path.exists() and (text_dir / "model.onnx").exists():
+    try:
+        print("\n[DEBUG] Fusing text encoder and emotion classifier")
+        fuse_models(str(text_dir / "model.onnx"), str(classifier_path), str(text_dir / "fused.onnx"))
+        print(f"[DEBUG] Saved fused model -> {text_dir / 'fused.onnx'}")
+    except Exception as e:
+        print(f"[WARNING] Could not fuse models: {e}")
+
 print("\n All models processed successfully :p")
\ No newline at end of file
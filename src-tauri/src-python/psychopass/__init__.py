@@ -1,12 +1,13 @@
 import os, random, configparser
-import asyncio, math, logging
+import asyncio, logging, time, threading
 import traceback, functools
 import numpy as np
 
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
 from appdirs import user_config_dir
-from typing import Annotated, Union, Optional, List, Tuple, Callable, Any
+from typing import Annotated, Union, Optional, List, Tuple, Callable, Any, Iterator
 from anyio.from_thread import start_blocking_portal
 from pytauri.path import PathResolver
 from pytauri import (
@@ -27,18 +28,34 @@ CFG_DIR = os.path.join(APP_DIR, "config.cfg")
 DB_DIR = os.path.join(APP_DIR, "psychopass.db")
 CACHE_DIR = os.path.join(APP_DIR, "cache")
 MEM_DIR = os.path.join(APP_DIR, "memory")
+EMB_CACHE_DIR = os.path.join(APP_DIR, "embeddings.db")
+MODELS_CACHE_DIR = os.path.join(APP_DIR, "models")
 
 # Main app func.
-from psychopass.parser import parser, ChatParser
+from psychopass.parser import parser, ChatParser, ParseBatch
 from psychopass.embedder import Embedder
+from psychopass.embed_cache import EmbeddingCache
 from psychopass.emotions import EmotionClassifier
+from psychopass.sessions import SessionConfig
 from psychopass.database import UserDB
 from psychopass.memory import Memory
+from psychopass.vectors import open_backend
+from psychopass.pipeline import Pipeline
+from psychopass.batch import MessageBatch
+from psychopass.checkpoint import IngestCheckpoints
+from psychopass.workers import EmbedPool, WorkerSpec
+from psychopass.batching import AdaptiveBatchSize, memory_ceiling, rebatch
+from psychopass.utils import to_epoch
 from psychopass.schemas import * # type: ignore
 
 memory: Memory
 embedder: Embedder
 classifier: EmotionClassifier
+worker_spec: WorkerSpec
+memory_limit: int = 0
+resources: dict[str, Path] = {}
+reclassify_lock = threading.Lock()
+batch_stats: List[dict] = []
 parser: ChatParser = parser
 database: UserDB = UserDB(DB_DIR,CACHE_DIR)
 
@@ -118,23 +135,109 @@ def get_resource_path(manager: Union[App, AppHandle, WebviewWindow]) -> dict[str
         "model": model_path,
         "encoder": encoder_path,
         "text_embedder": text_embedder,
-        "img_embedder": img_embedder
+        "img_embedder": img_embedder,
+        "fused": text_embedder / "fused.onnx"
     }
 
+def get_fused_path(paths: dict) -> Optional[Path]:
+    """Fused text + classifier graph from fuse_onnx.py, None once either model is newer"""
+    fused = paths["fused"]
+    sources = (paths["model"], paths["text_embedder"] / "model.onnx")
+    if not fused.exists() or any(fused.stat().st_mtime < p.stat().st_mtime for p in sources if p.exists()):
+        return None
+    return fused
+
 @commands.command()
 @handle_errors
 async def load_resources(app_handle: AppHandle) -> None:
-    global embedder, classifier, memory
+    global embedder, classifier, memory, worker_spec, memory_limit, resources
 
     parser.load_parsers()
-    paths = get_resource_path(app_handle)
-
-    classifier = EmotionClassifier(paths["model"], paths["encoder"])
-    embedder = Embedder(str(paths['text_embedder']), str(paths["img_embedder"]))
-    memory = Memory(embedder, MEM_DIR)
+    paths = resources = get_resource_path(app_handle)
+
+    cache = None
+    if read_config("Performance", "embedding_cache", True):
+        cache = EmbeddingCache(EMB_CACHE_DIR, read_config("Performance", "embedding_cache_size", 100_000))
+
+    sessions = get_session_configs()
+
+    # RSS ceiling the adaptive batch sizes stay under, 0 keeps them fixed
+    memory_limit = 0
+    if read_config("Performance", "adaptive_batching", True):
+        memory_limit = memory_ceiling(read_config("Performance", "memory_limit_mb", 0))
+
+    fused = get_fused_path(paths)
+    classifier = EmotionClassifier(paths["model"], paths["encoder"], sessions["classifier"])
+    embedder = Embedder(
+        str(paths['text_embedder']), 
+        str(paths["img_embedder"]), 
+        cache=cache,
+        text_config=sessions["text"],
+        image_config=sessions["image"],
+        fused_path=str(fused) if fused else None,
+        memory_limit=memory_limit
+    )
+    # "chroma" or "flat", the flat index copies an existing Chroma store on first start
+    vectors = open_backend(
+        read_config("Vectors", "backend", "chroma"),
+        MEM_DIR,
+        read_config("Vectors", "flat_dtype", "float32")
+    )
+    # ivfpq: compressed approximate index for large archives, "none" searches the backend
+    use_index = read_config("Vectors", "index", "none") == "ivfpq"
+    memory = Memory(
+        embedder,
+        vectors,
+        index_path=os.path.join(MEM_DIR, "ivfpq.npz") if use_index else None,
+        nprobe=read_config("Vectors", "nprobe", 16),
+        rerank=read_config("Vectors", "rerank", 200),
+        pq_m=read_config("Vectors", "pq_m", 64)
+    )
+    # deletes and profile merges reach the vector store
+    database.attach_vectors(memory)
+    # vectors from older versions lack the search filter fields, each store is
+    # checked once so later starts don't open it before first use
+    backfilled = os.path.join(MEM_DIR, f"{vectors.name}.backfilled")
+    if not os.path.exists(backfilled):
+        threading.Thread(target=backfill_vectors, args=(backfilled,), name="vector-backfill", daemon=True).start()
+    if use_index:
+        threading.Thread(target=prepare_vector_index, name="vector-index", daemon=True).start()
+
+    # embedding worker processes rebuild the same models from this
+    worker_spec = WorkerSpec(
+        text_embedder=str(paths["text_embedder"]),
+        img_embedder=str(paths["img_embedder"]),
+        model=str(paths["model"]),
+        encoder=str(paths["encoder"]),
+        fused=str(fused) if fused else None,
+        sessions=sessions,
+        cache_path=cache.db_path if cache else None,
+        cache_size=cache.max_entries if cache else 100_000,
+        memory_limit=memory_limit
+    )
 
     print("[LOG] Psychopass AI loaded successfully")
 
+def backfill_vectors(done_path: str):
+    try:
+        updated = memory.backfill_metadata(database.get_vector_metadata)
+        if updated:
+            logging.info(f"[INFO] Added search metadata to {updated} vectors")
+        os.makedirs(os.path.dirname(done_path), exist_ok=True)
+        open(done_path, "w").close()
+    except Exception as e:
+        logging.warning(f"[WARN] Vector metadata backfill failed: {e}")
+
+def prepare_vector_index():
+    """Loads the saved index, or builds one once the archive is big enough to need it"""
+    try:
+        if memory.load_index():
+            return
+        if memory.count() >= read_config("Vectors", "index_min_vectors", 200_000):
+            memory.rebuild_index()
+    except Exception as e:
+        logging.warning(f"[WARN] Vector index unavailable, using exact search: {e}")
+
 @commands.command()
 @handle_errors
 async def get_username() -> str:
@@ -165,6 +268,21 @@ async def get_emotion_messages(body: Annotated[EmotionRequest, "body"]) -> List[
 async def get_emotion_percentage() -> EmotionStats:
     return database.get_emotion_percentages()
 
+@commands.command()
+@handle_errors
+async def get_emotion_scores(body: Annotated[MessageRequest, "body"]) -> Optional[dict[str, float]]:
+    return database.get_emotion_scores(body.message_id)
+
+@commands.command()
+@handle_errors
+async def get_messages_by_confidence(body: Annotated[ConfidenceRequest, "body"]) -> List[dict]:
+    return database.get_messages_by_confidence(body.min_confidence, body.max_confidence, body.profile_id, body.limit)
+
+@commands.command()
+@handle_errors
+async def get_mixed_emotions(body: Annotated[ConfidenceRequest, "body"]) -> List[dict]:
+    return database.get_mixed_emotions(body.min_second, body.profile_id, body.limit)
+
 @commands.command()
 @handle_errors
 async def update_chat(body: Annotated[Chat,'body']) -> bool:
@@ -183,6 +301,33 @@ async def create_cfg() -> str:
         config.set("Preferences", "theme", "dark")
         config.set("Preferences", "language", "en")
         config.set("Preferences", "color", "#539ae2")
+
+        config.add_section("Performance")
+        config.set("Performance", "parse_workers", "1")
+        config.set("Performance", "embed_workers", "0")
+        config.set("Performance", "adaptive_batching", "true")
+        config.set("Performance", "memory_limit_mb", "0") # 0 = half of RAM
+        config.set("Performance", "embedding_cache", "true")
+        config.set("Performance", "embedding_cache_size", "100000")
+
+        config.add_section("Vectors")
+        config.set("Vectors", "backend", "chroma") # chroma or flat (exact search, memory-mapped)
+        config.set("Vectors", "flat_dtype", "float32") # float16 halves the file, costs a cast per search
+        config.set("Vectors", "index", "none") # ivfpq for 10M+ vector archives
+        config.set("Vectors", "index_min_vectors", "200000")
+        config.set("Vectors", "nprobe", "16") # lists scanned per query, recall vs latency
+        config.set("Vectors", "rerank", "200") # candidates re-scored with the exact vectors
+        config.set("Vectors", "pq_m", "64") # bytes per vector in the index
+
+        # ONNX Runtime, "<session>.<key>" overrides per session (text, image, classifier)
+        config.add_section("Runtime")
+        config.set("Runtime", "intra_op_threads", "0")
+        config.set("Runtime", "inter_op_threads", "0")
+        config.set("Runtime", "graph_optimization", "all")
+        config.set("Runtime", "execution_mode", "sequential")
+        config.set("Runtime", "allow_spinning", "true")
+        config.set("Runtime", "cache_optimized", "true")
+        config.set("Runtime", "classifier.intra_op_threads", "1")
         
         with open(CFG_DIR, "w", encoding='utf-8') as f:
             config.write(f)
@@ -221,129 +366,286 @@ async def change_config_value(body: Annotated[KeyRequest, "body"]) -> bool:
         return True
     return False
 
-def process_batch(batch: list[Message]) -> dict:
-    valid_messages = []
-    text_messages, text_inputs = [], []
-    image_messages, image_inputs = [], []
-
-    for msg in batch:
-        if msg.text and msg.text.strip():
-            text_messages.append(msg)
-            text_inputs.append(msg.text)
-            valid_messages.append(msg)
-        elif msg.media:
-            img = None
-            for m in msg.media:
-                if m.type == "photo" and m.path and os.path.exists(m.path):
-                    img = m.path
-                    break
-                if m.thumbnail and os.path.exists(m.thumbnail):
-                    img = m.thumbnail
-                    break
-            if img:
-                image_messages.append(msg)
-                image_inputs.append(img)
-                valid_messages.append(msg)
-
-    text_embeddings = embedder.embed_texts(text_inputs) if text_inputs else np.array([]).reshape(0, 512)
-    image_embeddings = embedder.embed_images(image_inputs) if image_inputs else np.array([]).reshape(0, 512)
-
-    classifier_embeddings = []
-    
-    for msg in valid_messages:
-        for i, text_msg in enumerate(text_messages):
-            if msg is text_msg:
-                classifier_embeddings.append(text_embeddings[i])
-                break
-        else:
-            for i, img_msg in enumerate(image_messages):
-                if msg is img_msg:
-                    classifier_embeddings.append(image_embeddings[i])
-                    break
+def read_config(section: str, key: str, fallback: Any) -> Any:
+    """Typed config lookup, missing sections/keys fall back to the default"""
+    config = configparser.ConfigParser()
+    config.read(CFG_DIR, encoding='utf-8')
+
+    if isinstance(fallback, bool):
+        return config.getboolean(section, key, fallback=fallback)
+    if isinstance(fallback, int):
+        return config.getint(section, key, fallback=fallback)
+    if isinstance(fallback, float):
+        return config.getfloat(section, key, fallback=fallback)
+    return config.get(section, key, fallback=fallback)
+
+def get_session_configs() -> dict[str, SessionConfig]:
+    """ONNX Runtime tuning from the [Runtime] section, see SessionConfig.from_config"""
+    config = configparser.ConfigParser()
+    config.read(CFG_DIR, encoding='utf-8')
 
     return {
-        "messages": valid_messages,
-        "text_embeddings": (text_messages, text_embeddings),
-        "image_embeddings": (image_messages, image_embeddings),
-        "classifier_embeddings": np.stack(classifier_embeddings) if classifier_embeddings else np.array([]).reshape(0, 512)
+        "text": SessionConfig.from_config(config, "text", cache_dir=MODELS_CACHE_DIR),
+        "image": SessionConfig.from_config(config, "image", cache_dir=MODELS_CACHE_DIR),
+        # tiny model, one thread keeps it from fighting the embedders
+        "classifier": SessionConfig.from_config(config, "classifier", intra_op_threads=1, cache_dir=MODELS_CACHE_DIR),
     }
 
+def process_batch(batch: list[Message]) -> MessageBatch:
+    result = MessageBatch.from_messages(batch)
+
+    if result.texts and embedder.fused:
+        embeddings, scores, scored = embedder.embed_texts_scored(result.texts)
+        result.embeddings[result.text_idx] = embeddings
+        result.set_scores(result.text_idx[scored], scores[scored])
+    elif result.texts:
+        result.embeddings[result.text_idx] = embedder.embed_texts(result.texts)
+    if result.images:
+        result.embeddings[result.image_idx] = embedder.embed_images(result.images)
+
+    return result
+
 def get_emotion_class(
         app_handle: AppHandle, 
         platform: str, 
-        messages: list[Message], 
-        chats: list[Chat], 
+        batches: Iterator[ParseBatch], 
         current_fn: str, 
-        loop, 
-        batch_size: int = 32
-    ) -> list[str]:
-
-    predictions = []
-    num_batches = math.ceil(len(messages) / batch_size)
-
-    for batch_idx, i in enumerate(range(0, len(messages), batch_size), start=1):
-        batch = messages[i:i + batch_size]
-
-        Emitter.emit(
-            app_handle,
-            "emotion_analyzing",
-            Download(
-                current_file=current_fn,
-                progress=batch_idx,
-                max_progress=num_batches
-            )
+        loop,
+        batch_size: int = 32,
+        checkpoints: Optional[IngestCheckpoints] = None
+    ) -> int:
+    """
+    Ingest pipeline: parse -> dedup -> embed -> classify -> DB write -> vector write.
+    Every stage runs in its own thread, so ONNX inference overlaps with
+    SQLite and vector store writes of the previous batches. With embed_workers
+    set, embedding and classification run in worker processes instead.
+    """
+
+    def dedup(parsed: ParseBatch) -> Optional[ParseBatch]:
+        # re-imports only pay for messages that aren't stored yet
+        parsed.messages = database.filter_new_messages(parsed.messages)
+        return parsed if parsed.messages else None
+
+    def embed(parsed: ParseBatch) -> Tuple[ParseBatch, MessageBatch]:
+        return parsed, process_batch(parsed.messages)
+
+    def classify(item: Tuple[ParseBatch, MessageBatch]) -> Tuple[ParseBatch, MessageBatch]:
+        classifier.predict_batch(item[1])
+        return item
+
+    def write_db(item: Tuple[ParseBatch, MessageBatch]) -> Tuple[ParseBatch, MessageBatch]:
+        parsed, batch = item
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(
+            database.add_messages_batch(platform, batch, parsed.chats),
+            loop
+        )
+        future.result()
+        db_batch.record(len(batch), time.perf_counter() - start)
+        return item
+
+    def write_vectors(item: Tuple[ParseBatch, MessageBatch]) -> Tuple[ParseBatch, MessageBatch]:
+        parsed, batch = item
+        if batch.texts:
+            memory.add_text(batch)
+        if batch.images:
+            memory.add_images(batch)
+
+        checkpoints.commit(parsed, len(batch.texts) + len(batch.images))
+        return item
+
+    checkpoints = checkpoints or IngestCheckpoints(database, memory)
+    database.set_emotion_labels(classifier.classes)
+
+    # parser batches are merged up to the DB batch size the controller picks
+    db_batch = AdaptiveBatchSize("db", batch_size, batch_size, 1024 if memory_limit else batch_size, memory_limit, step=batch_size)
+    source = rebatch(checkpoints.resume(batches), db_batch)
+
+    # embed_workers: 0 = embed in this process, N = worker processes
+    workers = read_config("Performance", "embed_workers", 0)
+    pool = EmbedPool(worker_spec, workers) if workers > 0 else None
+
+    if pool is not None:
+        deduped = Pipeline(source).stage("dedup", dedup).run()
+        pipeline = Pipeline(pool.imap(deduped))
+    else:
+        pipeline = (
+            Pipeline(source)
+            .stage("dedup", dedup)
+            .stage("embed", embed)
         )
 
-        result = process_batch(batch)
-        
-        batch_predictions = classifier.predict_batch(result["classifier_embeddings"])
+    pipeline = (
+        pipeline
+        .stage("classify", classify)
+        .stage("db", write_db)
+        .stage("vectors", write_vectors)
+    )
 
-        for msg, emo in zip(batch, batch_predictions):
-            msg.emotion = emo
+    analyzed = 0
 
-        future = asyncio.run_coroutine_threadsafe(
-            database.add_messages_batch(platform, batch, chats),
-            loop
-        )
-        future.result() 
+    try:
+        for parsed, batch in pipeline.run():
+            analyzed += len(batch.texts) + len(batch.images)
 
-        if result["text_embeddings"][1].shape[0] > 0:
-            memory.add_text(*result["text_embeddings"])
-        if result["image_embeddings"][1].shape[0] > 0:
-            memory.add_images(*result["image_embeddings"])
+            Emitter.emit(
+                app_handle,
+                "emotion_analyzing",
+                Download(
+                    current_file=current_fn,
+                    progress=parsed.progress,
+                    max_progress=parsed.total
+                )
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+
+    checkpoints.finish()
+    memory.save_index()
 
-        predictions.extend(batch_predictions)
+    # in worker mode the embedding sizes are logged by the workers
+    batch_stats[:] = [db_batch.stats()] + embedder.batch_stats()
+    logging.info(f"[INFO] Batch sizes: {batch_stats}")
 
-    return predictions
+    if embedder.cache is not None:
+        logging.info(f"[INFO] Embedding cache: {embedder.cache.stats()}")
+    return analyzed
 
-async def parse_messages(app_handle: AppHandle, body: Annotated[FileDir, "body"]) -> Tuple[List[Message], List[Chat]]:
+async def parse_messages(app_handle: AppHandle, body: Annotated[FileDir, "body"], batch_size: int = 32) -> int:
     loop = asyncio.get_running_loop()
-    messages, chats = await loop.run_in_executor(
-        executor,
-        parser.parse,
-        body.platform,
-        body.path
-    )
 
-    await loop.run_in_executor(
+    # the stream is lazy, parsing happens batch by batch inside the worker
+    # parse_workers: 1 = streamed in bounded batches, 0 = one process per core
+    # holding whole files, worth it only for exports of many small files
+    workers = read_config("Performance", "parse_workers", 1)
+    # stream parsers seek files with a checkpoint past the committed messages
+    checkpoints = IngestCheckpoints(database, memory)
+    batches = parser.stream(body.platform, body.path, batch_size, workers, checkpoints.start)
+
+    return await loop.run_in_executor(
         executor,
         get_emotion_class,
         app_handle,
         body.platform,
-        messages,
-        chats,
+        batches,
         os.path.basename(body.path),
-        loop
+        loop,
+        batch_size,
+        checkpoints
     )
 
-    return messages, chats
-
 @commands.command()
 @handle_errors
 async def analyze_messages(app_handle: AppHandle, body: Annotated[FileDir, "body"]) -> None:
     await parse_messages(app_handle, body)
     database.update_stats_auto()
 
+def reclassify(app_handle: AppHandle, chunk_size: int = 4096) -> int:
+    """
+    Re-runs the classifier over the stored vectors: vector store read ->
+    classify -> bulk DB update, each in its own thread. Nothing is re-parsed
+    or re-embedded.
+    """
+    global classifier, worker_spec
+
+    # pick up a replaced model or label encoder
+    classifier = EmotionClassifier(resources["model"], resources["encoder"], get_session_configs()["classifier"])
+
+    # the fused graph carries its own copy of the classifier, reload it or
+    # fall back to the plain text model when it predates the new one
+    fused = get_fused_path(resources)
+    embedder.set_fused(str(fused) if fused else None)
+    worker_spec = replace(worker_spec, fused=str(fused) if fused else None)
+    database.set_emotion_labels(classifier.classes)
+
+    def classify(chunk: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        message_ids, embeddings = chunk
+        probs = classifier.predict_probs_batch(embeddings)
+        emotions = classifier.label_encoder.inverse_transform(np.argmax(probs, axis=1))
+        return message_ids, probs, [str(e) for e in emotions]
+
+    def write_db(item: Tuple[np.ndarray, np.ndarray, List[str]]) -> int:
+        message_ids, probs, emotions = item
+        database.update_emotions(message_ids.tolist(), emotions, probs)
+        return len(message_ids)
+
+    pipeline = (
+        Pipeline(memory.iter_embeddings(chunk_size))
+        .stage("classify", classify)
+        .stage("db", write_db)
+    )
+
+    total = memory.count()
+    done = 0
+
+    for count in pipeline.run():
+        done += count
+        Emitter.emit(
+            app_handle,
+            "emotion_reclassifying",
+            Download(current_file="reclassify", progress=done, max_progress=total)
+        )
+
+    return done
+
+@commands.command()
+@handle_errors
+async def reclassify_messages(app_handle: AppHandle) -> int:
+    if not reclassify_lock.acquire(blocking=False):
+        raise RuntimeError("Re-classification is already running")
+
+    try:
+        loop = asyncio.get_running_loop()
+        updated = await loop.run_in_executor(executor, reclassify, app_handle)
+    finally:
+        reclassify_lock.release()
+
+    # emotion statistics are computed from message.emotion, tell the UI to reload them
+    Emitter.emit(app_handle, "load_event", LoadEvent(type="emotion_stats", success=True))
+    logging.info(f"[INFO] Re-classified {updated} messages")
+    return updated
+
+def reembed(app_handle: AppHandle) -> int:
+    updated = 0
+    for count, done, total in memory.reembed_images(database.get_image_paths):
+        updated += count
+        Emitter.emit(
+            app_handle,
+            "images_reembedding",
+            Download(current_file="reembed", progress=done, max_progress=total)
+        )
+    return updated
+
+@commands.command()
+@handle_errors
+async def reembed_images(app_handle: AppHandle) -> int:
+    # image vectors from before the current IMAGE_PREPROCESSING don't compare
+    # with new ones, this brings an archive over without a re-import
+    if not reclassify_lock.acquire(blocking=False):
+        raise RuntimeError("Re-classification or re-embedding is already running")
+
+    try:
+        loop = asyncio.get_running_loop()
+        updated = await loop.run_in_executor(executor, reembed, app_handle)
+    finally:
+        reclassify_lock.release()
+
+    logging.info(f"[INFO] Re-embedded {updated} images")
+    return updated
+
+@commands.command()
+@handle_errors
+async def rebuild_vector_index() -> dict:
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, memory.rebuild_index)
+    return memory.index_stats()
+
+@commands.command()
+@handle_errors
+async def get_vector_index_stats() -> dict:
+    return memory.index_stats()
+
 @commands.command()
 @handle_errors
 async def get_statistics() -> Optional[dict]:
@@ -393,15 +695,30 @@ async def unmerge_profiles(body: Annotated[MergeRequest, "body"]) -> str:
 @handle_errors
 async def search_messages(body: Annotated[SearchQuery, "body"]) -> Optional[List[Message]]:
     if body.engine == "vector":
-        return await vector_search(body.query)
+        return await vector_search(body)
     else:
         return await linear_search(body.query)
 
-async def vector_search(query: str) -> Optional[List[Message]]:
+def search_filters(body: Union[SearchQuery, BatchSearchQuery, SimilarRequest]) -> dict:
+    return {
+        "chat_id": body.chat_id,
+        "user_id": body.profile_id,
+        "emotion": body.emotion,
+        "type": body.type,
+        "since": to_epoch(body.since) if body.since else None,
+        "until": to_epoch(body.until) if body.until else None
+    }
+
+async def vector_search(body: SearchQuery) -> Optional[List[Message]]:
     messages: List[Message] = []
 
-    embedding = embedder.embed_texts([query])[0]
-    hits = memory.search_embedding(embedding, top_k=5)
+    embedding = embedder.embed_texts([body.query])[0]
+    hits = memory.search_embedding(
+        embedding,
+        top_k=body.top_k,
+        offset=body.offset,
+        filters=search_filters(body)
+    )
 
     for k in hits:
         message = database.get_message(k['id'])
@@ -410,6 +727,39 @@ async def vector_search(query: str) -> Optional[List[Message]]:
 
     return messages
 
+@commands.command()
+@handle_errors
+async def search_messages_batch(body: Annotated[BatchSearchQuery, "body"]) -> List[List[Message]]:
+    if not body.queries:
+        return []
+
+    embeddings = embedder.embed_texts(body.queries)
+    hits = memory.search_many(embeddings, top_k=body.top_k, filters=search_filters(body))
+
+    found = database.get_messages_by_ids(list({k['id'] for group in hits for k in group}))
+    return [[found[k['id']] for k in group if k['id'] in found] for group in hits]
+
+@commands.command()
+@handle_errors
+async def find_similar_messages(body: Annotated[SimilarRequest, "body"]) -> List[Message]:
+    # the stored vector is the query: no model run, works for image messages too
+    hits = memory.search_similar([body.message_id], top_k=body.top_k, offset=body.offset, filters=search_filters(body))[0]
+
+    found = database.get_messages_by_ids([k['id'] for k in hits])
+    return [found[k['id']] for k in hits if k['id'] in found]
+
+@commands.command()
+@handle_errors
+async def get_embedding_cache_stats() -> Optional[dict]:
+    if embedder.cache is None:
+        return None
+    return embedder.cache.stats()
+
+@commands.command()
+@handle_errors
+async def get_batch_sizes() -> List[dict]:
+    return batch_stats
+
 async def linear_search(query: str):
     return database.search_messages(query)
 
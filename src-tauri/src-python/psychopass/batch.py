@@ -0,0 +1,92 @@
+import os
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+from psychopass.schemas import Message
+
+# modality mask values
+SKIPPED, TEXT, IMAGE = 0, 1, 2
+
+def get_image_path(msg: Message) -> Optional[str]:
+    """First local photo or thumbnail that can be embedded"""
+    for m in msg.media or []:
+        if m.type == "photo" and m.path and os.path.exists(m.path):
+            return m.path
+        if m.thumbnail and os.path.exists(m.thumbnail):
+            return m.thumbnail
+    return None
+
+@dataclass
+class MessageBatch:
+    """
+    Struct-of-arrays view of one ingest batch.
+    Row i of every array belongs to messages[i], stages fill the arrays
+    in place instead of rebuilding per-message lists.
+    """
+    messages: List[Message]
+    modality: np.ndarray
+    text_idx: np.ndarray
+    image_idx: np.ndarray
+    texts: List[str]
+    images: List[str]
+    embeddings: np.ndarray
+    emotions: List[Optional[str]] = field(default_factory=list)
+    ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    chat_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    user_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    scores: Optional[np.ndarray] = None # (n, classes), allocated on first set_scores
+    scored: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+
+    @classmethod
+    def from_messages(cls, messages: List[Message], dim: int = 512) -> "MessageBatch":
+        n = len(messages)
+        modality = np.zeros(n, dtype=np.uint8)
+        texts, images = [], []
+
+        for i, msg in enumerate(messages):
+            if msg.text and msg.text.strip():
+                modality[i] = TEXT
+                texts.append(msg.text)
+            elif msg.media:
+                img = get_image_path(msg)
+                if img:
+                    modality[i] = IMAGE
+                    images.append(img)
+
+        return cls(
+            messages=messages,
+            modality=modality,
+            text_idx=np.flatnonzero(modality == TEXT),
+            image_idx=np.flatnonzero(modality == IMAGE),
+            texts=texts,
+            images=images,
+            embeddings=np.zeros((n, dim), dtype=np.float32),
+            emotions=[None] * n,
+            ids=np.zeros(n, dtype=np.int64),
+            chat_ids=np.zeros(n, dtype=np.int64),
+            user_ids=np.zeros(n, dtype=np.int64),
+            scored=np.zeros(n, dtype=bool)
+        )
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def valid_idx(self) -> np.ndarray:
+        """Rows that have an embedding"""
+        return np.flatnonzero(self.modality != SKIPPED)
+
+    def set_emotions(self, emotions: List[str]):
+        """emotions are aligned with valid_idx"""
+        for i, emo in zip(self.valid_idx.tolist(), emotions):
+            self.emotions[i] = emo
+
+    def set_scores(self, rows: np.ndarray, scores: np.ndarray):
+        """Classifier scores for rows, e.g. from the fused text model"""
+        if len(rows) == 0:
+            return
+        if self.scores is None:
+            self.scores = np.zeros((len(self), scores.shape[1]), dtype=np.float32)
+        self.scores[rows] = scores
+        self.scored[rows] = True
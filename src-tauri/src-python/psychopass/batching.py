@@ -0,0 +1,118 @@
+import threading, psutil
+from typing import Iterator, Optional
+from psychopass.parser import ParseBatch
+
+def memory_ceiling(limit_mb: int = 0) -> int:
+    """RSS ceiling in bytes, 0 = half of the machine's RAM"""
+    if limit_mb > 0:
+        return limit_mb * 1024 * 1024
+    return psutil.virtual_memory().total // 2
+
+class AdaptiveBatchSize:
+    """
+    AIMD batch size controller. The size grows by step while latency per
+    unit of work stays near the best seen and RSS has headroom, and is
+    halved once RSS crosses the ceiling or latency clearly degrades.
+    With minimum == maximum the size is fixed.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int, memory_limit: int = 0, step: Optional[int] = None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.size = min(max(initial, minimum), self.maximum)
+        self.memory_limit = memory_limit
+        self.step = step or max(1, self.minimum)
+
+        self.best: Optional[float] = None # seconds per unit of work
+        self.peak_rss = 0
+        self.batches = 0
+        self.shrinks = 0
+
+        self.lock = threading.Lock()
+        self.process = psutil.Process()
+
+    @property
+    def fixed(self) -> bool:
+        return self.minimum == self.maximum
+
+    def record(self, items: int, seconds: float, work: Optional[int] = None) -> int:
+        """
+        Reports one finished batch and returns the next size. work is what
+        latency is normalized by, e.g. padded tokens, defaults to items.
+        """
+        if self.fixed or items <= 0:
+            return self.size
+
+        rss = self.process.memory_info().rss
+        per_unit = seconds / max(work or items, 1)
+
+        with self.lock:
+            self.batches += 1
+            self.peak_rss = max(self.peak_rss, rss)
+
+            if self.memory_limit and rss > self.memory_limit:
+                self._shrink()
+            elif items < self.size:
+                # partial batch (end of file, dedup), says nothing about the size
+                pass
+            elif self.best is None or per_unit <= self.best * 1.05:
+                self.best = per_unit if self.best is None else min(self.best, per_unit)
+                if not self.memory_limit or rss < self.memory_limit * 0.8:
+                    self.size = min(self.maximum, self.size + self.step)
+            elif per_unit > self.best * 1.5:
+                self._shrink()
+
+            return self.size
+
+    def _shrink(self):
+        self.size = max(self.minimum, self.size // 2)
+        self.shrinks += 1
+        # the old best was measured at another size
+        self.best = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "name": self.name,
+                "size": self.size,
+                "min": self.minimum,
+                "max": self.maximum,
+                "batches": self.batches,
+                "shrinks": self.shrinks,
+                "peak_rss_mb": self.peak_rss // (1024 * 1024),
+                "memory_limit_mb": self.memory_limit // (1024 * 1024)
+            }
+
+def rebatch(batches: Iterator[ParseBatch], sizer: AdaptiveBatchSize) -> Iterator[ParseBatch]:
+    """
+    Merges consecutive parser batches of the same file until sizer.size
+    messages, so DB writes follow the controller instead of the parser.
+    """
+    pending: Optional[ParseBatch] = None
+
+    for parsed in batches:
+        if pending is not None and (
+            parsed.file != pending.file
+            or parsed.offset != pending.end
+        ):
+            yield pending
+            pending = None
+
+        if pending is None:
+            pending = parsed
+        else:
+            # new lists, parsers may share theirs between batches
+            pending.messages = pending.messages + parsed.messages
+            pending.chats = pending.chats + [c for c in parsed.chats if all(c is not p for p in pending.chats)]
+            pending.progress = parsed.progress
+            pending.total = parsed.total
+            pending.end = parsed.end
+            pending.position = parsed.position
+
+        if len(pending.messages) >= sizer.size:
+            yield pending
+            pending = None
+
+    if pending is not None:
+        yield pending
@@ -0,0 +1,88 @@
+import os, logging
+from typing import Dict, Iterator, Tuple
+
+from psychopass.database import UserDB
+from psychopass.memory import Memory
+from psychopass.parser import ParseBatch
+from psychopass.utils import file_hash
+
+class IngestCheckpoints:
+    """
+    Per-file import progress, so a crashed import resumes where it stopped.
+    A file is identified by file_hash (size, mtime, first and last bytes),
+    its checkpoint holds how many of its messages are committed to both
+    SQLite and the vector store, and the byte position after the last one
+    for parsers that can seek.
+    """
+
+    def __init__(self, database: UserDB, memory: Memory):
+        self.database = database
+        self.memory = memory
+        self.files: Dict[str, dict] = {}
+
+    def start(self, file: str) -> Tuple[int, int]:
+        """(message offset, byte position) to resume file at, see ChatParser.stream"""
+        if file not in self.files:
+            self._open(file)
+        state = self.files.get(file)
+        return state["start"] if state else (0, 0)
+
+    def resume(self, batches: Iterator[ParseBatch]) -> Iterator[ParseBatch]:
+        """Drops messages an interrupted import already committed"""
+        for parsed in batches:
+            skip = self.start(parsed.file)[0]
+
+            # parsers that seeked to the checkpoint start at skip already,
+            # the others parse the committed messages again and only the
+            # embed and write stages are skipped for them
+            if parsed.end <= skip:
+                continue
+
+            if parsed.offset < skip:
+                parsed.messages = parsed.messages[skip - parsed.offset:]
+                parsed.offset = skip
+
+            yield parsed
+
+    def _open(self, file: str):
+        # parsers without per-file batches can't be resumed
+        if not os.path.isfile(file):
+            return
+
+        file_id = file_hash(file)
+        checkpoint = self.database.get_checkpoint(file_id)
+        self.files[file] = {"hash": file_id, "vectors": 0, "start": (0, 0)}
+
+        if checkpoint is None:
+            return
+
+        # vector store lost writes since the checkpoint, redo the file
+        if checkpoint["vector_count"] > self.memory.count():
+            logging.warning(f"[WARN] Vector store is behind checkpoint of {file}, importing it again")
+            return
+
+        self.files[file]["vectors"] = checkpoint["vectors"]
+        self.files[file]["start"] = (checkpoint["batch_offset"], checkpoint["byte_offset"] or 0)
+        logging.info(f"[INFO] Resuming {file} from message {checkpoint['batch_offset']}")
+
+    def commit(self, parsed: ParseBatch, vectors: int):
+        """Called once a batch is written everywhere"""
+        state = self.files.get(parsed.file)
+        if state is None:
+            return
+
+        state["vectors"] += vectors
+        self.database.save_checkpoint(
+            state["hash"],
+            parsed.file,
+            parsed.end,
+            parsed.position,
+            state["vectors"],
+            self.memory.count()
+        )
+
+    def finish(self):
+        """Import went through, checkpoints are not needed anymore"""
+        for state in self.files.values():
+            self.database.delete_checkpoint(state["hash"])
+        self.files.clear()
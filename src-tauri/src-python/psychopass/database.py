@@ -1,5 +1,5 @@
-import sqlite3, os
-from typing import Optional, List
+import sqlite3, os, logging
+from typing import Optional, List, Set
 from contextlib import contextmanager
 
 from psychopass.cache import Cache
@@ -7,6 +7,9 @@ from psychopass.db import ProfileManager
 from psychopass.db import ChatManager
 from psychopass.db import MessageManager
 from psychopass.db import StatsManager
+from psychopass.db import CheckpointManager
+from psychopass.db import EmotionScoreManager
+from psychopass.db.emotion_score_manager import register_functions
 
 class UserDB:
     def __init__(self, db_path: str, cache_path: str):
@@ -24,15 +27,53 @@ class UserDB:
         self.chats = ChatManager(self)
         self.messages = MessageManager(self)
         self.stats = StatsManager(self)
+        self.checkpoints = CheckpointManager(self)
+        self.emotion_scores = EmotionScoreManager(self)
+
+        # vector store kept in sync with message deletes/moves, see attach_vectors
+        self.vectors = None
         
         self._init_db()
         self.stats._ensure_stats_row()
     
+    def attach_vectors(self, vectors):
+        """vectors needs contains(message_ids), delete(message_ids) and update_metadata(message_ids, **fields)"""
+        self.vectors = vectors
+
+    def with_vectors(self, message_ids: List[int]) -> Set[int]:
+        """Messages among message_ids whose vector is stored, all of them without a vector store"""
+        if self.vectors is None or not message_ids:
+            return set(message_ids)
+        try:
+            return self.vectors.contains(message_ids)
+        except Exception as e:
+            logging.warning(f"[WARN] Failed to look up {len(message_ids)} vectors: {e}")
+            return set(message_ids)
+
+    def on_messages_deleted(self, message_ids: List[int]):
+        """Called by managers after deleted messages are committed"""
+        if self.vectors is None or not message_ids:
+            return
+        try:
+            self.vectors.delete(message_ids)
+        except Exception as e:
+            logging.warning(f"[WARN] Failed to delete {len(message_ids)} vectors: {e}")
+
+    def on_messages_updated(self, message_ids: List[int], **metadata):
+        """Called by managers after message fields that vectors carry changed"""
+        if self.vectors is None or not message_ids:
+            return
+        try:
+            self.vectors.update_metadata(message_ids, **metadata)
+        except Exception as e:
+            logging.warning(f"[WARN] Failed to update {len(message_ids)} vectors: {e}")
+
     @contextmanager
     def get_connection(self):
         """Context manager"""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
+        register_functions(conn)
         try:
             yield conn
             conn.commit()
@@ -132,6 +173,42 @@ class UserDB:
                 )
             """)
 
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+                    file_hash TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    batch_offset INTEGER DEFAULT 0,
+                    byte_offset INTEGER DEFAULT 0,
+                    vectors INTEGER DEFAULT 0,
+                    vector_count INTEGER DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # checkpoints written before parsers could seek
+            cursor.execute("PRAGMA table_info(ingest_checkpoint)")
+            if "byte_offset" not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE ingest_checkpoint ADD COLUMN byte_offset INTEGER DEFAULT 0")
+
+            # float16 class probabilities, columns in emotion_label order
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS emotion_score (
+                    message_id INTEGER PRIMARY KEY,
+                    scores BLOB NOT NULL,
+                    confidence REAL NOT NULL,
+                    FOREIGN KEY(message_id) REFERENCES message(id)
+                )
+            """)
+
+            cursor.execute("CREATE INDEX IF NOT EXISTS emotion_score_confidence ON emotion_score(confidence)")
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS emotion_label (
+                    idx INTEGER PRIMARY KEY,
+                    emotion TEXT NOT NULL
+                )
+            """)
+
         return f"Succesfully created db at {self.db_path}"
     
     
@@ -174,8 +251,14 @@ class UserDB:
     def get_message(self, message_id: int):
         return self.messages.get(message_id)
 
+    def get_messages_by_ids(self, message_ids: List[int]):
+        return self.messages.get_many(message_ids)
+
     def add_messages_batch(self, platform: str, messages, chats):
         return self.messages.add_batch(platform, messages, chats)
+
+    def filter_new_messages(self, messages):
+        return self.messages.filter_new(messages)
     
     def get_chat_messages(self, chat_id: int):
         return self.messages.get_by_chat(chat_id)
@@ -195,12 +278,47 @@ class UserDB:
     def search_messages(self, query: str):
         return self.messages.search_messages(query)
     
+    def update_emotions(self, message_ids: List[int], emotions: List[str], scores=None):
+        return self.messages.update_emotions(message_ids, emotions, scores)
+    
     def delete_message(self, message_id: int):
         return self.messages.delete(message_id)
+
+    def get_image_paths(self, message_ids: List[int]):
+        return self.messages.get_image_paths(message_ids)
+
+    def get_vector_metadata(self, message_ids: List[int]):
+        return self.messages.get_vector_metadata(message_ids)
     
     # Stats methods
     def get_stats(self):
         return self.stats.get()
     
     def update_stats_auto(self):
-        return self.stats.update_auto()
\ No newline at end of file
+        return self.stats.update_auto()
+    
+    # Checkpoint methods
+    def get_checkpoint(self, file_hash: str):
+        return self.checkpoints.get(file_hash)
+    
+    def save_checkpoint(self, file_hash: str, path: str, batch_offset: int, byte_offset: int, vectors: int, vector_count: int):
+        return self.checkpoints.save(file_hash, path, batch_offset, byte_offset, vectors, vector_count)
+    
+    def delete_checkpoint(self, file_hash: str):
+        return self.checkpoints.delete(file_hash)
+    
+    # Emotion score methods
+    def set_emotion_labels(self, labels: List[str]):
+        return self.emotion_scores.set_labels(labels)
+
+    def get_emotion_scores(self, message_id: int):
+        return self.emotion_scores.get(message_id)
+
+    def get_emotion_scores_batch(self, message_ids: List[int]):
+        return self.emotion_scores.get_batch(message_ids)
+
+    def get_messages_by_confidence(self, min_confidence: float = 0.0, max_confidence: float = 1.0, profile_id: Optional[int] = None, limit: int = 100):
+        return self.emotion_scores.get_by_confidence(min_confidence, max_confidence, profile_id, limit)
+
+    def get_mixed_emotions(self, min_second: float = 0.3, profile_id: Optional[int] = None, limit: int = 100):
+        return self.emotion_scores.get_mixed(min_second, profile_id, limit)
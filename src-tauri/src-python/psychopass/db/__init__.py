@@ -2,5 +2,7 @@ from .message_manager import MessageManager
 from .profile_manager import ProfileManager
 from .stats_manager import StatsManager
 from .chat_manager import ChatManager
+from .checkpoint_manager import CheckpointManager
+from .emotion_score_manager import EmotionScoreManager
 
-__all__ = ['MessageManager', 'ProfileManager', 'StatsManager', 'ChatManager']
\ No newline at end of file
+__all__ = ['MessageManager', 'ProfileManager', 'StatsManager', 'ChatManager', 'CheckpointManager', 'EmotionScoreManager']
\ No newline at end of file
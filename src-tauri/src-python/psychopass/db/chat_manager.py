@@ -144,6 +144,14 @@ class ChatManager:
                 WHERE message_id IN (SELECT id FROM message WHERE chat_id = ?)
             """, (chat_id,))
             
+            cursor.execute("""
+                DELETE FROM emotion_score
+                WHERE message_id IN (SELECT id FROM message WHERE chat_id = ?)
+            """, (chat_id,))
+            
+            cursor.execute("SELECT id FROM message WHERE chat_id = ?", (chat_id,))
+            message_ids = [row[0] for row in cursor.fetchall()]
+            
             # Delete chat messages
             cursor.execute("DELETE FROM message WHERE chat_id = ?", (chat_id,))
             deleted_messages = cursor.rowcount
@@ -151,8 +159,9 @@ class ChatManager:
             # Delete chat
             cursor.execute("DELETE FROM chat WHERE id = ?", (chat_id,))
             
-            return {
-                "success": True, 
-                "deleted_chat_id": chat_id,
-                "deleted_messages": deleted_messages
-            }
+        self.db.on_messages_deleted(message_ids)
+        return {
+            "success": True, 
+            "deleted_chat_id": chat_id,
+            "deleted_messages": deleted_messages
+        }
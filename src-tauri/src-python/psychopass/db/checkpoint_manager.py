@@ -0,0 +1,44 @@
+from typing import Optional, Dict
+
+class CheckpointManager:
+    def __init__(self, user_db):
+        self.user_db = user_db
+
+    def get(self, file_hash: str) -> Optional[Dict]:
+        """Checkpoint of an unfinished import, if there is one"""
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT file_hash, path, batch_offset, byte_offset, vectors, vector_count, updated_at
+                FROM ingest_checkpoint
+                WHERE file_hash = ?
+            """, (file_hash,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def save(self, file_hash: str, path: str, batch_offset: int, byte_offset: int, vectors: int, vector_count: int):
+        """
+        batch_offset - messages of the file that are fully committed
+        byte_offset  - position in the file after them, 0 if the parser can't seek
+        vectors      - vectors written for the file so far
+        vector_count - size of the vector store after the last write
+        """
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO ingest_checkpoint (file_hash, path, batch_offset, byte_offset, vectors, vector_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(file_hash) DO UPDATE SET
+                    path = excluded.path,
+                    batch_offset = excluded.batch_offset,
+                    byte_offset = excluded.byte_offset,
+                    vectors = excluded.vectors,
+                    vector_count = excluded.vector_count,
+                    updated_at = excluded.updated_at
+            """, (file_hash, path, batch_offset, byte_offset, vectors, vector_count))
+
+    def delete(self, file_hash: str):
+        """Drop checkpoint once the file is fully imported"""
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("DELETE FROM ingest_checkpoint WHERE file_hash = ?", (file_hash,))
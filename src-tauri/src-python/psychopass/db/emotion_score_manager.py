@@ -0,0 +1,145 @@
+import struct
+import numpy as np
+from typing import Optional, Dict, List
+
+def emotion_prob(scores: Optional[bytes], idx: int) -> Optional[float]:
+    """SQL: emotion_prob(scores, idx), probability of class idx in a float16 blob"""
+    if scores is None or idx < 0 or (idx + 1) * 2 > len(scores):
+        return None
+    return struct.unpack_from("<e", scores, idx * 2)[0]
+
+def emotion_second(scores: Optional[bytes]) -> Optional[float]:
+    """SQL: emotion_second(scores), probability of the runner-up class"""
+    if scores is None or len(scores) < 4:
+        return None
+    probs = sorted(struct.unpack(f"<{len(scores) // 2}e", scores), reverse=True)
+    return probs[1]
+
+def register_functions(conn):
+    conn.create_function("emotion_prob", 2, emotion_prob, deterministic=True)
+    conn.create_function("emotion_second", 1, emotion_second, deterministic=True)
+
+class EmotionScoreManager:
+    """
+    Per-message class probabilities, stored as little-endian float16 blobs
+    with columns in emotion_label order. confidence is the top probability.
+    """
+
+    def __init__(self, user_db):
+        self.user_db = user_db
+
+    def set_labels(self, labels: List[str]):
+        """Column order of the score blobs, replaced when the classifier changes"""
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT emotion FROM emotion_label ORDER BY idx")
+            if [row[0] for row in cursor.fetchall()] == list(labels):
+                return
+
+            # scores of another label set can't be read anymore
+            cursor.execute("DELETE FROM emotion_label")
+            cursor.execute("DELETE FROM emotion_score")
+            cursor.executemany(
+                "INSERT INTO emotion_label (idx, emotion) VALUES (?, ?)",
+                list(enumerate(labels))
+            )
+
+    def get_labels(self) -> List[str]:
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT emotion FROM emotion_label ORDER BY idx")
+            return [row[0] for row in cursor.fetchall()]
+
+    def save_batch(self, message_ids: List[int], scores: np.ndarray, db=None):
+        """scores is (n, classes) aligned with message_ids"""
+        if not message_ids:
+            return
+
+        # confidence from the stored precision, so SQL comparisons agree with the blob
+        scores = np.asarray(scores, dtype="<f2")
+        rows = [
+            (message_id, row.tobytes(), float(row.max()))
+            for message_id, row in zip(message_ids, scores)
+            if message_id
+        ]
+
+        def write(conn):
+            conn.executemany("""
+                INSERT OR REPLACE INTO emotion_score (message_id, scores, confidence)
+                VALUES (?, ?, ?)
+            """, rows)
+
+        if db is not None:
+            write(db)
+            return
+        with self.user_db.get_connection() as conn:
+            write(conn)
+
+    def get(self, message_id: int) -> Optional[Dict[str, float]]:
+        return self.get_batch([message_id]).get(message_id)
+
+    def get_batch(self, message_ids: List[int]) -> Dict[int, Dict[str, float]]:
+        """Probabilities by emotion for every message that has scores"""
+        labels = self.get_labels()
+        result: Dict[int, Dict[str, float]] = {}
+
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            for i in range(0, len(message_ids), 500):
+                chunk = message_ids[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                cursor.execute(f"""
+                    SELECT message_id, scores FROM emotion_score
+                    WHERE message_id IN ({placeholders})
+                """, chunk)
+                for message_id, blob in cursor.fetchall():
+                    probs = np.frombuffer(blob, dtype="<f2").astype(np.float32)
+                    result[message_id] = {label: float(p) for label, p in zip(labels, probs)}
+
+        return result
+
+    def get_by_confidence(
+            self,
+            min_confidence: float = 0.0,
+            max_confidence: float = 1.0,
+            profile_id: Optional[int] = None,
+            limit: int = 100
+        ) -> List[Dict]:
+        """Messages whose top probability is in range, low ranges are the unsure ones"""
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            query = """
+                SELECT m.id AS message_id, m.emotion, s.confidence, emotion_second(s.scores) AS second
+                FROM emotion_score s
+                JOIN message m ON m.id = s.message_id
+                WHERE s.confidence BETWEEN ? AND ?
+            """
+            params: list = [min_confidence, max_confidence]
+            if profile_id is not None:
+                query += " AND m.user_id = ?"
+                params.append(profile_id)
+            query += " ORDER BY s.confidence ASC LIMIT ?"
+            params.append(limit)
+
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_mixed(self, min_second: float = 0.3, profile_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        """Messages where the runner-up emotion is at least min_second likely"""
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            query = """
+                SELECT m.id AS message_id, m.emotion, s.confidence, emotion_second(s.scores) AS second
+                FROM emotion_score s
+                JOIN message m ON m.id = s.message_id
+                WHERE emotion_second(s.scores) >= ?
+            """
+            params: list = [min_second]
+            if profile_id is not None:
+                query += " AND m.user_id = ?"
+                params.append(profile_id)
+            query += " ORDER BY second DESC LIMIT ?"
+            params.append(limit)
+
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
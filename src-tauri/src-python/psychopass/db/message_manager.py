@@ -1,7 +1,10 @@
 import sqlite3
-from typing import List, Optional, Dict, Tuple, Any, DefaultDict
+import numpy as np
+from typing import List, Optional, Dict, Tuple, Any, DefaultDict, Union
 from psychopass.schemas import Message, Media, EmotionStats, Emotion, EmotionStatsByYear
+from psychopass.batch import MessageBatch, get_image_path
 from psychopass.cache import Cache
+from psychopass.utils import to_epoch
 from collections import defaultdict
 
 class MessageManager:
@@ -9,7 +12,12 @@ class MessageManager:
         self.user_db = user_db
         self.cache: Cache = user_db.cache
 
-    async def add_batch(self, platform: str, messages: List[Message], chats: List):
+    async def add_batch(self, platform: str, messages: Union[List[Message], MessageBatch], chats: List):
+        """Stores messages, a MessageBatch also gets its id/chat/user arrays filled"""
+        batch = messages if isinstance(messages, MessageBatch) else None
+        if batch is not None:
+            messages = batch.messages
+
         with self.user_db.get_connection() as db:
             cursor = db.cursor()
 
@@ -37,7 +45,7 @@ class MessageManager:
             media_to_cache = []
             media_paths = []
             
-            for msg in messages:
+            for i, msg in enumerate(messages):
                 chat = getattr(msg, 'chat', None)
                 if chat is None:
                     raise RuntimeError("Message does not have chat reference")
@@ -50,8 +58,10 @@ class MessageManager:
 
                 reply_to_id = None
                 reply = getattr(msg, 'reply', None)
-                if reply is not None and getattr(reply, 'platform_id', None) is not None:
+                pid = msg.reply_id
+                if pid is None and reply is not None and getattr(reply, 'platform_id', None) is not None:
                     pid = str(reply.platform_id)
+                if pid is not None:
                     reply_to_id = platform_to_db_id.get((canon_id, pid))
                     if reply_to_id is None:
                         cursor.execute("""
@@ -68,7 +78,7 @@ class MessageManager:
                 """, (
                     profile_id,
                     msg.text,
-                    getattr(msg, 'emotion', None),
+                    batch.emotions[i] if batch is not None else getattr(msg, 'emotion', None),
                     chat_row_id,
                     msg.timestamp,
                     str(msg.platform_id) if msg.platform_id is not None else None,
@@ -77,27 +87,46 @@ class MessageManager:
                 ))
 
                 message_id = cursor.lastrowid
-                
-                if message_id == 0 and msg.platform_id is not None:
-                    cursor.execute("""
-                        SELECT id FROM message
-                        WHERE platform_id = ? AND chat_id = ?
-                    """, (str(msg.platform_id), chat_row_id))
+
+                # ignored insert, lastrowid still points at the previous row
+                if cursor.rowcount == 0:
+                    if msg.platform_id is not None:
+                        cursor.execute("""
+                            SELECT id FROM message
+                            WHERE platform_id = ? AND chat_id = ?
+                        """, (str(msg.platform_id), chat_row_id))
+                    else:
+                        cursor.execute("""
+                            SELECT id FROM message
+                            WHERE chat_id = ? AND timestamp = ? AND text IS ?
+                        """, (chat_row_id, msg.timestamp, msg.text))
                     row = cursor.fetchone()
-                    if row:
-                        message_id = row[0]
+                    message_id = row[0] if row else 0
+                    # its media rows were written with it
+                    inserted = False
+                else:
+                    inserted = True
                 
                 msg.id = message_id
+
+                if batch is not None:
+                    batch.ids[i] = message_id
+                    batch.chat_ids[i] = chat_row_id
+                    batch.user_ids[i] = profile_id
                 
                 if msg.platform_id is not None:
                     platform_to_db_id[(canon_id, str(msg.platform_id))] = message_id
 
                 medias = getattr(msg, 'media', None)
-                if medias is not None:
+                if medias is not None and inserted:
                     for media in medias:
                         media_to_cache.append((message_id, media))
                         media_paths.append(media.path)
 
+            if batch is not None and batch.scores is not None:
+                rows = np.flatnonzero(batch.scored)
+                self.user_db.emotion_scores.save_batch(batch.ids[rows].tolist(), batch.scores[rows], db=db)
+
         if media_to_cache:
             print(f"[INFO] Caching {len(media_to_cache)} media files...")
 
@@ -116,7 +145,81 @@ class MessageManager:
                     else:
                         print(f"[ERROR] Failed to cache media for message {message_id}")
 
-            
+
+    def filter_new(self, messages: List[Message]) -> List[Message]:
+        """
+        Drops messages that are already stored, matched by (chat, platform_id)
+        or (chat, timestamp, text), with one lookup per chat. A stored message
+        that should have a vector but doesn't is kept, an import that died
+        between the DB and vector writes finishes it on the next run.
+        """
+        canon_ids: Dict[int, str] = {}
+        by_chat: DefaultDict[str, List[Message]] = defaultdict(list)
+        for msg in messages:
+            chat = getattr(msg, 'chat', None)
+            if chat is None:
+                raise RuntimeError("Message does not have chat reference")
+            if id(chat) not in canon_ids:
+                canon_ids[id(chat)] = self.user_db.chats.get_canon_id(chat)
+            by_chat[canon_ids[id(chat)]].append(msg)
+
+        known_ids: Dict[Tuple[str, str], int] = {}
+        known_content: Dict[Tuple[str, str, Optional[str]], int] = {}
+
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+
+            for canon_id, chat_messages in by_chat.items():
+                cursor.execute("SELECT id FROM chat WHERE canon_id = ?", (canon_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                chat_row_id = row[0]
+
+                # stay under SQLite's bound parameter limit
+                platform_ids = list({str(m.platform_id) for m in chat_messages if m.platform_id is not None})
+                for i in range(0, len(platform_ids), 500):
+                    chunk = platform_ids[i:i + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    cursor.execute(f"""
+                        SELECT id, platform_id FROM message
+                        WHERE chat_id = ? AND platform_id IN ({placeholders})
+                    """, [chat_row_id] + chunk)
+                    known_ids.update(((canon_id, r[1]), r[0]) for r in cursor.fetchall())
+
+                timestamps = list({m.timestamp for m in chat_messages})
+                for i in range(0, len(timestamps), 500):
+                    chunk = timestamps[i:i + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    cursor.execute(f"""
+                        SELECT id, timestamp, text FROM message
+                        WHERE chat_id = ? AND timestamp IN ({placeholders})
+                    """, [chat_row_id] + chunk)
+                    known_content.update(((canon_id, r[1], r[2]), r[0]) for r in cursor.fetchall())
+
+        if not known_ids and not known_content:
+            return messages
+
+        stored: Dict[int, int] = {} # position in messages -> message id
+        for i, msg in enumerate(messages):
+            canon_id = canon_ids[id(msg.chat)]
+            message_id = None
+            if msg.platform_id is not None:
+                message_id = known_ids.get((canon_id, str(msg.platform_id)))
+            if message_id is None:
+                message_id = known_content.get((canon_id, msg.timestamp, msg.text))
+            if message_id is not None:
+                stored[i] = message_id
+
+        # only messages that get embedded are expected to have a vector
+        embeddable = [i for i in stored if (messages[i].text and messages[i].text.strip()) or get_image_path(messages[i])]
+        with_vectors = self.user_db.with_vectors([stored[i] for i in embeddable])
+        for i in embeddable:
+            if stored[i] not in with_vectors:
+                del stored[i]
+
+        return [msg for i, msg in enumerate(messages) if i not in stored]
+
     def get(self, message_id: int) -> Optional[Message]:
         with self.user_db.get_connection() as db:
             cursor = db.cursor()
@@ -149,6 +252,37 @@ class MessageManager:
             )
 
 
+    def get_many(self, message_ids: List[int]) -> Dict[int, Message]:
+        """get() of many ids on one connection, missing ids are left out"""
+        messages: Dict[int, Message] = {}
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            for i in range(0, len(message_ids), 500):
+                chunk = message_ids[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                cursor.execute(f"""
+                    SELECT 
+                        m.id, m.platform_id, m.user_id, m.text, m.timestamp, 
+                        m.emotion, m.reply_to, m.chat_id, m.forwarded_from,
+                        p.global_name, p.avatar
+                    FROM message m
+                    LEFT JOIN profile p ON m.user_id = p.id
+                    WHERE m.id IN ({placeholders})
+                """, chunk)
+
+                for row in cursor.fetchall():
+                    messages[row['id']] = Message(
+                        id=row['id'],
+                        author_id=str(row['platform_id']),
+                        author_name=row['global_name'],
+                        text=row['text'],
+                        timestamp=row['timestamp'],
+                        emotion=row['emotion'],
+                        chat_id=row['chat_id'],
+                        forwarded_from=row['forwarded_from']
+                    )
+        return messages
+
     def get_by_chat(self, chat_id: int) -> List[Message]:
         messages: dict[int, Message] = {}
         reply_map: dict[int, int] = {}
@@ -383,15 +517,70 @@ class MessageManager:
                 by_year=by_year
             )
         
+    def update_emotions(self, message_ids: List[int], emotions: List[str], scores: Optional[np.ndarray] = None):
+        """Bulk emotion rewrite, e.g. after the classifier changed"""
+        with self.user_db.get_connection() as db:
+            db.executemany(
+                "UPDATE message SET emotion = ? WHERE id = ?",
+                zip(emotions, message_ids)
+            )
+            if scores is not None:
+                self.user_db.emotion_scores.save_batch(message_ids, scores, db=db)
+
+        # vectors carry the emotion for filtered search
+        by_emotion: Dict[str, List[int]] = {}
+        for message_id, emotion in zip(message_ids, emotions):
+            by_emotion.setdefault(emotion, []).append(message_id)
+        for emotion, ids in by_emotion.items():
+            self.user_db.on_messages_updated(ids, emotion=emotion)
+
+    def get_vector_metadata(self, message_ids: List[int]) -> Dict[int, dict]:
+        """Filterable fields vectors carry, by message id"""
+        result: Dict[int, dict] = {}
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            for i in range(0, len(message_ids), 500):
+                chunk = message_ids[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                cursor.execute(f"""
+                    SELECT id, emotion, timestamp FROM message
+                    WHERE id IN ({placeholders})
+                """, chunk)
+                for row in cursor.fetchall():
+                    result[row['id']] = {
+                        "emotion": row['emotion'] or "",
+                        "timestamp": to_epoch(row['timestamp'])
+                    }
+        return result
+
+    def get_image_paths(self, message_ids: List[int]) -> Dict[int, str]:
+        """Cached photo of every message among message_ids that has one"""
+        result: Dict[int, str] = {}
+        with self.user_db.get_connection() as db:
+            cursor = db.cursor()
+            for i in range(0, len(message_ids), 500):
+                chunk = message_ids[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                cursor.execute(f"""
+                    SELECT message_id, path FROM media
+                    WHERE type = 'photo' AND message_id IN ({placeholders})
+                    ORDER BY id
+                """, chunk)
+                for row in cursor.fetchall():
+                    result.setdefault(row['message_id'], row['path'])
+        return result
+
     def delete(self, message_id: int):
         """delete message and linked media"""
         with self.user_db.get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("DELETE FROM media WHERE message_id = ?", (message_id,))
+            cursor.execute("DELETE FROM emotion_score WHERE message_id = ?", (message_id,))
             cursor.execute("DELETE FROM message WHERE id = ?", (message_id,))
             
             if cursor.rowcount == 0:
                 return {"success": False, "error": "Message not found"}
             
-            return {"success": True, "deleted_id": message_id}
\ No newline at end of file
+        self.user_db.on_messages_deleted([message_id])
+        return {"success": True, "deleted_id": message_id}
\ No newline at end of file
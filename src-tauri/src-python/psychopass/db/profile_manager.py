@@ -1,5 +1,5 @@
 import uuid, json
-from typing import Optional, List
+from typing import Optional, List, Dict
 from psychopass.cache import Cache
 from psychopass.schemas import Profile, PlatformUser, Chat
 
@@ -92,6 +92,14 @@ class ProfileManager:
                 WHERE message_id IN (SELECT id FROM message WHERE user_id = ?)
             """, (profile_id,))
             
+            cursor.execute("""
+                DELETE FROM emotion_score
+                WHERE message_id IN (SELECT id FROM message WHERE user_id = ?)
+            """, (profile_id,))
+            
+            cursor.execute("SELECT id FROM message WHERE user_id = ?", (profile_id,))
+            message_ids = [row[0] for row in cursor.fetchall()]
+            
             cursor.execute("DELETE FROM message WHERE user_id = ?", (profile_id,))
             deleted_messages = cursor.rowcount
             
@@ -105,18 +113,21 @@ class ProfileManager:
             
             cursor.execute("DELETE FROM profile WHERE id = ?", (profile_id,))
             
-            return {
-                "success": True,
-                "deleted_profile_id": profile_id,
-                "deleted_messages": deleted_messages,
-                "deleted_platforms": deleted_platforms
-            }
+        self.user_db.on_messages_deleted(message_ids)
+        return {
+            "success": True,
+            "deleted_profile_id": profile_id,
+            "deleted_messages": deleted_messages,
+            "deleted_platforms": deleted_platforms
+        }
 
     def merge(self, primary_id: int, secondary_ids: List[int]) -> str:
         """merge list of profiles together"""
         if not secondary_ids:
             return "No secondary profiles provided."
 
+        moved = []
+
         with self.user_db.get_connection() as db:
             cursor = db.cursor()
 
@@ -165,6 +176,7 @@ class ProfileManager:
 
                 cursor.execute("UPDATE platform_user SET profile_id = ? WHERE profile_id = ?", (primary_id, sec_id))
                 cursor.execute("UPDATE message SET user_id = ? WHERE user_id = ?", (primary_id, sec_id))
+                moved += msg_ids
                 cursor.execute("DELETE FROM profile WHERE id = ?", (sec_id,))
 
             cursor.execute("""
@@ -172,10 +184,13 @@ class ProfileManager:
                 WHERE id = ?
             """, (primary_name, primary_avatar, primary_canon, primary_id))
 
-            return f"Profiles {secondary_ids} merged into {primary_id}"
+        self.user_db.on_messages_updated(moved, user_id=primary_id)
+        return f"Profiles {secondary_ids} merged into {primary_id}"
 
     def unmerge(self, primary_id: int, secondary_platform_user_ids: list[int]) -> str:
         """unmerge profiles"""
+        moved: Dict[int, List[int]] = {}
+
         with self.user_db.get_connection() as db:
             cursor = db.cursor()
             results = []
@@ -242,6 +257,7 @@ class ProfileManager:
                         f"UPDATE message SET user_id = ? WHERE id IN ({placeholders})",
                         [secondary_profile_id] + msg_ids
                     )
+                    moved.setdefault(secondary_profile_id, []).extend(msg_ids)
 
                 cursor.execute("""
                     DELETE FROM merge_history
@@ -251,7 +267,10 @@ class ProfileManager:
                 results.append(f"Restored profile {secondary_profile_id} from platform_user {platform_user_id}")
 
             db.commit()
-            return "\n".join(results)
+
+        for profile_id, msg_ids in moved.items():
+            self.user_db.on_messages_updated(msg_ids, user_id=profile_id)
+        return "\n".join(results)
 
     def get(self, profile_id: int) -> Optional[Profile]:
         """get profile"""
@@ -0,0 +1,140 @@
+import os, time, sqlite3, hashlib, threading, unicodedata
+import numpy as np
+from typing import Callable, Dict, List, Sequence
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by content hash + model id.
+    Least recently used entries are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 100_000):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embedding_last_used ON embedding(last_used)")
+        self.conn.commit()
+
+        # estimate kept by this process, worker processes share the file
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+
+    @staticmethod
+    def text_key(model_id: str, text: str) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha1(f"{model_id}\0{normalized}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def image_key(model_id: str, path: str) -> str:
+        digest = hashlib.sha1(f"{model_id}\0".encode("utf-8"))
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_or_compute(self, keys: List[str], inputs: Sequence, compute: Callable[[List], np.ndarray]) -> np.ndarray:
+        """
+        Returns embeddings aligned with inputs. Only cache misses are passed
+        to compute, and every distinct key is computed once per call.
+        """
+        unique: Dict[str, int] = {}
+        for i, key in enumerate(keys):
+            unique.setdefault(key, i)
+
+        found = self._load(list(unique))
+        missing = [key for key in unique if key not in found]
+
+        # in-batch duplicates of a miss count as hits, they skip inference too
+        with self.lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = compute([inputs[unique[key]] for key in missing])
+            fresh = dict(zip(missing, computed))
+            self._store(fresh)
+            found.update(fresh)
+
+        if not keys:
+            return np.zeros((0, 512), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        if not keys:
+            return found
+
+        now = int(time.time())
+        with self.lock:
+            # stay under SQLite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embedding WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                self.conn.executemany(
+                    "UPDATE embedding SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.conn.commit()
+
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        now = int(time.time())
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes(), now) for key, vec in vectors.items()]
+            )
+            # misses are new keys unless another process stored them meanwhile
+            self.entries += len(vectors)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # some slack so eviction doesn't run on every insert
+        if self.entries <= self.max_entries * 1.1:
+            return
+
+        # the estimate misses other processes' inserts and evictions
+        count = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute("""
+                DELETE FROM embedding WHERE key IN (
+                    SELECT key FROM embedding ORDER BY last_used ASC LIMIT ?
+                )
+            """, (count - self.max_entries,))
+        self.entries = min(count, self.max_entries)
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+            hits, misses = self.hits, self.misses
+
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries
+        }
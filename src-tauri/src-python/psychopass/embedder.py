@@ -1,110 +1,290 @@
-import os, json
+import os, json, time, hashlib, threading
 import numpy as np
 import onnxruntime as ort
-import albumentations as A
 
 from PIL import Image
 from tokenizers import Tokenizer
-from typing import List
-from tqdm import tqdm
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from psychopass.embed_cache import EmbeddingCache
+from psychopass.sessions import SessionConfig, create_session
+from psychopass.utils import Lazy
+from psychopass.batching import AdaptiveBatchSize
+
+# version of _load_image, embeddings of different versions don't compare.
+# 2: PIL draft + resize, 1 was full decode + cv2 INTER_AREA (albumentations)
+IMAGE_PREPROCESSING = 2
+
+def model_id(model_dir: str, onnx_path: str) -> str:
+    """
+    Embedding cache namespace of a model, a hash of its .onnx: a retrained
+    model of the same size gets new keys, a reinstalled one keeps them.
+    """
+    digest = hashlib.sha1()
+    with open(onnx_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(os.path.normpath(model_dir))}:{digest.hexdigest()[:16]}"
 
 class Embedder:
-    def __init__(self, textM_path: str, imgM_path: str, batch_size: int = 32):
-        """Initialize ONNX Runtime embedder for text and images"""
+    def __init__(
+            self, 
+            textM_path: str, 
+            imgM_path: str, 
+            batch_size: int = 32, 
+            cache: Optional[EmbeddingCache] = None,
+            text_config: Optional[SessionConfig] = None,
+            image_config: Optional[SessionConfig] = None,
+            fused_path: Optional[str] = None,
+            memory_limit: int = 0
+        ):
+        """
+        Initialize ONNX Runtime embedder for text and images.
+        Sessions are created on first use, so an import without photos
+        never loads the image model.
+        fused_path is the text encoder + classifier graph built by fuse_onnx.py,
+        it replaces the text model and also returns classifier scores.
+        With memory_limit (bytes of RSS) set, batch sizes adapt per modality.
+        """
         self.batch_size = batch_size
+        adaptive = memory_limit > 0
+        self.text_batch = AdaptiveBatchSize("text", batch_size, 8 if adaptive else batch_size, 256 if adaptive else batch_size, memory_limit, step=8)
+        self.image_batch = AdaptiveBatchSize("image", batch_size, 4 if adaptive else batch_size, 128 if adaptive else batch_size, memory_limit, step=4)
+        self.cache = cache
         self.device = ['GPUExecutionProvider'] if "GPUExecutionProvider" in ort.get_available_providers() else ["CPUExecutionProvider"]
 
-        # Load text model and tokenizer
+        # Text model and tokenizer
         text_onnx_path = os.path.join(textM_path, "model.onnx")
-        self.text_session = ort.InferenceSession(text_onnx_path, providers=self.device)
+        # hashed on first use, like the session it reads the whole model
+        self._text_model_id = Lazy(lambda: model_id(textM_path, text_onnx_path))
+        self.text_onnx_path = text_onnx_path
+        self.text_config = text_config
+        self.set_fused(fused_path)
         
-        tokenizer_path = os.path.join(textM_path, "tokenizer.json")
-        self.tokenizer = Tokenizer.from_file(tokenizer_path)
-        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]", length=128)
-        self.tokenizer.enable_truncation(max_length=128)
+        self._tokenizer = Lazy(lambda: self._load_tokenizer(os.path.join(textM_path, "tokenizer.json")))
         
-        # Load image model
+        # Image model
         img_onnx_path = os.path.join(imgM_path, "model_q4.onnx")
-        self.image_session = ort.InferenceSession(img_onnx_path, providers=self.device)
+        self._image_model_id = Lazy(lambda: f"{model_id(imgM_path, img_onnx_path)}+pre{IMAGE_PREPROCESSING}")
+        self._image_session = Lazy(lambda: create_session(img_onnx_path, self.device, image_config))
         
-        # Load config for image processor
+        # Config for image processor
         config_path = os.path.join(imgM_path, "preprocessor_config.json")
         with open(config_path, 'r') as f:
             config = json.load(f)
         
         crop_size = config.get("crop_size")
-        height = crop_size.get("height")
-        width = crop_size.get("width")
-        mean = config.get("image_mean")
-        std = config.get("image_std")
-        shortest_edge = config.get("size", {}).get("shortest_edge", 224)
-        
-        self.image_transform = A.Compose([
-            A.SmallestMaxSize(max_size=shortest_edge, interpolation=3),
-            A.CenterCrop(height=height, width=width),
-            A.Normalize(mean=mean, std=std, max_pixel_value=255.0),
-        ])
+        self.crop_height = crop_size.get("height")
+        self.crop_width = crop_size.get("width")
+        self.shortest_edge = config.get("size", {}).get("shortest_edge", 224)
+        self.resample = config.get("resample", Image.Resampling.BICUBIC)
+
+        # (x / 255 - mean) / std folded into one multiply-add
+        mean = np.asarray(config.get("image_mean"), dtype=np.float32).reshape(3, 1, 1)
+        std = np.asarray(config.get("image_std"), dtype=np.float32).reshape(3, 1, 1)
+        self.pixel_scale = 1.0 / (255.0 * std)
+        self.pixel_offset = mean / std
+
+        # PIL releases the GIL while decoding and resizing
+        self.decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="decode")
+        self.buffers = threading.local()
+
+    def set_fused(self, fused_path: Optional[str]):
+        """Switches the text session to fused_path, or to the plain text model with None"""
+        self.fused = fused_path is not None
+        text_path = fused_path or self.text_onnx_path
+        self._text_session = Lazy(lambda: create_session(text_path, self.device, self.text_config))
+
+    def batch_stats(self) -> List[dict]:
+        return [self.text_batch.stats(), self.image_batch.stats()]
+
+    @staticmethod
+    def _load_tokenizer(tokenizer_path: str) -> Tokenizer:
+        tokenizer = Tokenizer.from_file(tokenizer_path)
+        tokenizer.no_padding() # padded per batch in _embed_texts
+        tokenizer.enable_truncation(max_length=128)
+        return tokenizer
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self._tokenizer.get()
+
+    @property
+    def text_model_id(self) -> str:
+        return self._text_model_id.get()
+
+    @property
+    def image_model_id(self) -> str:
+        return self._image_model_id.get()
+
+    @property
+    def text_session(self) -> ort.InferenceSession:
+        return self._text_session.get()
+
+    @property
+    def image_session(self) -> ort.InferenceSession:
+        return self._image_session.get()
+
+    @property
+    def text_output(self) -> str:
+        return self.text_session.get_outputs()[0].name
+
+    @property
+    def text_seq_len(self) -> Optional[int]:
+        # models exported before the dynamic sequence axis need full length input
+        seq_len = self.text_session.get_inputs()[0].shape[1]
+        return seq_len if isinstance(seq_len, int) else None
         
     def embed_texts(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of texts"""
-        all_embeddings = []
+        """Generate embeddings for a list of texts, cached ones skip the model"""
+        if self.cache is None:
+            return self._embed_texts(texts)
+
+        keys = [EmbeddingCache.text_key(self.text_model_id, t) for t in texts]
+        return self.cache.get_or_compute(keys, texts, self._embed_texts)
+
+    def embed_texts_scored(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Embeddings and classifier scores in one pass of the fused model.
+        Returns (embeddings, scores, scored), texts served from the cache have
+        no scores and are left to the classifier (scored is False).
+        """
+        if self.cache is None:
+            embeddings, scores = self._run_texts(texts, [self.text_output, "scores"])
+            return embeddings, scores, np.ones(len(texts), dtype=bool)
+
+        computed = {}
+
+        def compute(pairs: List[Tuple[str, str]]) -> np.ndarray:
+            embeddings, scores = self._run_texts([t for _, t in pairs], [self.text_output, "scores"])
+            computed.update(zip((k for k, _ in pairs), scores))
+            return embeddings
+
+        keys = [EmbeddingCache.text_key(self.text_model_id, t) for t in texts]
+        embeddings = self.cache.get_or_compute(keys, list(zip(keys, texts)), compute)
+
+        scored = np.array([k in computed for k in keys], dtype=bool)
+        width = len(next(iter(computed.values()))) if computed else 0
+        scores = np.zeros((len(texts), width), dtype=np.float32)
+        for i in np.flatnonzero(scored).tolist():
+            scores[i] = computed[keys[i]]
+
+        return embeddings, scores, scored
+
+    def embed_images(self, image_paths: List[str]) -> np.ndarray:
+        """Generate embeddings for a list of images, cached ones skip the model"""
+        if self.cache is None:
+            return self._embed_images(image_paths)
+
+        # missing files are skipped, same as without cache
+        image_paths = [p for p in image_paths if os.path.exists(p)]
+        keys = [EmbeddingCache.image_key(self.image_model_id, p) for p in image_paths]
+        return self.cache.get_or_compute(keys, image_paths, self._embed_images)
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        return self._run_texts(texts, [self.text_output])[0]
+
+    def _run_texts(self, texts: List[str], output_names: List[str]) -> List[np.ndarray]:
+        """
+        Texts are sorted by token length and every batch is padded only to
+        its own longest text, outputs keep the input order.
+        """
+        if not texts:
+            return [np.zeros((0, 512 if name == self.text_output else 0), dtype=np.float32) for name in output_names]
+
+        encodings = self.tokenizer.encode_batch(texts)
+        lengths = np.array([len(enc.ids) for enc in encodings])
+        order = np.argsort(lengths, kind="stable")
+
+        results = None
+        i = 0
         
-        for i in tqdm(range(0, len(texts), self.batch_size), desc="[EMBEDDER] Embedding texts", disable=True):
-            batch_texts = texts[i:i + self.batch_size]
-            
-            encodings = self.tokenizer.encode_batch(batch_texts)
-            input_ids = np.array([enc.ids for enc in encodings], dtype=np.int64)
-            attention_mask = np.array([enc.attention_mask for enc in encodings], dtype=np.int64)
+        while i < len(texts):
+            rows = order[i:i + self.text_batch.size]
+            i += len(rows)
+            max_len = self.text_seq_len or max(int(lengths[rows].max()), 1)
+
+            input_ids = np.zeros((len(rows), max_len), dtype=np.int64)
+            attention_mask = np.zeros((len(rows), max_len), dtype=np.int64)
+            for k, row in enumerate(rows):
+                ids = encodings[row].ids
+                input_ids[k, :len(ids)] = ids
+                attention_mask[k, :len(ids)] = 1
             
             onnx_inputs = {
                 "input_ids": input_ids,
                 "attention_mask": attention_mask
             }
             
-            outputs = self.text_session.run(None, onnx_inputs)
-            embeddings = outputs[0]
-            all_embeddings.append(embeddings)
+            start = time.perf_counter()
+            outputs = self.text_session.run(output_names, onnx_inputs)
+            self.text_batch.record(len(rows), time.perf_counter() - start, input_ids.size)
+
+            if results is None:
+                results = [np.empty((len(texts), out.shape[1]), dtype=np.float32) for out in outputs]
+            for result, out in zip(results, outputs):
+                result[rows] = out
         
-        return np.vstack(all_embeddings)
+        return results
     
-    def embed_images(self, image_paths: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of images"""
+    def _pixel_buffer(self, size: int) -> np.ndarray:
+        """Reusable NCHW batch tensor, one per calling thread"""
+        buffer = getattr(self.buffers, "pixels", None)
+        if buffer is None or buffer.shape[0] < size:
+            buffer = np.empty((size, 3, self.crop_height, self.crop_width), dtype=np.float32)
+            self.buffers.pixels = buffer
+        return buffer[:size]
+
+    def _load_image(self, path: str, out: np.ndarray):
+        """Decodes, resizes, crops and normalizes one image into out (CHW)"""
+        with Image.open(path) as img:
+            # JPEGs get decoded at 1/2..1/8 scale when that still covers the target
+            img.draft("RGB", (self.shortest_edge, self.shortest_edge))
+            img = img.convert("RGB")
+
+            width, height = img.size
+            scale = self.shortest_edge / min(width, height)
+            size = (
+                max(self.crop_width, round(width * scale)),
+                max(self.crop_height, round(height * scale))
+            )
+            img = img.resize(size, self.resample)
+
+            left = (size[0] - self.crop_width) // 2
+            top = (size[1] - self.crop_height) // 2
+            img = img.crop((left, top, left + self.crop_width, top + self.crop_height))
+
+            pixels = np.asarray(img, dtype=np.float32).transpose(2, 0, 1)
+
+        np.multiply(pixels, self.pixel_scale, out=out)
+        np.subtract(out, self.pixel_offset, out=out)
+
+    def _embed_images(self, image_paths: List[str]) -> np.ndarray:
         all_embeddings = []
+        image_paths = [p for p in image_paths if os.path.exists(p)]
+        i = 0
         
-        for i in tqdm(range(0, len(image_paths), self.batch_size), desc="[EMBEDDER] Embedding images", disable=True):
-            batch_paths = image_paths[i:i + self.batch_size]
-            
-            images = []
-            for path in batch_paths:
-                if not os.path.exists(path):
-                    continue
-                
-                img = Image.open(path).convert("RGB")
-                img_array = np.array(img)
-                
-                transformed = self.image_transform(image=img_array)
-                img_normalized = transformed['image']
-                
-                img_chw = np.transpose(img_normalized, (2, 0, 1))
-                images.append(img_chw)
-
-            if not images:
-                print(f"[DEBUG] No valid images found in batch: {batch_paths}")
-                continue
-            
-            pixel_values = np.stack(images).astype(np.float32)
+        while i < len(image_paths):
+            batch_paths = image_paths[i:i + self.image_batch.size]
+            i += len(batch_paths)
+            start = time.perf_counter()
+            pixel_values = self._pixel_buffer(len(batch_paths))
+
+            # each decode writes its own slice of the batch tensor
+            list(self.decode_pool.map(self._load_image, batch_paths, pixel_values))
 
             onnx_inputs = {
                 "pixel_values": pixel_values,
-                "input_ids": np.zeros((len(images), 1), dtype=np.int64),
-                "attention_mask": np.zeros((len(images), 1), dtype=np.int64)
+                "input_ids": np.zeros((len(batch_paths), 1), dtype=np.int64),
+                "attention_mask": np.zeros((len(batch_paths), 1), dtype=np.int64)
             }
             
             outputs = self.image_session.run(None, onnx_inputs)
+            self.image_batch.record(len(batch_paths), time.perf_counter() - start)
             embeddings = outputs[3]
             all_embeddings.append(embeddings)
         
         if all_embeddings:
             return np.vstack(all_embeddings)
         else:
-            return np.zeros((0, 512), dtype=np.float32)
\ No newline at end of file
+            return np.zeros((0, 512), dtype=np.float32)
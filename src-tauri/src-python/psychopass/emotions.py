@@ -2,20 +2,45 @@ import pickle
 import onnxruntime as ort
 import numpy as np
 from pathlib import Path
+from typing import Union, Optional
+from psychopass.batch import MessageBatch
+from psychopass.sessions import SessionConfig, create_session
+from psychopass.utils import Lazy
 
 class EmotionClassifier:
-    def __init__(self, model_path: Path, encoder_path: Path):
-        self.session = ort.InferenceSession(
+    def __init__(self, model_path: Path, encoder_path: Path, config: Optional[SessionConfig] = None):
+        # session and label encoder (pulls in sklearn) load on first prediction
+        self._session = Lazy(lambda: create_session(
             str(model_path),
-            providers=['CPUExecutionProvider']
-        )
-        
-        # Load label encoder
+            ['CPUExecutionProvider'],
+            config
+        ))
+        self._label_encoder = Lazy(lambda: self._load_encoder(encoder_path))
+
+    @staticmethod
+    def _load_encoder(encoder_path: Path):
         with open(encoder_path, 'rb') as f:
-            self.label_encoder = pickle.load(f)
-        
-        self.input_name = self.session.get_inputs()[0].name
-        self.output_name = self.session.get_outputs()[0].name
+            return pickle.load(f)
+
+    @property
+    def session(self) -> ort.InferenceSession:
+        return self._session.get()
+
+    @property
+    def label_encoder(self):
+        return self._label_encoder.get()
+
+    @property
+    def classes(self) -> list[str]:
+        return [str(c) for c in self.label_encoder.classes_]
+
+    @property
+    def input_name(self) -> str:
+        return self.session.get_inputs()[0].name
+
+    @property
+    def output_name(self) -> str:
+        return self.session.get_outputs()[0].name
     
     def predict(self, embedding: np.ndarray) -> str:
         """
@@ -51,16 +76,43 @@ class EmotionClassifier:
         
         return {emotion: float(prob) for emotion, prob in zip(emotions, probabilities)}
     
-    def predict_batch(self, embeddings: np.ndarray) -> list[str]:
+    def predict_batch(self, embeddings: Union[np.ndarray, MessageBatch]) -> list[str]:
+        """
+        Predict batch classes, a MessageBatch gets its emotions filled in place
+        """
+        if isinstance(embeddings, MessageBatch):
+            batch = embeddings
+            valid = batch.valid_idx
+            if len(valid) == 0:
+                return []
+
+            # rows scored by the fused text model skip this session
+            pending = valid[~batch.scored[valid]]
+            if len(pending):
+                batch.set_scores(pending, self.predict_probs_batch(batch.embeddings[pending]))
+
+            predicted_indices = np.argmax(batch.scores[valid], axis=1)
+            emotions = list(self.label_encoder.inverse_transform(predicted_indices))
+            batch.set_emotions(emotions)
+            return emotions
+
+        if embeddings.shape[0] == 0:
+            return []
+
+        predicted_indices = np.argmax(self.predict_probs_batch(embeddings), axis=1)
+        emotions = self.label_encoder.inverse_transform(predicted_indices)
+        
+        return list(emotions)
+    
+    def predict_probs_batch(self, embeddings: np.ndarray) -> np.ndarray:
         """
-        Predict batch classes
+        Class probabilities for a batch, (n, classes) with columns in classes order
         """
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        
         outputs = self.session.run(
             [self.output_name],
             {self.input_name: embeddings.astype(np.float32)}
         )
-        
-        predicted_indices = np.argmax(np.asarray(outputs[0]), axis=1)
-        emotions = self.label_encoder.inverse_transform(predicted_indices)
-        
-        return list(emotions)
\ No newline at end of file
+        return np.asarray(outputs[0], dtype=np.float32)
@@ -1,94 +1,304 @@
-import chromadb, uuid
+import os, logging, threading
 import numpy as np
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 from psychopass.embedder import Embedder
-from psychopass.schemas import Message
+from psychopass.batch import MessageBatch
+from psychopass.utils import to_epoch
+from psychopass.vectors import VectorBackend, IVFPQIndex, normalize
 
 class Memory:
-    def __init__(self, embedder: Embedder, persist_path: str):
+    """
+    Message embeddings in a VectorBackend. A vector's id is the SQLite
+    message id, so re-imports overwrite instead of duplicating.
+    """
+
+    def __init__(
+            self,
+            embedder: Embedder,
+            backend: VectorBackend,
+            index_path: Optional[str] = None,
+            nprobe: int = 16,
+            rerank: int = 200,
+            pq_m: int = 64
+        ):
         self.embedder = embedder
+        self.backend = backend
+
+        # optional IVF-PQ index in front of the backend for unfiltered searches
+        self.index_path = index_path
+        self.index: Optional[IVFPQIndex] = None
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.pq_m = pq_m
+        self.index_lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self._pending: Optional[List[int]] = None # ids written while a rebuild runs
+
+    def backfill_metadata(self, lookup: Callable[[List[int]], Dict[int, dict]]) -> int:
+        """
+        Adds emotion/timestamp to vectors stored before search filters existed.
+        lookup returns those fields by message id, see UserDB.get_vector_metadata
+        """
+        first = next(self.backend.scan(1, embeddings=False), None)
+        if first is None or "timestamp" in first[2][0]:
+            return 0
+
+        updated = 0
+        for _, _, metadatas in self.backend.scan(5000, embeddings=False):
+            missing = [int(m["original_id"]) for m in metadatas if "timestamp" not in m and m.get("original_id")]
+            fields = lookup(missing)
+            found = [i for i in missing if i in fields]
+            if found:
+                self.backend.update_many(found, [fields[i] for i in found])
+                updated += len(found)
+        return updated
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def load_index(self) -> bool:
+        """Uses the saved index if it covers every stored vector"""
+        if self.index_path is None:
+            return False
+        index = IVFPQIndex.load(self.index_path)
+        if index is None:
+            return False
+        if len(index) < self.count():
+            logging.info(f"[INFO] Vector index holds {len(index)} of {self.count()} vectors, needs a rebuild")
+            return False
+
+        with self.index_lock:
+            self.index = index
+        return True
+
+    def rebuild_index(self) -> int:
+        """
+        Trains and fills a new index from the stored vectors, searches keep
+        using the old one (or exact search) until it is swapped in.
+        """
+        if self.index_path is None:
+            raise RuntimeError("Vector index is disabled")
+        if not self.build_lock.acquire(blocking=False):
+            raise RuntimeError("Vector index is already being rebuilt")
+
+        try:
+            with self.index_lock:
+                self._pending = []
+            try:
+                index = IVFPQIndex.build(self.backend, m=self.pq_m)
+                index.save(self.index_path)
+            except Exception:
+                with self.index_lock:
+                    self._pending = None
+                raise
 
-        self.client = chromadb.PersistentClient(path=persist_path)
+            with self.index_lock:
+                # vectors the build's scan may have missed
+                found, vectors, _, _ = self.backend.get(self._pending)
+                index.add(found, vectors)
+                self.index, self._pending = index, None
 
-        self.collection = self.client.get_or_create_collection(
-            name="messages",
-            metadata={"hnsw:space": "cosine"}
-        )
+            logging.info(f"[INFO] Vector index rebuilt: {len(index)} vectors in {index.nlist} lists")
+            return len(index)
+        finally:
+            self.build_lock.release()
+
+    def save_index(self):
+        """Persists vectors added since the index was built"""
+        with self.index_lock:
+            if self.index is not None and len(self.index.tail_ids):
+                self.index.save(self.index_path)
+
+    def index_stats(self) -> dict:
+        with self.index_lock:
+            index = self.index
+            return {
+                "enabled": self.index_path is not None,
+                "ready": index is not None,
+                "building": self.build_lock.locked(),
+                "vectors": len(index) if index else 0,
+                "lists": index.nlist if index else 0,
+                "nprobe": self.nprobe,
+                "rerank": self.rerank,
+                "size_mb": os.path.getsize(self.index_path) / (1024 * 1024) if index and os.path.exists(self.index_path) else 0
+            }
+
+    def iter_embeddings(self, chunk_size: int = 4096) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Stored (message ids, embeddings) in chunks, vectors without a message are skipped"""
+        for message_ids, embeddings, _ in self.backend.scan(chunk_size):
+            keep = message_ids > 0
+            if keep.any():
+                yield message_ids[keep], embeddings[keep]
 
     def add_batch(self, items):
-        ids = [str(x["id"]) for x in items]
-        embeddings = [x["embedding"] for x in items]
-        documents = [x["document"] for x in items]
-        metadatas = [x["metadata"] for x in items]
-
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-        )
-
-    def add_text(self, messages: list[Message], embeddings: np.ndarray):
-        items = []
-        for msg, emb in zip(messages, embeddings):
-            uniq_id = uuid.uuid4().int
+        if not items:
+            return
+
+        ids = [x["id"] for x in items]
+        embeddings = np.asarray([x["embedding"] for x in items], dtype=np.float32)
+        self.backend.upsert(ids, embeddings, [x["document"] for x in items], [x["metadata"] for x in items])
 
+        with self.index_lock:
+            if self.index is not None:
+                self.index.add(np.asarray(ids, dtype=np.int64), embeddings)
+            if self._pending is not None:
+                self._pending += ids
+
+    def _items(self, batch: MessageBatch, rows: np.ndarray, kind: str, documents: list[str]) -> list[dict]:
+        ids = batch.ids[rows].tolist()
+        chat_ids = batch.chat_ids[rows].tolist()
+        user_ids = batch.user_ids[rows].tolist()
+        emotions = [batch.emotions[r] for r in rows]
+        timestamps = [batch.messages[r].timestamp for r in rows]
+
+        items = []
+        for k, emb in enumerate(batch.embeddings[rows]):
+            # message wasn't stored, nothing to key the vector by
+            if not ids[k]:
+                continue
             items.append({
-                "id": uniq_id,
+                "id": ids[k],
                 "embedding": emb,
-                "document": msg.text,
+                "document": documents[k],
                 "metadata": {
-                    "type": "text",
-                    "original_id": msg.id,
-                    "chat_id": msg.chat_id if msg.chat_id else "",
-                    "user_id": msg.platform_id if msg.platform_id else ""
+                    "type": kind,
+                    "original_id": ids[k],
+                    "chat_id": chat_ids[k] or "",
+                    "user_id": user_ids[k] or "",
+                    "emotion": emotions[k] or "",
+                    "timestamp": to_epoch(timestamps[k])
                 }
             })
+        return items
 
-        self.add_batch(items)
-        return embeddings
+    def contains(self, message_ids: List[int]) -> Set[int]:
+        """Messages among message_ids that have a vector"""
+        return self.backend.contains(message_ids)
 
+    def delete(self, message_ids: List[int]):
+        """Drops the vectors of deleted messages"""
+        self.backend.delete(message_ids)
 
-    def add_images(self, messages: list[Message], embeddings: np.ndarray):
-        items = []
-        for msg, emb in zip(messages, embeddings):
-            uniq_id = uuid.uuid4().int
+    def update_metadata(self, message_ids: List[int], **metadata):
+        """Sets the same metadata fields on every vector of message_ids"""
+        self.backend.update(message_ids, metadata)
 
-            items.append({
-                "id": uniq_id,
-                "embedding": emb,
-                "document": "<image>",
-                "metadata": {
-                    "type": "image",
-                    "original_id": msg.id,
-                    "chat_id": msg.chat_id if msg.chat_id else "",
-                    "user_id": msg.platform_id if msg.platform_id else ""
+    def reembed_images(self, lookup: Callable[[List[int]], Dict[int, str]], chunk_size: int = 256) -> Iterator[Tuple[int, int, int]]:
+        """
+        Embeds the stored image vectors again, after the image preprocessing
+        changed. lookup returns image files by message id, see
+        UserDB.get_image_paths, images whose file is gone keep their vector.
+        Yields (re-embedded in the chunk, images done, total) per chunk.
+        """
+        ids = [
+            int(message_id)
+            for chunk_ids, _, metadatas in self.backend.scan(5000, embeddings=False)
+            for message_id, meta in zip(chunk_ids, metadatas)
+            if message_id > 0 and meta.get("type") == "image"
+        ]
+
+        for i in range(0, len(ids), chunk_size):
+            paths = lookup(ids[i:i + chunk_size])
+            found, _, documents, metadatas = self.backend.get([k for k in ids[i:i + chunk_size] if k in paths and os.path.exists(paths[k])])
+            if len(found):
+                embeddings = self.embedder.embed_images([paths[int(k)] for k in found])
+                self.add_batch([
+                    {"id": int(k), "embedding": emb, "document": doc or "<image>", "metadata": meta}
+                    for k, emb, doc, meta in zip(found, embeddings, documents, metadatas)
+                ])
+            yield len(found), min(i + chunk_size, len(ids)), len(ids)
+
+    def add_text(self, batch: MessageBatch) -> np.ndarray:
+        rows = batch.text_idx
+        self.add_batch(self._items(batch, rows, "text", batch.texts))
+        return batch.embeddings[rows]
+
+    def add_images(self, batch: MessageBatch) -> np.ndarray:
+        rows = batch.image_idx
+        self.add_batch(self._items(batch, rows, "image", ["<image>"] * len(rows)))
+        return batch.embeddings[rows]
+
+    def search_embedding(self, emb, top_k: int = 5, offset: int = 0, filters: Optional[dict] = None) -> List[dict]:
+        """
+        Nearest vectors to emb, ranks offset..offset+top_k.
+        filters are applied by the backend before ranking, see VectorBackend
+        """
+        return self.search_many(np.asarray(emb)[None, :], top_k, offset, filters)[0]
+
+    def search_many(self, embeddings, top_k: int = 5, offset: int = 0, filters: Optional[dict] = None) -> List[List[dict]]:
+        """search_embedding of every row of embeddings, as one batched backend/index search"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(embeddings):
+            return []
+
+        # the index has no metadata, filtered searches stay in the backend
+        filtered = any(v is not None for v in (filters or {}).values())
+        if self.index is not None and not filtered:
+            results = self._index_search(embeddings, offset + top_k)
+        else:
+            results = self.backend.search_many(embeddings, offset + top_k, filters)
+
+        return [
+            [
+                {
+                    "id": message_id,
+                    "text": document,
+                    "chat_id": meta["chat_id"],
+                    "user_id": meta["user_id"],
+                    "type": meta["type"],
+                    "emotion": meta.get("emotion") or None,
+                    "score": score,
                 }
-            })
+                for message_id, score, document, meta in hits[offset:]
+            ]
+            for hits in results
+        ]
 
-        self.add_batch(items)
-        return embeddings
-
-    def search_embedding(self, emb, top_k):
-        result = self.collection.query(
-            query_embeddings=[emb],
-            n_results=top_k
-        )
-
-        hits = []
-
-        ids = result["ids"][0] if result["ids"] else []
-        docs = result["documents"][0] if result["documents"] else []
-        metas = result["metadatas"][0] if result["metadatas"] else []
-        dists = result["distances"][0] if result["distances"] else []
-
-        for i in range(len(ids)):
-            hits.append({
-                "id": metas[i]["original_id"],
-                "text": docs[i],
-                "chat_id": metas[i]["chat_id"],
-                "user_id": metas[i]["user_id"],
-                "type": metas[i]["type"],
-                "score": 1 - float(dists[i]),
-            })
+    def search_similar(self, message_ids: List[int], top_k: int = 5, offset: int = 0, filters: Optional[dict] = None) -> List[List[dict]]:
+        """
+        Neighbours of stored messages, queried with their stored vectors and
+        without the message itself. Messages without a vector get no hits.
+        """
+        found, vectors, _, _ = self.backend.get(message_ids)
+        rows = {int(message_id): k for k, message_id in enumerate(found)}
+        if not rows:
+            return [[] for _ in message_ids]
+
+        # one extra rank in case the message is among its own results
+        groups = self.search_many(vectors, offset + top_k + 1, 0, filters)
+
+        results = []
+        for message_id in message_ids:
+            if int(message_id) not in rows:
+                results.append([])
+                continue
+            hits = [h for h in groups[rows[int(message_id)]] if h["id"] != int(message_id)]
+            results.append(hits[offset:offset + top_k])
+        return results
+
+    def _index_search(self, embeddings: np.ndarray, top_k: int) -> List[List[Tuple[int, float, Optional[str], dict]]]:
+        """IVF-PQ candidates re-ranked by exact cosine on the stored vectors"""
+        with self.index_lock:
+            candidates, _ = self.index.search(embeddings, max(self.rerank, top_k), self.nprobe)
+
+        # one backend read for the candidates of every query, deleted messages drop out here
+        ids = np.unique(candidates[candidates > 0])
+        found, vectors, documents, metadatas = self.backend.get(ids.tolist())
+        if not len(found):
+            return [[] for _ in embeddings]
+
+        queries, vectors = normalize(embeddings), normalize(vectors)
+        order = np.argsort(found)
+        sorted_found = found[order]
+
+        results = []
+        for q, row in enumerate(candidates):
+            # rows of this query's candidates in found
+            row = np.unique(row[row > 0])
+            pos = np.minimum(np.searchsorted(sorted_found, row), len(found) - 1)
+            pos = order[pos[sorted_found[pos] == row]]
 
-        return hits
\ No newline at end of file
+            scores = vectors[pos] @ queries[q]
+            best = np.argsort(-scores)[:top_k]
+            results.append([(int(found[pos[k]]), float(scores[k]), documents[pos[k]], metadatas[pos[k]]) for k in best])
+        return results
@@ -1,10 +1,35 @@
-import importlib, pkgutil
-from typing import Callable, Dict, Tuple, List
+import importlib, pkgutil, os, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple, List, Iterator, Optional
 from psychopass.schemas import Message, Chat
+from psychopass.utils import find_files
+import psychopass_worker
+
+# (message offset, byte position) a stream parser can start a file at
+Resume = Callable[[str], Tuple[int, int]]
+
+@dataclass
+class ParseBatch:
+    messages: List[Message]
+    chats: List[Chat]
+    progress: int
+    total: int
+    file: str = ""
+    offset: int = 0 # position of the first message inside file
+    end: int = -1 # position after the last one, kept when messages get filtered
+    position: int = 0 # byte offset in file after the last one, 0 if the parser can't seek
+
+    def __post_init__(self):
+        if self.end < 0:
+            self.end = self.offset + len(self.messages)
 
 class ChatParser:
     def __init__(self):
         self.parsers: Dict[str, Callable[[str], Tuple[List[Message], List[Chat]]]] = {}
+        self.streams: Dict[str, Callable[[str, int, Optional[Resume]], Iterator[ParseBatch]]] = {}
+        self.files: Dict[str, Callable[[str, str], Tuple[List[Message], List[Chat]]]] = {}
 
     def register(self, platform: str):
         def decorator(func):
@@ -13,15 +38,129 @@ class ChatParser:
             return func
         return decorator
 
+    def register_stream(self, platform: str):
+        def decorator(func):
+            print(f"[Parser] Registered stream parser: {platform}")
+            self.streams[platform] = func
+            return func
+        return decorator
+
+    def register_file(self, platform: str):
+        """Single file parser, needed for the process pool mode"""
+        def decorator(func):
+            print(f"[Parser] Registered file parser: {platform}")
+            self.files[platform] = func
+            return func
+        return decorator
+
     def parse(self, platform: str, path: str):
         if platform not in self.parsers:
             raise ValueError(f"No parser for platform: {platform}")
         return self.parsers[platform](path)
 
+    def parse_parallel(self, platform: str, path: str, workers: int = 0) -> Tuple[List[Message], List[Chat]]:
+        """Same as parse, but export files are decoded in a process pool"""
+        messages: List[Message] = []
+        chats: List[Chat] = []
+
+        for file_messages, file_chats, _ in self._map_files(platform, path, workers):
+            messages.extend(file_messages)
+            chats.extend(file_chats)
+
+        return messages, chats
+
+    def stream(self, platform: str, path: str, batch_size: int = 32, workers: int = 1, resume: Optional[Resume] = None) -> Iterator[ParseBatch]:
+        """
+        Yields bounded message batches, falls back to slicing a full parse.
+        With workers != 1 multi-file exports are parsed in a process pool,
+        each worker decodes a whole file and sends all its messages back,
+        so memory grows with the file sizes instead of batch_size.
+        Stream parsers given resume seek every file to the position it
+        returns, the others start from the beginning.
+        """
+        if workers != 1 and platform in self.files and len(find_files(path)) > 1:
+            return self._stream_parallel(platform, path, batch_size, workers)
+        if platform in self.streams:
+            return self.streams[platform](path, batch_size, resume)
+        return self._slice(platform, path, batch_size)
+
+    def _slice(self, platform: str, path: str, batch_size: int) -> Iterator[ParseBatch]:
+        messages, chats = self.parse(platform, path)
+
+        for i in range(0, len(messages), batch_size):
+            batch = messages[i:i + batch_size]
+            yield ParseBatch(
+                messages=batch,
+                chats=chats,
+                progress=i + len(batch),
+                total=len(messages),
+                file=path,
+                offset=i
+            )
+
+    def _stream_parallel(self, platform: str, path: str, batch_size: int, workers: int) -> Iterator[ParseBatch]:
+        done, total = 0, 0
+
+        for messages, chats, (file, size, total) in self._map_files(platform, path, workers):
+            done += size
+            for i in range(0, len(messages), batch_size):
+                yield ParseBatch(
+                    messages=messages[i:i + batch_size],
+                    chats=chats,
+                    progress=done,
+                    total=total,
+                    file=file,
+                    offset=i
+                )
+
+    def _map_files(self, platform: str, path: str, workers: int) -> Iterator[Tuple[List[Message], List[Chat], Tuple[str, int, int]]]:
+        """
+        Fans files out to a process pool, results come back in file order.
+        Only a bounded window of files is in flight so finished results
+        don't pile up while the consumer is busy.
+        """
+        if platform not in self.files:
+            raise ValueError(f"No file parser for platform: {platform}")
+
+        files = find_files(path)
+        sizes = [os.path.getsize(f) for f in files]
+        total = sum(sizes)
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
+        workers = max(1, min(workers, len(files)))
+
+        # fork would copy the loaded models and the locks of the app threads,
+        # spawned workers import the parsers without the app module
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        pending = deque()
+        queued = iter(zip(files, sizes))
+
+        def submit():
+            for file, size in queued:
+                pending.append((pool.submit(psychopass_worker.parse_file, platform, file, path), file, size))
+                return
+
+        try:
+            for _ in range(workers * 2):
+                submit()
+
+            while pending:
+                future, file, size = pending.popleft()
+                messages, chats = future.result()
+                submit()
+                yield messages, chats, (file, size, total)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def load_parsers(self):
         from psychopass import parsers as parsers_pkg
         for loader, name, ispkg in pkgutil.iter_modules(parsers_pkg.__path__):
             print(f"[Parser] Loading parser: {name}")
             importlib.import_module(f"psychopass.parsers.{name}")
 
-parser = ChatParser()
\ No newline at end of file
+parser = ChatParser()
+
+def parse_file(platform: str, file: str, root: str) -> Tuple[List[Message], List[Chat]]:
+    """Parses one file, spawned pool workers load the parsers on first use"""
+    if platform not in parser.files:
+        parser.load_parsers()
+    return parser.files[platform](file, root)
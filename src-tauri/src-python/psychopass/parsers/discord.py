@@ -1,8 +1,9 @@
-from psychopass.parser import parser
+import os
+from psychopass.parser import parser, ParseBatch, Resume
 from psychopass.schemas import Message, Chat, Media
 from tqdm import tqdm
-from typing import List, Tuple
-from psychopass.utils import find_files, get_data
+from typing import List, Tuple, Optional, Iterator
+from psychopass.utils import find_files, get_data, JSONStream, intern
 
 def get_type(type: str) -> str:
     # print(f"[DEBUG]: given str: {type}")
@@ -29,71 +30,136 @@ def get_media(data: list[dict]) -> List[Media]:
             continue
 
         media_list.append(Media(
-            type=media_type,
+            type=intern(media_type),
             path=url,
             thumbnail=thumbnail
         ))
 
     return media_list
 
-@parser.register("discord")
-def parse_discord(path: str) -> Tuple[List[Message], List[Chat]]:
-    data_to_parse = [get_data(f) for f in find_files(path)]
+BASE_URL = "https://cdn.discordapp.com/avatars"
 
-    if not data_to_parse:
-        raise ValueError("nun here")
+def parse_message(message: dict, chat: Chat) -> Optional[Message]:
+    media, text = None, None
 
-    messages: List[Message] = []
-    chats: List[Chat] = []
-    reply_map: dict[int,Message] = {}
+    text = message.get("content")
 
-    BASE_URL = "https://cdn.discordapp.com/avatars"
+    author = message.get('author')
+    if not author or not author.get('global_name'):
+        return None
 
-    for data in tqdm(data_to_parse, desc="Reading files", disable=True):
-        chat = Chat(
-            id=0,
-            name=data[0].get("name","uknown"),
-            type="channel"
-        )
+    avatar = (
+        f"{BASE_URL}/{author['id']}/{author['avatar']}"
+        if author.get("avatar") else None
+    )
 
-        chats.append(chat)
+    attachments = message.get('attachments')
+    media = get_media(attachments) if attachments else None
 
-        for message in tqdm(data, desc="Reading data", disable=True):
-            media, text, reply = None, None, None
+    if not text and not media:
+        return None
 
-            text = message.get("content")
+    # replies are resolved by platform_id when the batch is written
+    return Message(
+        author_id=intern(author['id']),
+        author_name=intern(author['username']),
+        avatar=intern(avatar),
+        timestamp=message['timestamp'],
+        text=text,
+        platform_id=message.get('id'),
+        reply_id=get_reply_id(message),
+        media=media,
+        chat=chat
+    )
 
-            author = message.get('author')
-            if not author or not author.get('global_name'):
-                continue
+def get_reply_id(message: dict) -> Optional[str]:
+    reply_id = message.get("message_reference")
+    return reply_id.get("message_id") if reply_id else None
 
-            avatar = (
-                f"{BASE_URL}/{author['id']}/{author['avatar']}"
-                if author.get("avatar") else None
-            )
+@parser.register_file("discord")
+def parse_discord_file(file: str, path: str) -> Tuple[List[Message], List[Chat]]:
+    data = get_data(file)
 
-            reply_id = message.get("message_reference")
-            reply_id = reply_id.get("message_id") if reply_id else None
-            reply = reply_map.get(reply_id, None) if reply_id else None
+    if not data:
+        return [], []
 
-            attachments = message.get('attachments')
-            media = get_media(attachments) if attachments else None
+    chat = Chat(
+        id=0,
+        name=data[0].get("name","uknown"),
+        type="channel"
+    )
 
-            if not text and not media:
-                continue
+    messages: List[Message] = []
 
-            new_message = Message(
-                author_id=author['id'],
-                author_name=author['username'],
-                avatar=avatar,
-                timestamp=message['timestamp'],
-                text=text,
-                reply=reply,
-                media=media,
-                chat=chat
-            )
+    for message in tqdm(data, desc="Reading data", disable=True):
+        new_message = parse_message(message, chat)
+        if new_message is None:
+            continue
+
+        messages.append(new_message)
+
+    return messages, [chat]
 
-            messages.append(new_message)
-            reply_map[author['id']] = new_message
+@parser.register("discord")
+def parse_discord(path: str) -> Tuple[List[Message], List[Chat]]:
+    files = find_files(path)
+
+    if not files:
+        raise ValueError("nun here")
+
+    messages: List[Message] = []
+    chats: List[Chat] = []
+
+    for file in tqdm(files, desc="Reading files", disable=True):
+        file_messages, file_chats = parse_discord_file(file, path)
+        messages.extend(file_messages)
+        chats.extend(file_chats)
+
+    return messages, chats
+
+@parser.register_stream("discord")
+def stream_discord(path: str, batch_size: int = 32, resume: Optional[Resume] = None) -> Iterator[ParseBatch]:
+    files = find_files(path)
+
+    if not files:
+        raise ValueError("nun here")
 
-    return messages, chats
\ No newline at end of file
+    total = sum(os.path.getsize(f) for f in files)
+    done = 0
+
+    # one channel file open at a time, messages decoded one by one
+    for file in files:
+        stream = JSONStream(file)
+        chat: Optional[Chat] = None
+        messages: List[Message] = []
+        # a resumed file continues after the last committed message
+        offset, position = resume(file) if resume else (0, 0)
+        if not position:
+            offset = 0
+
+        try:
+            for _, message in stream.items(resume=position):
+                if chat is None:
+                    chat = Chat(
+                        id=0,
+                        name=message.get("name","uknown"),
+                        type="channel"
+                    )
+
+                new_message = parse_message(message, chat)
+                if new_message is None:
+                    continue
+
+                messages.append(new_message)
+
+                if len(messages) >= batch_size:
+                    yield ParseBatch(messages, [chat], done + stream.tell(), total, file, offset, position=stream.position())
+                    offset += len(messages)
+                    messages = []
+
+            if messages and chat is not None:
+                yield ParseBatch(messages, [chat], done + stream.tell(), total, file, offset, position=stream.position())
+        finally:
+            stream.close()
+
+        done += os.path.getsize(file)
@@ -1,83 +1,137 @@
 import os
-from psychopass.parser import parser
+from psychopass.parser import parser, ParseBatch, Resume
 from psychopass.schemas import Message, Chat, Media
 from tqdm import tqdm
-from typing import List, Tuple
-from psychopass.utils import find_files, get_data, get_chat_type, process_text_list, get_media_type
+from typing import List, Tuple, Optional, Iterator
+from psychopass.utils import find_files, get_data, get_chat_type, process_text_list, get_media_type, JSONStream, intern
+
+def parse_message(message: dict, dir_path: str, chat: Chat) -> Optional[Message]:
+    media, text, forwarded = [None for _ in range(3)]
+
+    if message['type'] != "message": return None
+
+    # get text
+    text = message['text']
+    if isinstance(text, list):
+        text = process_text_list(text)
+
+    # get media
+    photo: str = message.get('photo', None)
+    # if photo: print(f"[DEBUG] Yo! there's photo: {photo}")
+    if photo and "file not included" not in photo.lower():
+        media = Media(
+            type="photo",
+            path=os.path.join(dir_path,photo)
+        )
+
+    file: str = message.get('file', None)
+    # if file: print(f"[DEBUG] Yo! there's file: {file}")
+    if file and ("file not included" not in file.lower() and "file exceeds maximum size" not in file.lower()):
+        media_type = get_media_type(message.get('media_type', ""))
+        thumbnail = message.get('thumbnail')
+        media = Media(
+            type=intern(media_type),
+            path=os.path.join(dir_path,file),
+            thumbnail=os.path.join(dir_path,thumbnail) if thumbnail else None
+        )
+
+    if not text and not media: return None
+
+    if media: print(f"Media: {media}")
+
+    # get reply, resolved by platform_id when the batch is written
+    reply_id = message.get("reply_to_message_id")
+
+    # check if forwarded
+    forwarded = message.get("forwarded_from", None)
+
+    # message build
+    return Message(
+        author_id=intern(message['from_id']),
+        author_name=intern(message['from']),
+        timestamp=message['date'],
+        text=text,
+        platform_id=message['id'],
+        media=[media] if media is not None else None,
+        reply_id=str(reply_id) if reply_id else None,
+        chat=chat,
+        forwarded_from=intern(forwarded)
+    )
+
+@parser.register_file("telegram")
+def parse_telegram_file(file: str, dir_path: str) -> Tuple[List[Message], List[Chat]]:
+    data: dict = get_data(file)
+
+    chat = Chat(
+        id=0,
+        name=data.get("name","uknown"),
+        type=get_chat_type(data['type'])
+    )
+
+    messages: List[Message] = []
+
+    for message in tqdm(data['messages'], desc="Reading messages", disable=True):
+        mssg = parse_message(message, dir_path, chat)
+        if mssg is None: continue
+
+        messages.append(mssg)
+
+    return messages,[chat]
 
 @parser.register("telegram")
 def parse_telegram(dir_path: str) -> Tuple[List[Message], List[Chat]]:
-    data_to_parse: list[dict] = [get_data(f) for f in find_files(dir_path)]
-
     chats: List[Chat] = []
     messages: List[Message] = []
-    reply_map: dict[int,Message] = {}
 
-    for data in tqdm(data_to_parse, desc="Reading data", disable=True):
-        chat = Chat(
-            id=0,
-            name=data.get("name","uknown"),
-            type=get_chat_type(data['type'])
-        )
+    for file in tqdm(find_files(dir_path), desc="Reading data", disable=True):
+        file_messages, file_chats = parse_telegram_file(file, dir_path)
+        messages.extend(file_messages)
+        chats.extend(file_chats)
+
+    return messages,chats
+
+@parser.register_stream("telegram")
+def stream_telegram(dir_path: str, batch_size: int = 32, resume: Optional[Resume] = None) -> Iterator[ParseBatch]:
+    files = find_files(dir_path)
+    total = sum(os.path.getsize(f) for f in files)
+    done = 0
+
+    for file in files:
+        stream = JSONStream(file)
+        header: dict = {}
+        chat: Optional[Chat] = None
+        messages: List[Message] = []
+        # a resumed file continues after the last committed message
+        offset, position = resume(file) if resume else (0, 0)
+        if not position:
+            offset = 0
+
+        try:
+            for key, message in stream.items("messages", position):
+                if key != "messages":
+                    header[key] = message
+                    continue
+
+                if chat is None:
+                    chat = Chat(
+                        id=0,
+                        name=header.get("name","uknown"),
+                        type=get_chat_type(header.get('type', ""))
+                    )
+
+                mssg = parse_message(message, dir_path, chat)
+                if mssg is None: continue
+
+                messages.append(mssg)
+
+                if len(messages) >= batch_size:
+                    yield ParseBatch(messages, [chat], done + stream.tell(), total, file, offset, position=stream.position())
+                    offset += len(messages)
+                    messages = []
+
+            if messages and chat is not None:
+                yield ParseBatch(messages, [chat], done + stream.tell(), total, file, offset, position=stream.position())
+        finally:
+            stream.close()
 
-        chats.append(chat)
-
-        for message in tqdm(data['messages'], desc="Reading messages", disable=True):
-            media, text, reply, forwarded = [None for _ in range(4)]
-
-            if message['type'] != "message": continue
-
-            # get text
-            text = message['text']
-            if isinstance(text, list):
-                text = process_text_list(text)
-            
-            # get media
-            photo: str = message.get('photo', None)
-            # if photo: print(f"[DEBUG] Yo! there's photo: {photo}")
-            if photo and "file not included" not in photo.lower():
-                media = Media(
-                    type="photo",
-                    path=os.path.join(dir_path,photo)
-                )
-            
-            file: str = message.get('file', None)
-            # if file: print(f"[DEBUG] Yo! there's file: {file}")
-            if file and ("file not included" not in file.lower() and "file exceeds maximum size" not in file.lower()):
-                media_type = get_media_type(message.get('media_type', ""))
-                thumbnail = message.get('thumbnail')
-                media = Media(
-                    type=media_type,
-                    path=os.path.join(dir_path,file),
-                    thumbnail=os.path.join(dir_path,thumbnail) if thumbnail else None
-                )
-
-            if not text and not media: continue
-
-            # get reply 
-            reply_id = message.get("reply_to_message_id")
-            reply = reply_map.get(reply_id, None) if reply_id else None # considering it was already mapped
-
-            # if reply: print(f"Yo! There's reply: {reply}")
-            if media: print(f"Media: {media}")
-
-            # check if forwarded
-            forwarded = message.get("forwarded_from", None)
-
-            # message build
-            mssg = Message(
-                author_id=message['from_id'],
-                author_name=message['from'],
-                timestamp=message['date'],
-                text=text,
-                platform_id=message['id'],
-                media=[media] if media is not None else None,
-                reply=reply,
-                chat=chat,
-                forwarded_from=forwarded
-            )
-
-            messages.append(mssg)
-            reply_map[message['id']] = mssg 
-
-    return messages,chats
\ No newline at end of file
+        done += os.path.getsize(file)
@@ -0,0 +1,105 @@
+import queue, threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+_DONE = object()
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages in their own threads.
+    Stages are connected by bounded queues, so a slow stage blocks the
+    ones before it instead of letting batches pile up in memory.
+    Order is preserved, every stage is a single thread.
+    """
+
+    def __init__(self, source: Iterable, maxsize: int = 2):
+        self.source = source
+        self.maxsize = maxsize
+        self.stages: List[Tuple[str, Callable[[Any], Any]]] = []
+
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def stage(self, name: str, func: Callable[[Any], Any]) -> "Pipeline":
+        """Adds a stage, returning None from func drops the item"""
+        self.stages.append((name, func))
+        return self
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _produce(self, out: queue.Queue):
+        try:
+            for item in self.source:
+                if not self._put(out, item):
+                    return
+            self._put(out, _DONE)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # lets generators release their files when the run is cut short
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+
+    def _work(self, func: Callable[[Any], Any], inp: queue.Queue, out: queue.Queue):
+        try:
+            while True:
+                item = self._get(inp)
+                if item is _DONE:
+                    self._put(out, _DONE)
+                    return
+
+                result = func(item)
+                if result is not None and not self._put(out, result):
+                    return
+        except BaseException as e:
+            self._fail(e)
+
+    def run(self) -> Iterator[Any]:
+        """Starts all threads and yields whatever the last stage returns"""
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in range(len(self.stages) + 1)]
+
+        threads = [threading.Thread(target=self._produce, args=(queues[0],), name="pipeline-source", daemon=True)]
+        for i, (name, func) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._work,
+                args=(func, queues[i], queues[i + 1]),
+                name=f"pipeline-{name}",
+                daemon=True
+            ))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
@@ -1,7 +1,7 @@
 from .messages import Message, Chat, Media
 from .profiles import Profile, PlatformUser, UserProfile
 from .requests import EmojiRequest, KeyRequest, ChatRequest, MergeRequest, EmotionRequest, ProfileUpdate, SearchQuery
-from .requests import MessageRequest
+from .requests import MessageRequest, ConfidenceRequest, BatchSearchQuery, SimilarRequest
 from .emotions import Emotion, EmotionStats, EmotionStatsByYear
 from .files import FileDir
 from .events import Download, LoadEvent, ErrorEvent, DeleteEvent
@@ -10,7 +10,7 @@ __all__ = [
     "Message", "Chat", "Media",
     "Profile", "PlatformUser", "UserProfile",
     "EmojiRequest", "KeyRequest", "ChatRequest", "MergeRequest", "EmotionRequest", "ProfileUpdate", "SearchQuery",
-    "MessageRequest",
+    "MessageRequest", "ConfidenceRequest", "BatchSearchQuery", "SimilarRequest",
     "Emotion", "EmotionStats", "EmotionStatsByYear",
     "FileDir",
     "Download", "LoadEvent", "ErrorEvent", "DeleteEvent"
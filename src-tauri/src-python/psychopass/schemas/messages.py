@@ -4,13 +4,14 @@ from typing import Optional, List
 
 from .profiles import Profile
 
-@dataclass
+# slots drop the per-instance __dict__, parsed exports hold millions of these
+@dataclass(slots=True)
 class Media:
     type: str
     path: str
     thumbnail: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     author_id: str
     author_name: str
@@ -25,8 +26,9 @@ class Message:
     reply: Optional[Message] = None
     chat: Optional[Chat] = None
     forwarded_from: Optional[str] = None
+    reply_id: Optional[str] = None # platform id of the replied message, set by parsers
 
-@dataclass
+@dataclass(slots=True)
 class Chat:
     id: int
     name: Optional[str] = None
@@ -34,7 +34,49 @@ class ProfileUpdate:
 class SearchQuery:
     query: str
     engine: Literal["vector", "linear"] = "vector"
+    top_k: int = 5
+    offset: int = 0
+    # vector engine filters, None matches everything
+    chat_id: Optional[int] = None
+    profile_id: Optional[int] = None
+    emotion: Optional[str] = None
+    type: Optional[Literal["text", "image"]] = None
+    since: Optional[str] = None # ISO timestamps, inclusive
+    until: Optional[str] = None
+
+@dataclass
+class BatchSearchQuery:
+    queries: List[str]
+    top_k: int = 5
+    # same filters as SearchQuery, applied to every query
+    chat_id: Optional[int] = None
+    profile_id: Optional[int] = None
+    emotion: Optional[str] = None
+    type: Optional[Literal["text", "image"]] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+
+@dataclass
+class SimilarRequest:
+    message_id: int
+    top_k: int = 5
+    offset: int = 0
+    # same filters as SearchQuery
+    chat_id: Optional[int] = None
+    profile_id: Optional[int] = None
+    emotion: Optional[str] = None
+    type: Optional[Literal["text", "image"]] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
 
 @dataclass
 class MessageRequest:
-    message_id: int
\ No newline at end of file
+    message_id: int
+
+@dataclass
+class ConfidenceRequest:
+    min_confidence: float = 0.0
+    max_confidence: float = 1.0
+    min_second: float = 0.3 # runner-up probability for mixed emotions
+    profile_id: Optional[int] = None
+    limit: int = 100
\ No newline at end of file
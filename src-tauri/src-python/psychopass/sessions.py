@@ -0,0 +1,113 @@
+import os, logging, configparser
+import onnxruntime as ort
+
+from dataclasses import dataclass, fields, replace
+from typing import List, Optional
+
+GRAPH_OPTIMIZATION = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODE = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+@dataclass
+class SessionConfig:
+    """
+    ONNX Runtime tuning for one session. Thread counts of 0 leave the
+    choice to ORT, pin them when several sessions run at the same time.
+    """
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    graph_optimization: str = "all"
+    execution_mode: str = "sequential"
+    allow_spinning: bool = True
+    cache_optimized: bool = True
+    cache_dir: Optional[str] = None # used when the model dir is read-only
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser, name: str, section: str = "Runtime", **defaults) -> "SessionConfig":
+        """
+        Reads [Runtime] keys, "<name>.<key>" overrides the shared value:
+
+            [Runtime]
+            intra_op_threads = 4
+            classifier.intra_op_threads = 1
+        """
+        base = replace(cls(), **defaults)
+        values = {}
+
+        for f in fields(cls):
+            if f.name == "cache_dir":
+                continue
+            for key in (f"{name}.{f.name}", f.name):
+                if not config.has_option(section, key):
+                    continue
+                if isinstance(getattr(base, f.name), bool):
+                    values[f.name] = config.getboolean(section, key)
+                elif isinstance(getattr(base, f.name), int):
+                    values[f.name] = config.getint(section, key)
+                else:
+                    values[f.name] = config.get(section, key).strip().lower()
+                break
+
+        return replace(base, **values)
+
+    def options(self) -> ort.SessionOptions:
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.graph_optimization_level = GRAPH_OPTIMIZATION.get(self.graph_optimization, GRAPH_OPTIMIZATION["all"])
+        options.execution_mode = EXECUTION_MODE.get(self.execution_mode, EXECUTION_MODE["sequential"])
+
+        if not self.allow_spinning:
+            # idle threads yield instead of busy-waiting, matters when sessions overlap
+            options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+            options.add_session_config_entry("session.inter_op.allow_spinning", "0")
+
+        return options
+
+def optimized_path(model_path: str, config: SessionConfig) -> Optional[str]:
+    """Where the optimized graph of model_path is kept, None if nowhere writable"""
+    directory, filename = os.path.split(model_path)
+    stem, _ = os.path.splitext(filename)
+
+    # optimized graphs are tied to the ORT build and optimization level
+    name = f"{stem}.{config.graph_optimization}.ort-{ort.__version__}.onnx"
+
+    if os.access(directory, os.W_OK):
+        return os.path.join(directory, name)
+    if config.cache_dir:
+        os.makedirs(config.cache_dir, exist_ok=True)
+        return os.path.join(config.cache_dir, name)
+    return None
+
+def create_session(model_path: str, providers: List[str], config: Optional[SessionConfig] = None) -> ort.InferenceSession:
+    """
+    InferenceSession with the tuning applied. The optimized graph is saved
+    on first load and reused afterwards, so launches skip re-optimization.
+    """
+    config = config or SessionConfig()
+    model_path = str(model_path)
+    options = config.options()
+
+    cached = optimized_path(model_path, config) if config.cache_optimized and config.graph_optimization != "disable" else None
+
+    if cached and os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(model_path):
+        # graph was optimized on an earlier launch
+        options.graph_optimization_level = GRAPH_OPTIMIZATION["disable"]
+        try:
+            return ort.InferenceSession(cached, sess_options=options, providers=providers)
+        except Exception as e:
+            logging.warning(f"[WARN] Optimized model {cached} failed to load, rebuilding: {e}")
+            options.graph_optimization_level = GRAPH_OPTIMIZATION.get(config.graph_optimization, GRAPH_OPTIMIZATION["all"])
+
+    if cached:
+        options.optimized_model_filepath = cached
+
+    return ort.InferenceSession(model_path, sess_options=options, providers=providers)
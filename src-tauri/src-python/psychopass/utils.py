@@ -1,4 +1,8 @@
-import os, json
+import os, sys, json, codecs, hashlib, threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Generic, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
 
 def find_files(dir: str) -> list[str]:
     found_files = []
@@ -6,14 +10,199 @@ def find_files(dir: str) -> list[str]:
         for file in files:
             if file.endswith(".json"):
                 found_files.append(os.path.join(root, file))
-    return found_files
+    # os.walk order depends on the filesystem
+    return sorted(found_files)
 
 def get_data(file: str) -> dict:
     data = None
     with open(file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     return data
-    
+
+def file_hash(file: str, edge: int = 4 << 20) -> str:
+    """
+    Cheap identity of a file: MD5 of its size, mtime and first and last
+    edge bytes. Reads at most 2 * edge bytes however big the file is.
+    """
+    stat = os.stat(file)
+    digest = hashlib.md5(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    with open(file, 'rb') as f:
+        digest.update(f.read(edge))
+        if stat.st_size > edge:
+            f.seek(max(stat.st_size - edge, edge))
+            digest.update(f.read(edge))
+    return digest.hexdigest()
+
+class JSONStream:
+    """Incremental JSON reader, keeps only the current value in memory"""
+
+    def __init__(self, file: str, chunk_size: int = 1 << 20):
+        self.file = open(file, 'rb')
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self._seek(0)
+
+    def close(self):
+        self.file.close()
+
+    def tell(self) -> int:
+        """Bytes read from disk so far, good enough for progress reporting"""
+        return self.file.tell()
+
+    def position(self) -> int:
+        """Byte offset right after the last array item read, items() can resume there. 0 before any"""
+        if self.item_end is None:
+            return 0
+        base, buffer, pos = self.item_end
+        return base + len(buffer[:pos].encode("utf-8"))
+
+    def _seek(self, position: int):
+        self.file.seek(position)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.base = position # byte offset of buffer[0]
+        self.eof = False
+        self.item_end = None # (base, buffer, pos), encoded only when position() asks
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+
+        raw = self.file.read(self.chunk_size)
+        chunk = self.utf8.decode(raw, final=not raw)
+        if not raw:
+            self.eof = True
+            return False
+
+        # drop already consumed part so the buffer stays bounded
+        self.base += len(self.buffer[:self.pos].encode("utf-8"))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError(f"Unexpected end of JSON in {self.file.name}")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} in {self.file.name}")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # numbers can be cut in half at the chunk border
+            if end == len(self.buffer) and self._fill():
+                continue
+
+            self.pos = end
+            return value
+
+    def _array(self, resume: int = 0) -> Iterator[Any]:
+        self._expect("[")
+        if resume:
+            # lands right after an item a previous reader consumed
+            self._seek(resume)
+            self.item_end = (resume, "", 0)
+        elif self._peek() == "]":
+            self.pos += 1
+            return
+        else:
+            yield self._item()
+
+        while self._peek() == ",":
+            self.pos += 1
+            yield self._item()
+        self._expect("]")
+
+    def _item(self) -> Any:
+        value = self._value()
+        self.item_end = (self.base, self.buffer, self.pos)
+        return value
+
+    def items(self, key: Optional[str] = None, resume: int = 0) -> Iterator[Tuple[str, Any]]:
+        """
+        Without key the file must be a top-level array, every item is yielded as ("", item).
+        With key top-level fields are yielded as (name, value) and the array
+        under key is yielded item by item as (key, item).
+        resume is a position() taken right after an item of that array, its
+        items up to there are skipped without being read.
+        """
+        if key is None:
+            for item in self._array(resume):
+                yield "", item
+            return
+
+        self._expect("{")
+        if self._peek() == "}":
+            return
+
+        while True:
+            name = self._value()
+            self._expect(":")
+
+            if name == key and self._peek() == "[":
+                for item in self._array(resume):
+                    yield key, item
+            else:
+                yield name, self._value()
+
+            if self._peek() == ",":
+                self.pos += 1
+                continue
+            self._expect("}")
+            return
+
+class Lazy(Generic[T]):
+    """
+    Value built on the first get(). Concurrent callers wait for the one
+    that builds it, a failed build is retried on the next call.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.value: Optional[T] = None
+        self.loaded = False
+
+    def get(self) -> T:
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.value = self.factory()
+                    self.loaded = True
+        return self.value
+
+def intern(value: Any) -> Any:
+    """sys.intern for values repeated across messages (authors, media types)"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+def to_epoch(timestamp: Optional[str]) -> int:
+    """ISO timestamp to unix seconds, naive ones are taken as UTC. 0 if unparsable"""
+    if not timestamp:
+        return 0
+    try:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
 def get_chat_type(type: str) -> str:
     chat_type: str = ""
 
@@ -0,0 +1,35 @@
+import os, logging
+import numpy as np
+from .base import VectorBackend, normalize
+from .chroma import ChromaBackend
+from .flat import FlatBackend
+from .ivfpq import IVFPQIndex
+
+def copy_vectors(src: VectorBackend, dst: VectorBackend, chunk_size: int = 4096) -> int:
+    """Copies every vector with its metadata, documents stay with src"""
+    copied = 0
+    for ids, embeddings, metadatas in src.scan(chunk_size):
+        keep = np.flatnonzero(ids > 0)
+        dst.upsert(ids[keep].tolist(), embeddings[keep], [""] * len(keep), [metadatas[k] for k in keep])
+        copied += len(keep)
+    return copied
+
+def open_backend(name: str, path: str, dtype: str = "float32") -> VectorBackend:
+    """
+    Vector store under path by config name: "chroma" keeps the Chroma
+    collection in path, "flat" a FlatBackend in path/flat. An empty flat
+    store is filled from an existing Chroma collection once.
+    """
+    if name == "chroma":
+        return ChromaBackend(path)
+    if name != "flat":
+        raise ValueError(f"Unknown vector backend: {name}")
+
+    backend = FlatBackend(os.path.join(path, "flat"), dtype)
+    if backend.count() == 0 and os.path.exists(os.path.join(path, "chroma.sqlite3")):
+        logging.info("[INFO] Copying vectors from Chroma to the flat index")
+        copied = copy_vectors(ChromaBackend(path), backend)
+        logging.info(f"[INFO] Copied {copied} vectors")
+    return backend
+
+__all__ = ["VectorBackend", "ChromaBackend", "FlatBackend", "IVFPQIndex", "normalize", "copy_vectors", "open_backend"]
@@ -0,0 +1,68 @@
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# metadata fields every backend stores and can filter on
+FIELDS = ("type", "original_id", "chat_id", "user_id", "emotion", "timestamp")
+
+class VectorBackend:
+    """
+    Storage and nearest-neighbour search of message embeddings keyed by
+    message id. Search filters are a dict of optional fields: chat_id,
+    user_id, emotion and type match exactly, since/until bound the unix
+    timestamp (inclusive). None values match everything.
+
+    get() and scan() return embeddings as they were upserted, not
+    normalized: the classifier scores them like it did at ingest.
+    """
+
+    name = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def upsert(self, ids: List[int], embeddings: np.ndarray, documents: List[str], metadatas: List[dict]):
+        """Inserts new ids, overwrites vectors and metadata of existing ones"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[int]):
+        raise NotImplementedError
+
+    def update(self, ids: List[int], metadata: dict):
+        """Sets the same metadata fields on the stored ones among ids"""
+        raise NotImplementedError
+
+    def update_many(self, ids: List[int], metadatas: List[dict]):
+        """Per-id metadata fields, ids that aren't stored are skipped"""
+        raise NotImplementedError
+
+    def contains(self, ids: List[int]) -> Set[int]:
+        """The stored ones among ids"""
+        raise NotImplementedError
+
+    def get(self, ids: List[int]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]], List[dict]]:
+        """Stored (ids, embeddings, documents, metadatas) among ids, missing ones are left out"""
+        raise NotImplementedError
+
+    def scan(self, chunk_size: int, embeddings: bool = True) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], List[dict]]]:
+        """All stored (ids, embeddings or None, metadatas) in chunks"""
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[Tuple[int, float, Optional[str], dict]]:
+        """Best top_k (id, cosine similarity, document, metadata), best first"""
+        raise NotImplementedError
+
+    def search_many(self, queries: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[List[Tuple[int, float, Optional[str], dict]]]:
+        """search() of every query row, backends override it with one batched call"""
+        return [self.search(query, top_k, filters) for query in queries]
+
+    def close(self):
+        pass
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length, so a dot product is the cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def empty_metadata() -> Dict[str, object]:
+    return {"type": "", "original_id": 0, "chat_id": "", "user_id": "", "emotion": "", "timestamp": 0}
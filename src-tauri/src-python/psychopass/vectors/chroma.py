@@ -0,0 +1,160 @@
+import logging
+import numpy as np
+from typing import Iterator, List, Optional, Set, Tuple
+from psychopass.utils import Lazy
+from psychopass.vectors.base import VectorBackend
+
+# Chroma rejects larger batches
+CHUNK = 5000
+
+def build_where(filters: Optional[dict]) -> Optional[dict]:
+    """Chroma where clause from search filters, see VectorBackend"""
+    if not filters:
+        return None
+
+    clauses = []
+    for key in ("chat_id", "user_id", "emotion", "type"):
+        if filters.get(key) is not None:
+            clauses.append({key: filters[key]})
+    if filters.get("since") is not None:
+        clauses.append({"timestamp": {"$gte": int(filters["since"])}})
+    if filters.get("until") is not None:
+        clauses.append({"timestamp": {"$lte": int(filters["until"])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+class ChromaBackend(VectorBackend):
+    """Chroma persistent collection with a cosine HNSW index"""
+
+    name = "chroma"
+
+    def __init__(self, persist_path: str):
+        # chromadb is slow to import and open, both wait for first use
+        self._collection = Lazy(lambda: self._open(persist_path))
+
+    def _open(self, persist_path: str):
+        import chromadb
+        self.client = chromadb.PersistentClient(path=persist_path)
+
+        collection = self.client.get_or_create_collection(
+            name="messages",
+            metadata={"hnsw:space": "cosine"}
+        )
+        self._migrate_ids(collection)
+        return collection
+
+    def _migrate_ids(self, collection):
+        """Re-keys vectors stored under random uuids by their message id"""
+        first = collection.get(limit=1, include=["metadatas"])
+        if not first["ids"] or first["ids"][0] == str(first["metadatas"][0].get("original_id")):
+            return
+
+        ids = collection.get(include=[])["ids"]
+        logging.info(f"[INFO] Re-keying {len(ids)} vectors by message id")
+
+        for i in range(0, len(ids), CHUNK):
+            chunk = collection.get(ids=ids[i:i + CHUNK], include=["embeddings", "documents", "metadatas"])
+            keep = [k for k, meta in enumerate(chunk["metadatas"]) if meta.get("original_id")]
+            legacy = [old for old, meta in zip(chunk["ids"], chunk["metadatas"]) if str(meta.get("original_id")) != old]
+
+            if keep:
+                # duplicates of one message collapse into a single vector
+                collection.upsert(
+                    ids=[str(chunk["metadatas"][k]["original_id"]) for k in keep],
+                    embeddings=[chunk["embeddings"][k] for k in keep],
+                    documents=[chunk["documents"][k] for k in keep],
+                    metadatas=[chunk["metadatas"][k] for k in keep]
+                )
+            if legacy:
+                collection.delete(ids=legacy)
+
+    @property
+    def collection(self):
+        return self._collection.get()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids: List[int], embeddings: np.ndarray, documents: List[str], metadatas: List[dict]):
+        for i in range(0, len(ids), CHUNK):
+            self.collection.upsert(
+                ids=[str(x) for x in ids[i:i + CHUNK]],
+                embeddings=embeddings[i:i + CHUNK],
+                documents=documents[i:i + CHUNK],
+                metadatas=metadatas[i:i + CHUNK]
+            )
+
+    def delete(self, ids: List[int]):
+        keys = [str(i) for i in ids]
+        for i in range(0, len(keys), CHUNK):
+            self.collection.delete(ids=keys[i:i + CHUNK])
+
+    def _existing(self, ids: List[int]) -> List[str]:
+        found = []
+        keys = [str(i) for i in ids]
+        for i in range(0, len(keys), CHUNK):
+            found += self.collection.get(ids=keys[i:i + CHUNK], include=[])["ids"]
+        return found
+
+    def update(self, ids: List[int], metadata: dict):
+        # vectors of messages without an embedding don't exist
+        found = self._existing(ids)
+        for i in range(0, len(found), CHUNK):
+            chunk = found[i:i + CHUNK]
+            self.collection.update(ids=chunk, metadatas=[dict(metadata) for _ in chunk])
+
+    def update_many(self, ids: List[int], metadatas: List[dict]):
+        by_id = {str(i): m for i, m in zip(ids, metadatas)}
+        found = self._existing(ids)
+        for i in range(0, len(found), CHUNK):
+            chunk = found[i:i + CHUNK]
+            self.collection.update(ids=chunk, metadatas=[by_id[k] for k in chunk])
+
+    def contains(self, ids: List[int]) -> Set[int]:
+        return {int(k) for k in self._existing(ids)}
+
+    def get(self, ids: List[int]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]], List[dict]]:
+        keys = [str(i) for i in ids]
+        found, vectors, documents, metadatas = [], [], [], []
+        for i in range(0, len(keys), CHUNK):
+            result = self.collection.get(ids=keys[i:i + CHUNK], include=["embeddings", "documents", "metadatas"])
+            found += [int(k) for k in result["ids"]]
+            vectors += list(result["embeddings"])
+            documents += result["documents"]
+            metadatas += result["metadatas"]
+        return np.asarray(found, dtype=np.int64), np.asarray(vectors, dtype=np.float32).reshape(len(found), -1), documents, metadatas
+
+    def scan(self, chunk_size: int, embeddings: bool = True) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], List[dict]]]:
+        include = ["embeddings", "metadatas"] if embeddings else ["metadatas"]
+        offset = 0
+        while True:
+            result = self.collection.get(include=include, limit=chunk_size, offset=offset)
+            if not result["ids"]:
+                return
+            offset += len(result["ids"])
+
+            ids = np.array([int(m.get("original_id") or 0) for m in result["metadatas"]], dtype=np.int64)
+            vectors = np.asarray(result["embeddings"], dtype=np.float32) if embeddings else None
+            yield ids, vectors, result["metadatas"]
+
+    def search(self, query: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[Tuple[int, float, Optional[str], dict]]:
+        return self.search_many(np.asarray(query)[None, :], top_k, filters)[0]
+
+    def search_many(self, queries: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[List[Tuple[int, float, Optional[str], dict]]]:
+        results = []
+        # one query call per Chroma batch, HNSW searches them together
+        for i in range(0, len(queries), CHUNK):
+            result = self.collection.query(
+                query_embeddings=list(np.asarray(queries[i:i + CHUNK], dtype=np.float32)),
+                n_results=top_k,
+                where=build_where(filters)
+            )
+            for q in range(len(result["ids"])):
+                metas, docs, dists = result["metadatas"][q], result["documents"][q], result["distances"][q]
+                results.append([
+                    (int(metas[k]["original_id"]), 1 - float(dists[k]), docs[k], metas[k])
+                    for k in range(len(metas))
+                ])
+        return results
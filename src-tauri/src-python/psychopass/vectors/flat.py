@@ -0,0 +1,357 @@
+import os, json, logging, threading
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from psychopass.vectors.base import VectorBackend, normalize
+
+# fixed-size metadata record, one per vector row
+ROW = np.dtype([
+    ("id", "<i8"),
+    ("chat_id", "<i8"),
+    ("user_id", "<i8"),
+    ("timestamp", "<i8"),
+    ("type", "u1"),
+    ("emotion", "<i2"),
+    ("norm", "<f4"), # length of the upserted vector, 0 if unknown
+])
+
+# rows of stores written before norms were kept
+ROW_V1 = np.dtype([(name, ROW.fields[name][0]) for name in ROW.names if name != "norm"])
+
+TYPES = ["", "text", "image"]
+
+# rows scored per matmul, bounds the float32 copy of a float16 chunk
+SEARCH_CHUNK = 16384
+
+class FlatBackend(VectorBackend):
+    """
+    Exact search over L2-normalized embeddings in a memory-mapped file.
+
+        header.json  dim, dtype, count, capacity, dead rows, emotion labels
+        vectors.bin  (capacity, dim) float16/float32
+        rows.bin     (capacity,) ROW records, id 0 marks a deleted row
+
+    Vectors are stored normalized for search, get() and scan() scale them
+    back by the stored norm, so callers get what they upserted.
+
+    Rows are appended, deletes leave tombstones until compact() rewrites
+    the live rows. The header is written after the data is flushed, so
+    rows past its count from an interrupted write are ignored.
+    """
+
+    name = "flat"
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.vectors: Optional[np.memmap] = None
+        self.rows: Optional[np.memmap] = None
+        self._index: Optional[Dict[int, int]] = None # message id -> row
+
+        os.makedirs(path, exist_ok=True)
+        self.header = {"version": 2, "dim": 0, "dtype": dtype, "count": 0, "capacity": 0, "dead": 0, "emotions": []}
+        header_path = os.path.join(path, "header.json")
+        if os.path.exists(header_path):
+            with open(header_path, "r", encoding="utf-8") as f:
+                self.header.update({"version": 1, **json.load(f)})
+        self.dtype = np.dtype(self.header["dtype"])
+        if self.header["version"] < 2:
+            self._upgrade_rows()
+        self._map()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _map(self):
+        capacity = self.header["capacity"]
+        if capacity == 0:
+            self.vectors = self.rows = None
+            return
+        self.vectors = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r+", shape=(capacity, self.header["dim"]))
+        self.rows = np.memmap(self._file("rows.bin"), dtype=ROW, mode="r+", shape=(capacity,))
+
+    def _upgrade_rows(self):
+        """Rewrites version 1 rows with an unknown norm"""
+        capacity = self.header["capacity"]
+        if capacity:
+            old = np.fromfile(self._file("rows.bin"), dtype=ROW_V1, count=capacity)
+            rows = np.zeros(capacity, dtype=ROW)
+            for name in ROW_V1.names:
+                rows[name] = old[name]
+            rows.tofile(self._file("rows.bin.tmp"))
+            os.replace(self._file("rows.bin.tmp"), self._file("rows.bin"))
+            logging.warning(
+                f"[WARN] {self.path} predates stored vector norms, re-classification reads its vectors "
+                "normalized. Delete it to copy the vectors again from Chroma"
+            )
+        self.header["version"] = 2
+        self._save_header()
+
+    def _scaled(self, vectors: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Stored unit vectors back at their upserted length"""
+        norms = rows["norm"]
+        return vectors * np.where(norms > 0, norms, 1.0).astype(np.float32)[:, None]
+
+    def _unmap(self):
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.rows.flush()
+        # mapped files can't be resized on Windows
+        self.vectors = self.rows = None
+
+    def _save_header(self):
+        tmp = self._file("header.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.header, f)
+        os.replace(tmp, self._file("header.json"))
+
+    def _grow(self, needed: int):
+        capacity = self.header["capacity"]
+        if needed <= capacity:
+            return
+
+        capacity = max(needed, capacity * 2, 1024)
+        self._unmap()
+        for name, itemsize in (("vectors.bin", self.dtype.itemsize * self.header["dim"]), ("rows.bin", ROW.itemsize)):
+            with open(self._file(name), "ab") as f:
+                f.truncate(capacity * itemsize)
+        self.header["capacity"] = capacity
+        self._map()
+
+    def _commit(self):
+        self.vectors.flush()
+        self.rows.flush()
+        self._save_header()
+
+    @property
+    def index(self) -> Dict[int, int]:
+        if self._index is None:
+            n = self.header["count"]
+            ids = np.asarray(self.rows["id"][:n]) if n else np.zeros(0, dtype=np.int64)
+            live = np.flatnonzero(ids > 0)
+            self._index = dict(zip(ids[live].tolist(), live.tolist()))
+        return self._index
+
+    def _emotion_code(self, emotion: Optional[str], add: bool) -> int:
+        if not emotion:
+            return -1
+        labels = self.header["emotions"]
+        if emotion not in labels:
+            if not add:
+                return -2 # matches no row
+            labels.append(emotion)
+        return labels.index(emotion)
+
+    def _encode(self, record, metadata: dict):
+        """Writes the metadata fields present in metadata into a ROW record"""
+        for key in ("chat_id", "user_id", "timestamp"):
+            if key in metadata:
+                record[key] = int(metadata[key] or 0)
+        if "type" in metadata:
+            record["type"] = TYPES.index(metadata["type"]) if metadata["type"] in TYPES else 0
+        if "emotion" in metadata:
+            record["emotion"] = self._emotion_code(metadata["emotion"], add=True)
+
+    def _decode(self, record) -> dict:
+        metadata = {
+            "type": TYPES[record["type"]],
+            "original_id": int(record["id"]),
+            "chat_id": int(record["chat_id"]) or "",
+            "user_id": int(record["user_id"]) or "",
+        }
+        # absent like in stores written before these fields existed
+        if record["emotion"] >= 0:
+            metadata["emotion"] = self.header["emotions"][record["emotion"]]
+        if record["timestamp"]:
+            metadata["timestamp"] = int(record["timestamp"])
+        return metadata
+
+    def count(self) -> int:
+        return self.header["count"] - self.header["dead"]
+
+    def upsert(self, ids: List[int], embeddings: np.ndarray, documents: List[str], metadatas: List[dict]):
+        if not len(ids):
+            return
+
+        with self.lock:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=-1)
+            embeddings = normalize(embeddings)
+            if not self.header["dim"]:
+                self.header["dim"] = embeddings.shape[1]
+
+            index = self.index
+            count = self.header["count"]
+            positions = np.empty(len(ids), dtype=np.int64)
+            for k, message_id in enumerate(ids):
+                pos = index.get(int(message_id))
+                if pos is None:
+                    pos = index[int(message_id)] = count
+                    count += 1
+                positions[k] = pos
+
+            self._grow(count)
+
+            records = np.zeros(len(ids), dtype=ROW)
+            records["id"] = ids
+            records["emotion"] = -1
+            records["norm"] = norms
+            for record, metadata in zip(records, metadatas):
+                self._encode(record, metadata)
+
+            self.vectors[positions] = embeddings.astype(self.dtype)
+            self.rows[positions] = records
+            self.header["count"] = count
+            self._commit()
+
+    def delete(self, ids: List[int]):
+        with self.lock:
+            index = self.index
+            positions = [index.pop(int(i)) for i in ids if int(i) in index]
+            if not positions:
+                return
+
+            self.rows["id"][positions] = 0
+            self.header["dead"] += len(positions)
+            self._commit()
+
+            # tombstones are scanned on every search
+            if self.header["dead"] * 2 > self.header["count"] and self.header["count"] >= 4096:
+                self.compact()
+
+    def update(self, ids: List[int], metadata: dict):
+        self.update_many(ids, [metadata] * len(ids))
+
+    def update_many(self, ids: List[int], metadatas: List[dict]):
+        with self.lock:
+            index = self.index
+            changed = False
+            for message_id, metadata in zip(ids, metadatas):
+                pos = index.get(int(message_id))
+                if pos is None:
+                    continue
+                self._encode(self.rows[pos], metadata)
+                changed = True
+
+            if changed:
+                self._commit()
+
+    def compact(self):
+        """Rewrites the live rows contiguously and drops the tombstones"""
+        with self.lock:
+            n = self.header["count"]
+            live = np.flatnonzero(np.asarray(self.rows["id"][:n]) > 0) if n else np.zeros(0, dtype=np.int64)
+
+            with open(self._file("vectors.bin.tmp"), "wb") as vf, open(self._file("rows.bin.tmp"), "wb") as rf:
+                for i in range(0, len(live), SEARCH_CHUNK):
+                    chunk = live[i:i + SEARCH_CHUNK]
+                    vf.write(np.ascontiguousarray(self.vectors[chunk]).tobytes())
+                    rf.write(np.ascontiguousarray(self.rows[chunk]).tobytes())
+
+            self._unmap()
+            os.replace(self._file("vectors.bin.tmp"), self._file("vectors.bin"))
+            os.replace(self._file("rows.bin.tmp"), self._file("rows.bin"))
+            self.header.update(count=len(live), capacity=len(live), dead=0)
+            self._save_header()
+            self._index = None
+            self._map()
+
+    def contains(self, ids: List[int]) -> Set[int]:
+        with self.lock:
+            index = self.index
+            return {int(i) for i in ids if int(i) in index}
+
+    def get(self, ids: List[int]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]], List[dict]]:
+        with self.lock:
+            index = self.index
+            found = [int(i) for i in ids if int(i) in index]
+            positions = np.array([index[i] for i in found], dtype=np.int64)
+            if not len(positions):
+                return np.zeros(0, dtype=np.int64), np.zeros((0, self.header["dim"]), dtype=np.float32), [], []
+
+            rows = np.array(self.rows[positions])
+            vectors = self._scaled(np.asarray(self.vectors[positions], dtype=np.float32), rows)
+            metadatas = [self._decode(r) for r in rows]
+        return np.asarray(found, dtype=np.int64), vectors, [None] * len(found), metadatas
+
+    def scan(self, chunk_size: int, embeddings: bool = True) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], List[dict]]]:
+        for start in range(0, self.header["count"], chunk_size):
+            with self.lock:
+                end = min(start + chunk_size, self.header["count"])
+                rows = np.array(self.rows[start:end])
+                live = np.flatnonzero(rows["id"] > 0)
+                if not len(live):
+                    continue
+                vectors = self._scaled(np.asarray(self.vectors[start:end][live], dtype=np.float32), rows[live]) if embeddings else None
+                metadatas = [self._decode(r) for r in rows[live]]
+            yield rows["id"][live].copy(), vectors, metadatas
+
+    def _mask(self, rows: np.ndarray, filters: dict) -> np.ndarray:
+        mask = rows["id"] > 0
+        for key in ("chat_id", "user_id"):
+            if filters.get(key) is not None:
+                mask &= rows[key] == int(filters[key])
+        if filters.get("emotion") is not None:
+            mask &= rows["emotion"] == self._emotion_code(filters["emotion"], add=False)
+        if filters.get("type") is not None:
+            mask &= rows["type"] == (TYPES.index(filters["type"]) if filters["type"] in TYPES else 255)
+        if filters.get("since") is not None:
+            mask &= rows["timestamp"] >= int(filters["since"])
+        if filters.get("until") is not None:
+            mask &= rows["timestamp"] <= int(filters["until"])
+        return mask
+
+    def search(self, query: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[Tuple[int, float, Optional[str], dict]]:
+        return self.search_many(np.asarray(query)[None, :], top_k, filters)[0]
+
+    def search_many(self, queries: np.ndarray, top_k: int, filters: Optional[dict] = None) -> List[List[Tuple[int, float, Optional[str], dict]]]:
+        """Exact top_k of every query row, one matmul per chunk for all of them"""
+        if top_k <= 0:
+            return [[] for _ in queries]
+
+        queries = normalize(queries)
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+
+        with self.lock:
+            n = self.header["count"]
+            for start in range(0, n, SEARCH_CHUNK):
+                end = min(start + SEARCH_CHUNK, n)
+                mask = self._mask(np.asarray(self.rows[start:end]), filters or {})
+                live = np.flatnonzero(mask)
+                if not len(live):
+                    continue
+
+                if len(live) * 2 > len(mask):
+                    # mostly live: score the contiguous block, no gather copy
+                    chunk_scores = queries @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+                    chunk_scores = chunk_scores[:, live]
+                else:
+                    chunk_scores = queries @ np.asarray(self.vectors[start:end][live], dtype=np.float32).T
+
+                scores = np.concatenate([best_scores, chunk_scores], axis=1)
+                rows = np.concatenate([best_rows, np.broadcast_to(live + start, (n_queries, len(live)))], axis=1)
+
+                # carry only the current top_k of every query to the next chunk
+                if scores.shape[1] > top_k:
+                    keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+                    scores = np.take_along_axis(scores, keep, axis=1)
+                    rows = np.take_along_axis(rows, keep, axis=1)
+                best_scores, best_rows = scores, rows
+
+            order = np.argsort(-best_scores, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+            records = np.array(self.rows[best_rows.ravel()]).reshape(best_rows.shape) if best_rows.size else None
+            return [
+                [
+                    (int(records[q, k]["id"]), float(best_scores[q, k]), None, self._decode(records[q, k]))
+                    for k in range(best_rows.shape[1])
+                ]
+                for q in range(n_queries)
+            ]
+
+    def close(self):
+        with self.lock:
+            self._unmap()
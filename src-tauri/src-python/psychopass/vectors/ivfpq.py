@@ -0,0 +1,243 @@
+import os, logging
+import numpy as np
+from typing import Iterator, Optional, Tuple
+from psychopass.vectors.base import normalize
+
+# rows per distance matrix, bounds the (rows, centroids) float32 temporaries
+ASSIGN_CHUNK = 8192
+
+def nearest(x: np.ndarray, centroids: np.ndarray, norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row of x"""
+    if norms is None:
+        norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(x), dtype=np.int64)
+    for i in range(0, len(x), ASSIGN_CHUNK):
+        # ||x||^2 is the same for every centroid
+        dist = norms - 2 * (x[i:i + ASSIGN_CHUNK] @ centroids.T)
+        labels[i:i + ASSIGN_CHUNK] = np.argmin(dist, axis=1)
+    return labels
+
+def kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means from random rows, empty clusters restart at random rows"""
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest(x, centroids)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+
+        # per-cluster sums over the rows sorted by cluster
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids[~empty] = np.add.reduceat(x[order], starts, axis=0) / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+    return centroids
+
+def sample_vectors(backend, size: int, chunk_size: int = 4096, seed: int = 0) -> np.ndarray:
+    """About size stored vectors picked uniformly in one pass"""
+    rate = min(1.0, size / max(backend.count(), 1))
+    rng = np.random.default_rng(seed)
+    picked = []
+    for _, vectors, _ in backend.scan(chunk_size):
+        picked.append(vectors[rng.random(len(vectors)) < rate])
+    return np.vstack(picked) if picked else np.zeros((0, 0), dtype=np.float32)
+
+class IVFPQIndex:
+    """
+    Inverted file over coarse k-means lists, with residuals to the list
+    centroid product-quantized into m one-byte codes.
+
+    For a unit query q the inner product with an indexed vector is
+    q.c_list + sum_j q_j.codebook_j[code_j], so one (m, 256) lookup table
+    per query scores every probed list. Scores are approximate, callers
+    re-rank the best candidates with the stored full-precision vectors.
+
+    Vectors added after training go to an unsorted tail that is scanned
+    like one more list, merge() sorts it into the lists.
+    """
+
+    def __init__(self, centroids: np.ndarray, codebooks: np.ndarray):
+        self.centroids = centroids.astype(np.float32) # (nlist, dim)
+        self.codebooks = codebooks.astype(np.float32) # (m, 256, dim // m)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        # lists in CSR form: list l holds rows offsets[l]:offsets[l + 1]
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros((0, self.m), dtype=np.uint8)
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+
+        self.tail_ids = np.zeros(0, dtype=np.int64)
+        self.tail_lists = np.zeros(0, dtype=np.int64)
+        self.tail_codes = np.zeros((0, self.m), dtype=np.uint8)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def m(self) -> int:
+        return len(self.codebooks)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.tail_ids)
+
+    @classmethod
+    def train(cls, sample: np.ndarray, nlist: int, m: int = 64, iterations: int = 10, seed: int = 0) -> "IVFPQIndex":
+        """Coarse centroids and PQ codebooks from a sample of stored vectors"""
+        sample = normalize(sample)
+        n, dim = sample.shape
+        if dim % m:
+            raise ValueError(f"Dimension {dim} isn't divisible by {m} sub-quantizers")
+
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, n))
+        centroids = kmeans(sample, nlist, iterations, rng)
+
+        residuals = sample - centroids[nearest(sample, centroids)]
+        sub = dim // m
+        ksub = min(256, n)
+        codebooks = np.zeros((m, 256, sub), dtype=np.float32)
+        for j in range(m):
+            codebooks[j, :ksub] = kmeans(np.ascontiguousarray(residuals[:, j * sub:(j + 1) * sub]), ksub, iterations, rng)
+
+        return cls(centroids, codebooks)
+
+    @classmethod
+    def build(cls, backend, m: int = 64, sample_size: int = 100_000, iterations: int = 10, chunk_size: int = 4096, seed: int = 0) -> "IVFPQIndex":
+        """Trains on a sample of backend and indexes every stored vector"""
+        sample = sample_vectors(backend, sample_size, chunk_size, seed)
+        if not len(sample):
+            raise ValueError("No vectors to train the index on")
+
+        # ~sqrt(n) lists keeps both the coarse scan and the list scans short
+        nlist = int(np.clip(np.sqrt(backend.count()), 16, 4096))
+        index = cls.train(sample, min(nlist, len(sample) // 39 or 1), m, iterations, seed)
+
+        ids, lists, codes = [], [], []
+        for chunk_ids, vectors, _ in backend.scan(chunk_size):
+            keep = chunk_ids > 0
+            chunk_lists, chunk_codes = index.encode(vectors[keep])
+            ids.append(chunk_ids[keep])
+            lists.append(chunk_lists)
+            codes.append(chunk_codes)
+
+        index.tail_ids = np.concatenate(ids)
+        index.tail_lists = np.concatenate(lists)
+        index.tail_codes = np.concatenate(codes)
+        index.merge()
+        return index
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(list, codes) of every vector"""
+        vectors = normalize(vectors)
+        lists = nearest(vectors, self.centroids, self.centroid_norms)
+        residuals = vectors - self.centroids[lists]
+
+        sub = self.dim // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest(np.ascontiguousarray(residuals[:, j * sub:(j + 1) * sub]), self.codebooks[j])
+        return lists, codes
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        if not len(ids):
+            return
+        lists, codes = self.encode(vectors)
+        self.tail_ids = np.concatenate([self.tail_ids, np.asarray(ids, dtype=np.int64)])
+        self.tail_lists = np.concatenate([self.tail_lists, lists])
+        self.tail_codes = np.concatenate([self.tail_codes, codes])
+
+    def merge(self):
+        """Sorts the tail into the lists, a re-added id keeps only its latest code"""
+        if not len(self.tail_ids):
+            return
+        ids = np.concatenate([self.ids, self.tail_ids])
+        codes = np.concatenate([self.codes, self.tail_codes])
+        lists = np.concatenate([np.repeat(np.arange(self.nlist), np.diff(self.offsets)), self.tail_lists])
+
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = len(ids) - 1 - last
+        keep = keep[np.argsort(lists[keep], kind="stable")]
+
+        self.ids = ids[keep]
+        self.codes = codes[keep]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists[keep], minlength=self.nlist))])
+
+        self.tail_ids = np.zeros(0, dtype=np.int64)
+        self.tail_lists = np.zeros(0, dtype=np.int64)
+        self.tail_codes = np.zeros((0, self.m), dtype=np.uint8)
+
+    def _candidates(self, probe: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        for l in probe:
+            start, end = self.offsets[l], self.offsets[l + 1]
+            if end > start:
+                yield l, self.ids[start:end], self.codes[start:end]
+        if len(self.tail_ids):
+            for l in np.intersect1d(probe, self.tail_lists):
+                rows = self.tail_lists == l
+                yield l, self.tail_ids[rows], self.tail_codes[rows]
+
+    def search(self, queries: np.ndarray, top_k: int, nprobe: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top_k (ids, scores) of every query row, ids of 0 pad
+        queries whose probed lists hold fewer than top_k vectors.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.nlist)
+        sub = self.dim // self.m
+
+        result_ids = np.zeros((len(queries), top_k), dtype=np.int64)
+        result_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+
+        coarse = queries @ self.centroids.T
+        # nearest lists by L2, for unit queries -2q.c + ||c||^2
+        probes = np.argpartition(self.centroid_norms - 2 * coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        for q, query in enumerate(queries):
+            # (m, 256) inner products of the query's sub-vectors with every code
+            table = np.einsum("js,jks->jk", query.reshape(self.m, sub), self.codebooks)
+            ids, scores = [], []
+            for l, list_ids, codes in self._candidates(probes[q]):
+                ids.append(list_ids)
+                scores.append(coarse[q, l] + table[np.arange(self.m), codes].sum(axis=1))
+            if not ids:
+                continue
+
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+            k = min(top_k, len(ids))
+            best = np.argpartition(-scores, k - 1)[:k] if len(ids) > k else np.arange(len(ids))
+            best = best[np.argsort(-scores[best])]
+            result_ids[q, :k] = ids[best]
+            result_scores[q, :k] = scores[best]
+
+        return result_ids, result_scores
+
+    def save(self, path: str):
+        self.merge()
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            ids=self.ids,
+            codes=self.codes,
+            offsets=self.offsets
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFPQIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                index = cls(data["centroids"], data["codebooks"])
+                index.ids, index.codes, index.offsets = data["ids"], data["codes"], data["offsets"]
+            return index
+        except Exception as e:
+            logging.warning(f"[WARN] Ignoring unreadable vector index {path}: {e}")
+            return None
@@ -0,0 +1,290 @@
+import os, logging, traceback
+import multiprocessing as mp
+import numpy as np
+
+from collections import deque
+from dataclasses import dataclass, field, replace
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from psychopass.batch import MessageBatch
+from psychopass.sessions import SessionConfig
+
+@dataclass
+class WorkerSpec:
+    """Everything a worker process needs to build its own models"""
+    text_embedder: str
+    img_embedder: str
+    model: str
+    encoder: str
+    fused: Optional[str] = None
+    sessions: Dict[str, SessionConfig] = field(default_factory=dict)
+    cache_path: Optional[str] = None
+    cache_size: int = 100_000
+    memory_limit: int = 0 # per process, adaptive batch sizes when set
+
+@dataclass
+class _Task:
+    id: int
+    parsed: object
+    batch: MessageBatch
+    shm: Optional[SharedMemory] = None
+    slot: int = -1
+    tries: int = 0
+    done: bool = False
+
+def embed_and_score(embedder, classifier, texts: List[str], images: List[str], out: np.ndarray) -> np.ndarray:
+    """
+    Writes text then image embeddings into out and returns classifier
+    scores for every row. Texts go through the fused model when loaded.
+    """
+    n_text = len(texts)
+    fused_scores, scored = None, np.zeros(len(out), dtype=bool)
+
+    if texts and embedder.fused:
+        embeddings, fused_scores, scored[:n_text] = embedder.embed_texts_scored(texts)
+        out[:n_text] = embeddings
+    elif texts:
+        out[:n_text] = embedder.embed_texts(texts)
+    if images:
+        out[n_text:] = embedder.embed_images(images)
+
+    pending = np.flatnonzero(~scored)
+    rest = classifier.predict_probs_batch(out[pending]) if len(pending) else None
+
+    width = rest.shape[1] if rest is not None else fused_scores.shape[1]
+    scores = np.empty((len(out), width), dtype=np.float32)
+    if fused_scores is not None and scored.any():
+        scores[:n_text][scored[:n_text]] = fused_scores[scored[:n_text]]
+    if rest is not None:
+        scores[pending] = rest
+    return scores
+
+def _worker_main(spec: WorkerSpec, conn: Connection):
+    """Worker process loop, tasks are (id, texts, images, shm name)"""
+    from psychopass.embedder import Embedder
+    from psychopass.emotions import EmotionClassifier
+    from psychopass.embed_cache import EmbeddingCache
+
+    cache = EmbeddingCache(spec.cache_path, spec.cache_size) if spec.cache_path else None
+    embedder = Embedder(
+        spec.text_embedder,
+        spec.img_embedder,
+        cache=cache,
+        text_config=spec.sessions.get("text"),
+        image_config=spec.sessions.get("image"),
+        fused_path=spec.fused,
+        memory_limit=spec.memory_limit
+    )
+    classifier = EmotionClassifier(spec.model, spec.encoder, spec.sessions.get("classifier"))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        task_id, texts, images, shm_name = task
+        shm = SharedMemory(name=shm_name)
+        try:
+            out = np.ndarray((len(texts) + len(images), 512), dtype=np.float32, buffer=shm.buf)
+            scores = embed_and_score(embedder, classifier, texts, images, out)
+            del out
+            conn.send((task_id, None, scores))
+        except Exception:
+            conn.send((task_id, traceback.format_exc(), None))
+        finally:
+            shm.close()
+
+    logging.info(f"[INFO] Embedding worker batch sizes: {embedder.batch_stats()}")
+
+class EmbedPool:
+    """
+    Worker processes with their own embedder and classifier sessions.
+    Embeddings come back through shared memory, results are yielded in
+    input order. A worker that dies is restarted and its batches resent.
+    """
+
+    def __init__(self, spec: WorkerSpec, workers: int, max_retries: int = 2):
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.ctx = mp.get_context("spawn") # forking a process with live ORT threads isn't safe
+
+        # split the cores between workers unless the config pins thread counts
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.spec = replace(
+            spec,
+            sessions={
+                name: config if config.intra_op_threads else replace(config, intra_op_threads=threads)
+                for name, config in spec.sessions.items()
+            },
+            # the memory ceiling is shared by all workers
+            memory_limit=spec.memory_limit // self.workers
+        )
+
+        self.processes: List[Optional[mp.Process]] = [None] * self.workers
+        self.conns: List[Optional[Connection]] = [None] * self.workers
+        self.assigned: List[Set[int]] = [set() for _ in range(self.workers)]
+
+        for slot in range(self.workers):
+            self._start(slot)
+
+    def __enter__(self) -> "EmbedPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self, slot: int):
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.spec, child_conn),
+            name=f"embed-{slot}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        self.processes[slot] = process
+        self.conns[slot] = parent_conn
+        self.assigned[slot] = set()
+
+    def _restart(self, slot: int, pending: Dict[int, _Task]):
+        process = self.processes[slot]
+        logging.warning(f"[WARN] Embedding worker {process.name} exited with {process.exitcode}, restarting")
+
+        self.conns[slot].close()
+        process.join(timeout=1)
+        lost = sorted(self.assigned[slot])
+        self._start(slot)
+
+        for task_id in lost:
+            task = pending[task_id]
+            task.tries += 1
+            if task.tries > self.max_retries:
+                raise RuntimeError(f"Embedding worker crashed {task.tries} times on batch at offset {task.parsed.offset} of {task.parsed.file}")
+            self._send(task)
+
+    def _send(self, task: _Task):
+        slot = min(range(self.workers), key=lambda s: len(self.assigned[s]))
+        task.slot = slot
+        self.assigned[slot].add(task.id)
+        self.conns[slot].send((task.id, task.batch.texts, task.batch.images, task.shm.name))
+
+    def _submit(self, task: _Task):
+        batch = task.batch
+        rows = len(batch.texts) + len(batch.images)
+        if rows == 0:
+            task.done = True
+            return
+
+        task.shm = SharedMemory(create=True, size=rows * 512 * 4)
+        self._send(task)
+
+    def _finish(self, task: _Task, scores: np.ndarray):
+        batch = task.batch
+        n_text = len(batch.texts)
+        out = np.ndarray((n_text + len(batch.images), 512), dtype=np.float32, buffer=task.shm.buf)
+
+        batch.embeddings[batch.text_idx] = out[:n_text]
+        batch.embeddings[batch.image_idx] = out[n_text:]
+        batch.set_scores(np.concatenate([batch.text_idx, batch.image_idx]), scores)
+
+        del out
+        self._release(task)
+        task.done = True
+
+    def _release(self, task: _Task):
+        if task.shm is not None:
+            task.shm.close()
+            task.shm.unlink()
+            task.shm = None
+
+    def _poll(self, pending: Dict[int, _Task]):
+        """Waits for results or dead workers"""
+        sentinels = {self.processes[s].sentinel: s for s in range(self.workers)}
+        conns = {self.conns[s]: s for s in range(self.workers)}
+        ready = wait(list(conns) + list(sentinels), timeout=1.0)
+
+        crashed = set()
+        for obj in ready:
+            if obj in conns:
+                slot = conns[obj]
+                try:
+                    task_id, error, scores = obj.recv()
+                except (EOFError, OSError):
+                    crashed.add(slot)
+                    continue
+
+                self.assigned[slot].discard(task_id)
+                if error:
+                    raise RuntimeError(f"Embedding worker failed:\n{error}")
+                self._finish(pending[task_id], scores)
+            else:
+                crashed.add(sentinels[obj])
+
+        for slot in crashed:
+            self.processes[slot].join(timeout=1)
+            if not self.processes[slot].is_alive():
+                self._restart(slot, pending)
+
+    def imap(self, items: Iterable) -> Iterator[Tuple[object, MessageBatch]]:
+        """
+        Embeds and classifies ParseBatches, yields (parsed, MessageBatch)
+        in input order with scores set. A bounded window of batches is in flight.
+        """
+        window = self.workers * 2
+        source = iter(items)
+        pending: Dict[int, _Task] = {}
+        order: deque = deque()
+        exhausted = False
+        next_id = 0
+
+        try:
+            while True:
+                while not exhausted and len(order) < window:
+                    try:
+                        parsed = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    task = _Task(next_id, parsed, MessageBatch.from_messages(parsed.messages))
+                    next_id += 1
+                    pending[task.id] = task
+                    order.append(task.id)
+                    self._submit(task)
+
+                while order and pending[order[0]].done:
+                    task = pending.pop(order.popleft())
+                    yield task.parsed, task.batch
+
+                if not order:
+                    if exhausted:
+                        return
+                    continue
+
+                self._poll(pending)
+        finally:
+            for task in pending.values():
+                self._release(task)
+            if hasattr(source, "close"):
+                source.close()
+
+    def close(self):
+        for slot in range(self.workers):
+            try:
+                self.conns[slot].send(None)
+            except (OSError, BrokenPipeError):
+                pass
+
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        for conn in self.conns:
+            conn.close()
@@ -0,0 +1,25 @@
+"""
+Entry points of spawned worker processes.
+
+Importing psychopass runs the app module (pytauri, config, UserDB), so
+workers register a bare psychopass package and import only the
+submodules they use.
+"""
+import sys, types, importlib.util
+from typing import List, Tuple
+
+def bare_package():
+    """Makes psychopass submodules importable without running psychopass/__init__"""
+    if "psychopass" in sys.modules:
+        return
+    # find_spec of a top-level name locates it without executing it
+    spec = importlib.util.find_spec("psychopass")
+    package = types.ModuleType("psychopass")
+    package.__path__ = list(spec.submodule_search_locations)
+    sys.modules["psychopass"] = package
+
+def parse_file(platform: str, file: str, root: str) -> Tuple[List, List]:
+    """Parse pool entry point, see ChatParser._map_files"""
+    bare_package()
+    from psychopass.parser import parse_file
+    return parse_file(platform, file, root)
@@ -0,0 +1,5 @@
+import psychopass_worker
+
+# psychopass/__init__ starts the app (pytauri, config, UserDB), tests
+# import its submodules without it like the spawned workers do
+psychopass_worker.bare_package()
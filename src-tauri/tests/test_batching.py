@@ -0,0 +1,108 @@
+from psychopass.batching import AdaptiveBatchSize, rebatch
+from psychopass.parser import ParseBatch
+
+def batches(file: str, sizes: list, start: int = 0, chats=None) -> list:
+    """Parser batches of consecutive message numbers, as a stream parser yields them"""
+    result, offset = [], start
+    for size in sizes:
+        result.append(ParseBatch(
+            messages=list(range(offset, offset + size)),
+            chats=chats if chats is not None else [file],
+            progress=offset + size,
+            total=1000,
+            file=file,
+            offset=offset,
+            position=(offset + size) * 10
+        ))
+        offset += size
+    return result
+
+def spans(merged: list) -> list:
+    return [(b.file, b.offset, b.end, len(b.messages)) for b in merged]
+
+def test_merges_contiguous_batches_up_to_size():
+    sizer = AdaptiveBatchSize("test", 10, 10, 10)
+    merged = list(rebatch(iter(batches("a", [4, 4, 4, 4, 3])), sizer))
+
+    assert spans(merged) == [("a", 0, 12, 12), ("a", 12, 19, 7)]
+    assert merged[0].messages == list(range(12))
+    assert merged[0].progress == 12 and merged[0].position == 120
+    assert merged[1].progress == 19 and merged[1].position == 190
+
+def test_splits_on_file_change_and_gaps():
+    sizer = AdaptiveBatchSize("test", 100, 100, 100)
+    parsed = batches("a", [5, 5]) + batches("a", [5], start=20) + batches("b", [5, 5])
+    assert spans(rebatch(iter(parsed), sizer)) == [("a", 0, 10, 10), ("a", 20, 25, 5), ("b", 0, 10, 10)]
+
+def test_filtered_batches_keep_their_end():
+    sizer = AdaptiveBatchSize("test", 100, 100, 100)
+    parsed = batches("a", [5, 5, 5])
+    # the middle batch lost its messages to dedup but still covers 5..10
+    parsed[1] = ParseBatch(messages=[], chats=[], progress=10, total=1000, file="a", offset=5, end=10, position=100)
+
+    merged = list(rebatch(iter(parsed), sizer))
+    assert spans(merged) == [("a", 0, 15, 10)]
+    assert merged[0].messages == list(range(5)) + list(range(10, 15))
+
+def test_parser_lists_are_not_mutated():
+    shared = ["chat"]
+    parsed = batches("a", [3, 3], chats=shared)
+    first = parsed[0].messages
+
+    merged = list(rebatch(iter(parsed), AdaptiveBatchSize("test", 100, 100, 100)))
+    assert first == [0, 1, 2] and shared == ["chat"]
+    assert merged[0].chats == ["chat"]
+
+def test_follows_the_current_size():
+    sizer = AdaptiveBatchSize("test", 4, 2, 64)
+    seen = []
+    for batch in rebatch(iter(batches("a", [2] * 20)), sizer):
+        seen.append(len(batch.messages))
+        if len(seen) == 1:
+            sizer.size = 8
+    assert seen == [4, 8, 8, 8, 8, 4]
+
+def test_fixed_size_ignores_measurements():
+    sizer = AdaptiveBatchSize("test", 32, 16, 16)
+    assert sizer.fixed and sizer.size == 16
+    assert sizer.record(16, 0.1) == 16
+    assert sizer.record(16, 100.0) == 16
+    assert sizer.stats()["batches"] == 0
+
+def test_grows_while_latency_holds_and_halves_when_it_degrades():
+    sizer = AdaptiveBatchSize("test", 8, 4, 20, step=4)
+    assert sizer.record(8, 0.8) == 12
+    assert sizer.record(12, 1.2) == 16
+    assert sizer.record(16, 1.6) == 20
+    assert sizer.record(20, 2.0) == 20 # capped at the maximum
+
+    # 1.2x slower per item is noise, 2x halves
+    assert sizer.record(20, 2.4) == 20
+    assert sizer.record(20, 4.0) == 10
+    assert sizer.shrinks == 1
+
+    # the best is measured again at the new size
+    assert sizer.record(10, 3.0) == 14
+
+def test_partial_batches_are_ignored():
+    sizer = AdaptiveBatchSize("test", 8, 4, 64)
+    assert sizer.record(3, 100.0) == 8
+    assert sizer.record(0, 1.0) == 8
+    assert sizer.best is None
+
+def test_work_normalizes_latency():
+    sizer = AdaptiveBatchSize("test", 8, 4, 64, step=4)
+    sizer.record(8, 1.0, work=1000)
+    # twice the time for twice the padded tokens is the same speed
+    assert sizer.record(12, 2.0, work=2000) == 16
+
+def test_shrinks_over_the_memory_limit():
+    sizer = AdaptiveBatchSize("test", 64, 4, 128, memory_limit=1)
+    assert sizer.record(64, 0.1) == 32
+    assert sizer.record(32, 0.1) == 16
+    assert sizer.stats()["shrinks"] == 2
+
+    # never below the minimum
+    for _ in range(5):
+        sizer.record(sizer.size, 0.1)
+    assert sizer.size == 4
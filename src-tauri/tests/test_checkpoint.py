@@ -0,0 +1,101 @@
+import os, json
+import numpy as np
+import pytest
+from psychopass.checkpoint import IngestCheckpoints
+from psychopass.database import UserDB
+from psychopass.memory import Memory
+from psychopass.parser import ParseBatch, parser
+from psychopass.utils import file_hash
+from psychopass.vectors import FlatBackend
+import psychopass.parsers.telegram
+
+@pytest.fixture
+def database(tmp_path):
+    return UserDB(str(tmp_path / "db.sqlite"), str(tmp_path / "cache"))
+
+@pytest.fixture
+def memory(tmp_path):
+    return Memory(None, FlatBackend(str(tmp_path / "vectors")))
+
+@pytest.fixture
+def export(tmp_path):
+    folder = tmp_path / "export"
+    folder.mkdir()
+    messages = [
+        # every 7th one is a service message the parser drops
+        {"id": i, "type": "service" if i % 7 == 0 else "message", "date": f"2024-01-01T00:00:{i % 60:02}",
+         "from": "Ann", "from_id": "user1", "text": f"message {i} ✓"}
+        for i in range(1, 121)
+    ]
+    (folder / "result.json").write_text(
+        json.dumps({"name": "chat", "type": "personal_chat", "id": 1, "messages": messages}, ensure_ascii=False),
+        encoding="utf-8"
+    )
+    return folder
+
+def batch(file: str, offset: int, size: int, position: int = 0) -> ParseBatch:
+    return ParseBatch([f"m{i}" for i in range(offset, offset + size)], [], 0, 0, file, offset, position=position)
+
+def test_file_hash_follows_size_and_mtime(tmp_path):
+    path = tmp_path / "a.json"
+    path.write_bytes(b"x" * (9 << 20))
+    first = file_hash(str(path))
+    assert file_hash(str(path)) == first
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert file_hash(str(path)) != first
+
+def test_resume_drops_committed_messages(database, memory, export):
+    file = str(export / "result.json")
+    checkpoints = IngestCheckpoints(database, memory)
+    assert list(checkpoints.resume(iter([batch(file, 0, 16)])))
+    checkpoints.commit(batch(file, 0, 20), 0)
+
+    resumed = list(IngestCheckpoints(database, memory).resume(iter([batch(file, 0, 16), batch(file, 16, 16)])))
+    assert [(b.offset, b.end, len(b.messages)) for b in resumed] == [(20, 32, 12)]
+    assert resumed[0].messages[0] == "m20"
+
+def test_stream_seeks_to_checkpoint(database, memory, export):
+    full = list(parser.stream("telegram", str(export), 16))
+    ids = [m.platform_id for b in full for m in b.messages]
+
+    checkpoints = IngestCheckpoints(database, memory)
+    for parsed in checkpoints.resume(parser.stream("telegram", str(export), 16, resume=checkpoints.start)):
+        checkpoints.commit(parsed, 0)
+        if parsed.end >= 48:
+            break
+
+    checkpoints = IngestCheckpoints(database, memory)
+    resumed = list(checkpoints.resume(parser.stream("telegram", str(export), 16, resume=checkpoints.start)))
+    assert resumed[0].offset == 48
+    assert [m.platform_id for b in resumed for m in b.messages] == ids[48:]
+    assert resumed[0].chats[0].name == "chat"
+
+def test_last_batch_checkpoint_resumes_to_nothing(database, memory, export):
+    checkpoints = IngestCheckpoints(database, memory)
+    for parsed in checkpoints.resume(parser.stream("telegram", str(export), 16, resume=checkpoints.start)):
+        checkpoints.commit(parsed, 0)
+
+    checkpoints = IngestCheckpoints(database, memory)
+    assert list(checkpoints.resume(parser.stream("telegram", str(export), 16, resume=checkpoints.start))) == []
+
+def test_edited_file_is_imported_again(database, memory, export):
+    file = export / "result.json"
+    checkpoints = IngestCheckpoints(database, memory)
+    checkpoints.start(str(file))
+    checkpoints.commit(batch(str(file), 0, 16, position=100), 0)
+    assert IngestCheckpoints(database, memory).start(str(file)) == (16, 100)
+
+    file.write_text(file.read_text(encoding="utf-8").replace("message 1 ", "message one "), encoding="utf-8")
+    assert IngestCheckpoints(database, memory).start(str(file)) == (0, 0)
+
+def test_vector_store_behind_checkpoint_is_imported_again(database, memory, export):
+    file = str(export / "result.json")
+    memory.backend.upsert([1], np.ones((1, 4), dtype=np.float32), [""], [{"type": "text", "original_id": 1}])
+    checkpoints = IngestCheckpoints(database, memory)
+    checkpoints.start(file)
+    checkpoints.commit(batch(file, 0, 16, position=100), 1)
+
+    memory.backend.delete([1])
+    assert IngestCheckpoints(database, memory).start(file) == (0, 0)
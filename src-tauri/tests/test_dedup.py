@@ -0,0 +1,63 @@
+import asyncio, sqlite3
+import pytest
+import psychopass.database
+from psychopass.batch import MessageBatch
+from psychopass.database import UserDB
+from psychopass.schemas import Message, Chat
+
+class Vectors:
+    """Vector store double holding ids only"""
+
+    def __init__(self):
+        self.stored = set()
+
+    def contains(self, message_ids):
+        return {i for i in message_ids if i in self.stored}
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # SQLite builds before 3.32 bind at most 999 variables per statement
+    register = psychopass.database.register_functions
+    def limited(conn: sqlite3.Connection):
+        register(conn)
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    monkeypatch.setattr(psychopass.database, "register_functions", limited)
+
+    database = UserDB(str(tmp_path / "db.sqlite"), str(tmp_path / "cache"))
+    database.set_emotion_labels(["joy", "sadness"])
+    return database
+
+def messages(count: int, start: int = 0):
+    chat = Chat(id="42", name="chat", type="personal")
+    return [
+        Message("user1", "Ann", f"2024-01-01T00:{i // 60 % 60:02}:{i % 60:02}.{i // 3600}", text=f"message {i}", platform_id=str(i), chat=chat)
+        for i in range(start, start + count)
+    ]
+
+def store(database: UserDB, stored):
+    batch = MessageBatch.from_messages(stored)
+    batch.set_emotions(["joy"] * len(batch.valid_idx))
+    asyncio.run(database.add_messages_batch("telegram", batch, [stored[0].chat]))
+    return batch.ids.tolist()
+
+def test_stored_messages_are_dropped(database):
+    store(database, messages(1200))
+    fresh = database.filter_new_messages(messages(1500))
+    assert [m.platform_id for m in fresh] == [str(i) for i in range(1200, 1500)]
+
+def test_matched_by_content_without_platform_id(database):
+    stored = messages(10)
+    store(database, stored)
+    again = messages(12)
+    for m in again:
+        m.platform_id = None
+    assert [m.text for m in database.filter_new_messages(again)] == ["message 10", "message 11"]
+
+def test_stored_messages_without_vector_are_kept(database):
+    ids = store(database, messages(1200))
+    vectors = Vectors()
+    database.attach_vectors(vectors)
+    assert len(database.filter_new_messages(messages(1200))) == 1200
+
+    vectors.stored = set(ids[:1000])
+    assert [m.platform_id for m in database.filter_new_messages(messages(1200))] == [str(i) for i in range(1000, 1200)]
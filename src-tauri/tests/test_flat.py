@@ -0,0 +1,164 @@
+import json
+import numpy as np
+from psychopass.memory import Memory
+from psychopass.vectors import FlatBackend
+from psychopass.vectors.flat import ROW_V1
+
+def vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # raw text embeddings aren't unit length
+    return (rng.normal(size=(n, dim)) * rng.uniform(0.5, 3, size=(n, 1))).astype(np.float32)
+
+def metadata(i: int) -> dict:
+    return {"type": "text", "original_id": i, "chat_id": 1 + i % 2, "user_id": 7, "emotion": "joy", "timestamp": 100 + i}
+
+def fill(backend: FlatBackend, embeddings: np.ndarray):
+    ids = list(range(1, len(embeddings) + 1))
+    backend.upsert(ids, embeddings, [""] * len(ids), [metadata(i) for i in ids])
+    return ids
+
+def test_vectors_come_back_as_upserted(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(50)
+    ids = fill(backend, raw)
+
+    found, stored, _, _ = backend.get(ids[::-1])
+    assert found.tolist() == ids[::-1]
+    np.testing.assert_allclose(stored, raw[::-1], rtol=1e-5, atol=1e-6)
+
+    scanned = np.vstack([v for _, v, _ in backend.scan(16)])
+    np.testing.assert_allclose(scanned, raw, rtol=1e-5, atol=1e-6)
+
+def test_reclassify_from_stored_vectors_keeps_labels(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(200)
+    fill(backend, raw)
+
+    # linear classifier with a bias, its labels depend on the vector length
+    rng = np.random.default_rng(1)
+    weights, bias = rng.normal(size=(8, 5)), rng.normal(size=5) * 3
+    classify = lambda x: np.argmax(x @ weights + bias, axis=1)
+
+    memory = Memory(None, backend)
+    labels = np.concatenate([classify(e) for _, e in memory.iter_embeddings(64)])
+    assert labels.tolist() == classify(raw).tolist()
+
+def test_version_1_store_is_upgraded(tmp_path):
+    raw = vectors(4)
+    unit = raw / np.linalg.norm(raw, axis=1, keepdims=True)
+    rows = np.zeros(4, dtype=ROW_V1)
+    rows["id"] = [1, 2, 3, 4]
+    rows["chat_id"] = 5
+    rows["emotion"] = -1
+    unit.tofile(tmp_path / "vectors.bin")
+    rows.tofile(tmp_path / "rows.bin")
+    (tmp_path / "header.json").write_text(json.dumps({"dim": 8, "dtype": "float32", "count": 4, "capacity": 4, "dead": 0, "emotions": []}))
+
+    backend = FlatBackend(str(tmp_path))
+    found, stored, _, metadatas = backend.get([3])
+    assert found.tolist() == [3] and metadatas[0]["chat_id"] == 5
+    # the original length is lost, the unit vector comes back
+    np.testing.assert_allclose(stored[0], unit[2], rtol=1e-6)
+    assert json.loads((tmp_path / "header.json").read_text())["version"] == 2
+
+def brute_force(raw: np.ndarray, query: np.ndarray, top_k: int, keep=None) -> list:
+    unit = raw / np.linalg.norm(raw, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    order = [i for i in np.argsort(-scores) if keep is None or keep(i + 1)]
+    return [int(i) + 1 for i in order[:top_k]]
+
+def test_search_is_exact_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr("psychopass.vectors.flat.SEARCH_CHUNK", 37)
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(500)
+    fill(backend, raw)
+    queries = vectors(5, seed=3)
+
+    for query, results in zip(queries, backend.search_many(queries, 10)):
+        assert [r[0] for r in results] == brute_force(raw, query, 10)
+        scores = [r[1] for r in results]
+        assert scores == sorted(scores, reverse=True)
+
+    assert backend.search(queries[0], 0) == []
+    assert len(backend.search(queries[0], 1000)) == 500
+
+def test_upsert_overwrites_existing_ids(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(20)
+    fill(backend, raw)
+
+    replaced = vectors(2, seed=5)
+    backend.upsert([3, 21], replaced, ["", ""], [{**metadata(3), "emotion": "anger"}, metadata(21)])
+    assert backend.count() == 21
+
+    found, stored, _, metadatas = backend.get([3, 21])
+    np.testing.assert_allclose(stored, replaced, rtol=1e-5, atol=1e-6)
+    assert [m["emotion"] for m in metadatas] == ["anger", "joy"]
+    assert backend.search(replaced[0], 1)[0][0] == 3
+
+def test_delete_leaves_tombstones_until_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr("psychopass.vectors.flat.SEARCH_CHUNK", 16)
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(100)
+    ids = fill(backend, raw)
+    deleted = ids[::3]
+    backend.delete(deleted + [1000])
+
+    assert backend.count() == 100 - len(deleted)
+    assert backend.header["dead"] == len(deleted)
+    assert backend.contains(ids) == set(ids) - set(deleted)
+    query = vectors(1, seed=9)[0]
+    expected = brute_force(raw, query, 10, keep=lambda i: i not in deleted)
+    assert [r[0] for r in backend.search(query, 10)] == expected
+
+    backend.compact()
+    assert backend.header["count"] == backend.count() == 100 - len(deleted)
+    assert backend.header["dead"] == 0
+    assert [r[0] for r in backend.search(query, 10)] == expected
+    found, stored, _, _ = backend.get(ids)
+    assert found.tolist() == [i for i in ids if i not in deleted]
+    np.testing.assert_allclose(stored, raw[found - 1], rtol=1e-5, atol=1e-6)
+
+    # appends after a compaction go past the rewritten rows
+    backend.upsert([deleted[0]], raw[:1], [""], [metadata(deleted[0])])
+    assert backend.contains([deleted[0]]) == {deleted[0]}
+    assert backend.count() == 101 - len(deleted)
+
+def test_filters(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    raw = vectors(60)
+    ids = fill(backend, raw)
+    backend.update_many(ids[:10], [{"emotion": "sadness", "type": "image"}] * 10)
+    query = vectors(1, seed=4)[0]
+
+    def search(**filters):
+        return {r[0] for r in backend.search(query, 100, filters)}
+
+    assert search(chat_id=2) == {i for i in ids if i % 2}
+    assert search(user_id=7) == set(ids)
+    assert search(user_id=8) == set()
+    assert search(emotion="sadness") == set(ids[:10])
+    assert search(emotion="unknown") == set()
+    assert search(type="image") == set(ids[:10])
+    assert search(type="video") == set()
+    assert search(since=120, until=129) == set(range(20, 30))
+    assert search(chat_id=1, emotion="joy", since=150) == {i for i in ids if i >= 50 and i % 2 == 0}
+    assert search(chat_id=None) == set(ids)
+
+def test_reopen_keeps_rows_and_labels(tmp_path):
+    backend = FlatBackend(str(tmp_path), dtype="float16")
+    raw = vectors(30)
+    ids = fill(backend, raw)
+    backend.update([4], {"emotion": "fear", "chat_id": 9})
+    backend.delete([5])
+    backend.close()
+
+    reopened = FlatBackend(str(tmp_path), dtype="float32")
+    assert reopened.dtype == np.float16
+    assert reopened.count() == 29
+    found, stored, _, metadatas = reopened.get([4, 5, 6])
+    assert found.tolist() == [4, 6]
+    assert metadatas[0]["emotion"] == "fear" and metadatas[0]["chat_id"] == 9
+    assert metadatas[1] == metadata(6)
+    np.testing.assert_allclose(stored, raw[[3, 5]], rtol=2e-3, atol=2e-3)
+    assert [r[0] for r in reopened.search(raw[10], 1)] == [ids[10]]
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from psychopass.memory import Memory
+from psychopass.vectors import FlatBackend, IVFPQIndex
+
+DIM = 32
+
+def clustered(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(40, DIM))
+    return (centers[rng.integers(0, 40, size=n)] + rng.normal(scale=0.6, size=(n, DIM))).astype(np.float32)
+
+@pytest.fixture(scope="module")
+def stored(tmp_path_factory):
+    backend = FlatBackend(str(tmp_path_factory.mktemp("flat")))
+    raw = clustered(4000)
+    ids = list(range(1, len(raw) + 1))
+    backend.upsert(ids, raw, [""] * len(ids), [{"type": "text", "chat_id": 1} for _ in ids])
+    return backend, raw
+
+@pytest.fixture(scope="module")
+def index(stored):
+    return IVFPQIndex.build(stored[0], m=8, sample_size=4000)
+
+def exact(backend, queries: np.ndarray, top_k: int) -> list:
+    return [[r[0] for r in hits] for hits in backend.search_many(queries, top_k)]
+
+def recall(found: list, expected: list) -> float:
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+def test_build_indexes_every_vector(stored, index):
+    backend, _ = stored
+    assert len(index) == backend.count()
+    assert sorted(index.ids.tolist()) == list(range(1, 4001))
+    assert index.offsets[-1] == len(index.ids)
+    assert index.m == 8 and index.dim == DIM
+
+def test_train_rejects_indivisible_dimension():
+    with pytest.raises(ValueError):
+        IVFPQIndex.train(clustered(100), nlist=4, m=5)
+
+def test_recall(stored, index):
+    backend, _ = stored
+    queries = clustered(50, seed=1)
+    expected = exact(backend, queries, 10)
+
+    # approximate scores only, the true neighbours are among the candidates
+    ids, scores = index.search(queries, 100, nprobe=index.nlist)
+    assert (np.diff(scores, axis=1) <= 0).all()
+    assert recall(ids.tolist(), expected) >= 0.95
+
+    memory = Memory(None, backend, nprobe=16, rerank=100)
+    memory.index = index
+    found = [[h["id"] for h in hits] for hits in memory.search_many(queries, 10)]
+    assert recall(found, expected) >= 0.9
+
+def test_save_load_round_trip(index, tmp_path):
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    copy = IVFPQIndex.load(path)
+
+    # saving merges the unsorted tail first
+    queries = clustered(10, seed=2)
+    copy.add(np.arange(5001, 5021), clustered(20, seed=3))
+    before = copy.search(queries, 20)
+    copy.save(path)
+    loaded = IVFPQIndex.load(path)
+    assert len(loaded) == len(copy) == 4020 and not len(copy.tail_ids)
+    after = loaded.search(queries, 20)
+    np.testing.assert_array_equal(before[0], after[0])
+    np.testing.assert_allclose(before[1], after[1], rtol=1e-6)
+
+def test_load_ignores_missing_or_broken_files(tmp_path):
+    assert IVFPQIndex.load(str(tmp_path / "missing.npz")) is None
+    (tmp_path / "broken.npz").write_bytes(b"not a zip")
+    assert IVFPQIndex.load(str(tmp_path / "broken.npz")) is None
+
+def test_readded_ids_keep_their_latest_code():
+    index = IVFPQIndex.train(clustered(1000), nlist=8, m=8)
+    first, second = clustered(50, seed=4), clustered(50, seed=5)
+    index.add(np.arange(1, 51), first)
+    index.merge()
+    index.add(np.arange(26, 76), second)
+
+    # the tail is searched before it's merged
+    assert index.search(second[-1], 1, nprobe=8)[0][0, 0] == 75
+
+    index.merge()
+    assert len(index) == 75 and len(index.tail_ids) == 0
+    assert sorted(index.ids.tolist()) == list(range(1, 76))
+
+    _, codes = index.encode(second[:25])
+    for message_id, code in zip(range(26, 51), codes):
+        assert (index.codes[index.ids == message_id][0] == code).all()
+
+def test_short_lists_pad_with_zero_ids():
+    index = IVFPQIndex.train(clustered(500), nlist=4, m=8)
+    index.add(np.array([1, 2, 3]), clustered(3, seed=6))
+    ids, scores = index.search(clustered(2, seed=7), 5, nprobe=4)
+    assert (ids[:, 3:] == 0).all() and np.isneginf(scores[:, 3:]).all()
+    assert sorted(ids[0, :3].tolist()) == [1, 2, 3]
@@ -0,0 +1,71 @@
+import json
+import pytest
+from psychopass.utils import JSONStream
+
+def write(tmp_path, data, **kwargs) -> str:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data, ensure_ascii=False, **kwargs), encoding="utf-8")
+    return str(path)
+
+def read(path: str, key=None, chunk_size: int = 1 << 20, resume: int = 0):
+    stream = JSONStream(path, chunk_size)
+    try:
+        return list(stream.items(key, resume))
+    finally:
+        stream.close()
+
+MESSAGES = [{"id": i, "text": f"привіт {i} 🙂", "score": 1.25e-3 * i, "tags": [None, True, {"n": i}]} for i in range(200)]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_top_level_array(tmp_path, chunk_size):
+    path = write(tmp_path, MESSAGES, indent=2)
+    assert read(path, chunk_size=chunk_size) == [("", m) for m in MESSAGES]
+
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_keyed_array_with_fields_around_it(tmp_path, chunk_size):
+    path = write(tmp_path, {"name": "chat", "type": "personal_chat", "messages": MESSAGES, "tail": [1, 2]})
+    assert read(path, "messages", chunk_size) == (
+        [("name", "chat"), ("type", "personal_chat")]
+        + [("messages", m) for m in MESSAGES]
+        + [("tail", [1, 2])]
+    )
+
+def test_empty_containers(tmp_path):
+    assert read(write(tmp_path, [])) == []
+    assert read(write(tmp_path, {}), "messages") == []
+    assert read(write(tmp_path, {"messages": [], "name": "x"}), "messages") == [("name", "x")]
+
+def test_other_arrays_are_single_values(tmp_path):
+    path = write(tmp_path, {"list": [1, 2], "messages": [3]})
+    assert read(path, "messages") == [("list", [1, 2]), ("messages", 3)]
+
+def test_truncated_file_raises(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(MESSAGES)[:-40], encoding="utf-8")
+    with pytest.raises(ValueError):
+        read(str(path))
+
+@pytest.mark.parametrize("key", [None, "messages"])
+def test_resume_at_position(tmp_path, key):
+    data = MESSAGES if key is None else {"name": "chat", "messages": MESSAGES, "tail": 1}
+    path = write(tmp_path, data, indent=1)
+
+    stream = JSONStream(path, 13)
+    for name, value in stream.items(key):
+        if name == (key or "") and value["id"] == 120:
+            position = stream.position()
+            break
+    stream.close()
+
+    resumed = [v for name, v in read(path, key, 13, position) if name == (key or "")]
+    assert resumed == MESSAGES[121:]
+
+def test_position_before_and_after_the_last_item(tmp_path):
+    path = write(tmp_path, {"messages": MESSAGES[:3], "tail": 1})
+    stream = JSONStream(path)
+    assert stream.position() == 0
+    items = list(stream.items("messages"))
+    stream.close()
+    assert items[-1] == ("tail", 1)
+    # resuming after the last item reads only what follows the array
+    assert read(path, "messages", resume=stream.position()) == [("tail", 1)]
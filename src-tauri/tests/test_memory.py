@@ -0,0 +1,41 @@
+import numpy as np
+from psychopass.memory import Memory
+from psychopass.vectors import FlatBackend
+
+class Embedder:
+    """Embeds every image as the same vector"""
+
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+        self.seen = []
+
+    def embed_images(self, paths):
+        self.seen += paths
+        return np.tile(self.vector, (len(paths), 1))
+
+def test_reembed_images_replaces_image_vectors_only(tmp_path):
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"jpeg")
+    backend = FlatBackend(str(tmp_path / "vectors"))
+    backend.upsert(
+        [1, 2, 3],
+        np.eye(3, 4, dtype=np.float32),
+        ["hi", "<image>", "<image>"],
+        [
+            {"type": "text", "original_id": 1, "chat_id": 5, "emotion": "joy", "timestamp": 10},
+            {"type": "image", "original_id": 2, "chat_id": 5, "emotion": "sadness", "timestamp": 20},
+            {"type": "image", "original_id": 3, "chat_id": 6, "emotion": "joy", "timestamp": 30},
+        ]
+    )
+    embedder = Embedder([0, 0, 0, 2])
+    memory = Memory(embedder, backend)
+
+    # message 3's file is gone, its vector stays
+    paths = {2: str(photo), 3: str(tmp_path / "missing.jpg")}
+    progress = list(memory.reembed_images(lambda ids: {i: paths[i] for i in ids if i in paths}))
+    assert progress == [(1, 2, 2)]
+    assert embedder.seen == [str(photo)]
+
+    found, vectors, _, metadatas = backend.get([1, 2, 3])
+    np.testing.assert_allclose(vectors, [[1, 0, 0, 0], [0, 0, 0, 2], [0, 0, 1, 0]])
+    assert metadatas[1]["emotion"] == "sadness" and metadatas[1]["timestamp"] == 20